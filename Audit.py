@@ -0,0 +1,259 @@
+import numpy as np
+from itertools import combinations
+from Parse import CARDS
+from Evaluate import HAND_LABELS, hand_rank_classes
+from Store import HandStore, RANK_COLUMNS, load_npz
+
+# Hole card labels in counting order, and index of each pair of card IDs (in either order) into the labels
+## With suits, e.g. '2c 2d'
+HOLE_CARD_LABELS = [' '.join(x) for x in combinations(CARDS, 2)]
+HOLE_CARD_INDEX = np.zeros((len(CARDS), len(CARDS)), dtype=np.intp)
+## Without suits, e.g. '2 2'
+HOLE_CARD_NOSUITS_LABELS = list(dict.fromkeys(' '.join(x) for x in combinations([c[0] for c in CARDS], 2))) # Remove suit from cards
+HOLE_CARD_NOSUITS_INDEX = np.zeros((len(CARDS), len(CARDS)), dtype=np.intp)
+for _i, (_c_1, _c_2) in enumerate(combinations(range(len(CARDS)), 2)):
+    HOLE_CARD_INDEX[_c_1, _c_2] = HOLE_CARD_INDEX[_c_2, _c_1] = _i
+    HOLE_CARD_NOSUITS_INDEX[_c_1, _c_2] = HOLE_CARD_NOSUITS_INDEX[_c_2, _c_1] = HOLE_CARD_NOSUITS_LABELS.index(
+        '{} {}'.format(CARDS[_c_1][0], CARDS[_c_2][0]) # _c_1 < _c_2, so lower rank is first as in the labels
+    )
+del _i, _c_1, _c_2
+
+# Cumulative counts of values of hands, kept at every INTERVAL hands. Counts of any range of hands are
+# a difference of checkpoints plus counts of less than INTERVAL hands at each end of the range, so
+# hands can be added and ranges counted again at a cost proportional to the added hands.
+# Hands must only be appended, e.g. by HandStore.extend, as checkpoints of earlier hands are kept.
+class CumulativeCounts:
+    INTERVAL = 1 << 12
+
+    ## labels: int, number of possible values
+    def __init__(self, labels):
+        self.labels = labels
+        self.checkpoints = [np.zeros(labels, dtype=np.int64)] # Counts of hands before i*INTERVAL
+
+    def _count(self, values, weights, start, end):
+        start, end = int(start), int(end)
+        counts = np.bincount(
+            values[start:end], weights=None if weights is None else weights[start:end], minlength=self.labels
+        )
+        return counts.astype(np.int64)
+
+    # Counts of all hands before each index
+    ## indexes: iterable of ints, hand indexes, 0 to number of hands
+    ## offsets: np.ndarray of ints, shape=(hands+1,), offsets of each hand in values
+    ## values: np.ndarray of ints, values to count, 0 to labels-1
+    ## weights: np.ndarray or None, weight of each value
+    ## Returns np.ndarray of ints, shape=(len(indexes), labels)
+    def before(self, indexes, offsets, values, weights=None):
+        # Add checkpoints of hands added since the last call
+        while len(self.checkpoints) * self.INTERVAL < len(offsets):
+            end = len(self.checkpoints) * self.INTERVAL
+            self.checkpoints.append(
+                self.checkpoints[-1] + self._count(values, weights, offsets[end - self.INTERVAL], offsets[end])
+            )
+        counts = [
+            self.checkpoints[i // self.INTERVAL] + self._count(values, weights, offsets[i - i % self.INTERVAL], offsets[i])
+            for i in indexes
+        ]
+        return np.array(counts, dtype=np.int64).reshape(-1, self.labels)
+
+# Counts card, hole card, and hand frequencies of batches of hands.
+# Each hand is evaluated exactly once. Hands and their rank classes are kept
+# in a HandStore (one byte per card and per evaluation), so binned hand
+# frequencies are counted from slices of the store instead of re-evaluating hands.
+# Hands are only appended, so frequencies are counted from CumulativeCounts of the store.
+# Counts and hands can be saved to partial result files, e.g. of shards of hand history audited on
+# different machines, and merged in any grouping, as merging is associative.
+class Audit:
+    VERSION = 1 # Increment when the format of partial result files changes
+    ## Labels of the counts of each frequency, see counts
+    _FREQUENCIES = {
+        'card_frequency': CARDS,
+        'hole_card_frequency': HOLE_CARD_LABELS,
+        'hole_card_nosuits_frequency': HOLE_CARD_NOSUITS_LABELS,
+    }
+
+    ## allcombinations: bool, also count all combinations of hole and board cards
+    ## holecards: bool, count hole cards without suits
+    ## holecardswithsuits: bool, count hole cards with suits
+    ## only_me: bool, only my ([ME]) hole cards are counted, only recorded in partial result files
+    ## keep_dealt_hands: bool, also keep the cards of every dealt hand, see dealt_hands, not kept in partial result files
+    def __init__(self, allcombinations=False, holecards=False, holecardswithsuits=False, only_me=False,
+                 keep_dealt_hands=False):
+        self.hand_labels = HAND_LABELS
+        self.allcombinations = allcombinations
+        self.holecards = holecards
+        self.holecardswithsuits = holecardswithsuits
+        self.only_me = only_me
+
+        # Counts of each label of counted frequencies, indexed by card ID, HOLE_CARD_INDEX, or HOLE_CARD_NOSUITS_INDEX
+        # Labels are only looked up for results, see card_frequency
+        self.counts = {'card_frequency': np.zeros(len(CARDS), dtype=np.int64)}
+        if holecardswithsuits:
+            self.counts['hole_card_frequency'] = np.zeros(len(HOLE_CARD_LABELS), dtype=np.int64)
+        if holecards:
+            self.counts['hole_card_nosuits_frequency'] = np.zeros(len(HOLE_CARD_NOSUITS_LABELS), dtype=np.int64)
+
+        # All hands with a board, i.e. hands counted in the hand distribution, in order
+        self.hands = HandStore()
+        self._cumulative_counts = {
+            'hand_ranks': CumulativeCounts(len(self.hand_labels)),
+            'allcombinations_ranks': CumulativeCounts(len(self.hand_labels)),
+            'board_lengths': CumulativeCounts(6),
+        }
+        # Cards of all hands, including hands without a board, in order, for DealOrder.DealOrderTests and
+        # replicates of Simulate.NullDistribution
+        # Which hands have a board depends on their hole cards, so hands are kept before they are selected
+        self.dealt_hands = HandStore() if keep_dealt_hands else None
+
+    # Number of hands with a board
+    def __len__(self):
+        return len(self.hands)
+
+    # Count a batch of hands
+    # Rank classes are evaluated only if missing from hands, and are then set in hands
+    ## hands: Store.HandStore
+    def add_hands(self, hands):
+        hole_cards = hands.hole_cards
+        board_lengths = hands.board_lengths
+
+        # Individual card frequency of hole cards and board cards
+        board_cards = hands.boards[np.arange(hands.boards.shape[1]) < board_lengths[:, None]]
+        self.counts['card_frequency'] += np.bincount(hole_cards.ravel(), minlength=len(CARDS))
+        self.counts['card_frequency'] += np.bincount(board_cards, minlength=len(CARDS))
+        # Frequency of hole cards together
+        if self.holecardswithsuits:
+            self.counts['hole_card_frequency'] += np.bincount(
+                HOLE_CARD_INDEX[hole_cards[:, 0], hole_cards[:, 1]], minlength=len(HOLE_CARD_LABELS)
+            )
+        if self.holecards:
+            self.counts['hole_card_nosuits_frequency'] += np.bincount(
+                HOLE_CARD_NOSUITS_INDEX[hole_cards[:, 0], hole_cards[:, 1]], minlength=len(HOLE_CARD_NOSUITS_LABELS)
+            )
+
+        # Rank classes of hands with a board
+        if hands.hand_ranks is None or self.allcombinations and hands.allcombinations_ranks is None:
+            hands.set_ranks(*hand_rank_classes(hands, allcombinations=self.allcombinations))
+        if self.dealt_hands is not None:
+            self.dealt_hands.extend(HandStore(**{k: v for k, v in hands.columns().items() if k not in RANK_COLUMNS}))
+        if (board_lengths > 0).all():
+            self.hands.extend(hands)
+        else:
+            # Only keep hands with a board, as hands without a board have no rank classes
+            self.hands.extend(hands.select(board_lengths > 0))
+
+    # Options that Audits must have in common to be merged
+    @property
+    def options(self):
+        return {
+            'allcombinations': self.allcombinations,
+            'holecards': self.holecards,
+            'holecardswithsuits': self.holecardswithsuits,
+            'only_me': self.only_me,
+        }
+
+    # Add counts and hands of another Audit with the same options
+    # Hands of other are ordered after hands of self
+    ## other: Audit
+    def merge(self, other):
+        if other.options != self.options:
+            raise ValueError('Can\'t merge audits with different options {} and {}'.format(self.options, other.options))
+        for frequency, counts in self.counts.items():
+            counts += other.counts[frequency]
+        self.hands.extend(other.hands)
+
+    # Save counts and hands to a compressed partial result file, see load()
+    ## path: str or file object, path of .npz file
+    def save(self, path):
+        arrays = {'version': np.int64(self.VERSION)}
+        arrays.update((k, np.bool_(v)) for k, v in self.options.items())
+        arrays.update(self.counts)
+        arrays.update(('hands_' + k, v) for k, v in self.hands.columns().items())
+        np.savez_compressed(path, **arrays)
+
+    # Load a partial result file saved with save()
+    ## path: str, path of .npz file
+    @classmethod
+    def load(cls, path):
+        arrays = load_npz(path)
+        if arrays.get('version') != cls.VERSION:
+            raise ValueError('{} is not a partial result file of version {}'.format(path, cls.VERSION))
+        audit = cls(**{k: bool(arrays[k]) for k in ('allcombinations', 'holecards', 'holecardswithsuits', 'only_me')})
+        for frequency in audit.counts:
+            audit.counts[frequency] = arrays[frequency].astype(np.int64)
+        audit.hands = HandStore(**{k[len('hands_'):]: v for k, v in arrays.items() if k.startswith('hands_')})
+        return audit
+
+    # Frequencies of all hands, as dicts of label to count, e.g. for Results
+    # Hole card frequencies are only counted with holecards or holecardswithsuits
+    @property
+    def card_frequency(self):
+        return self._frequency('card_frequency')
+    @property
+    def hole_card_frequency(self):
+        return self._frequency('hole_card_frequency')
+    @property
+    def hole_card_nosuits_frequency(self):
+        return self._frequency('hole_card_nosuits_frequency')
+    def _frequency(self, frequency):
+        if frequency not in self.counts:
+            raise AttributeError('{} is not counted'.format(frequency))
+        return dict(zip(self._FREQUENCIES[frequency], self.counts[frequency].tolist()))
+
+    # Hand frequencies of all hands, as dicts of hand rank label to count
+    @property
+    def hand_frequency(self):
+        return dict(zip(self.hand_labels, self._cumulative_ranks(False, [len(self)])[0].tolist()))
+    @property
+    def hand_allcombinations_frequency(self):
+        return dict(zip(self.hand_labels, self._cumulative_ranks(True, [len(self)])[0].tolist()))
+
+    # Yields (start, end) hand indexes of each bin
+    # The last bin takes the remainder of the hands, and there is a bin of each hand if there are less hands than bins
+    ## bins: int, number of bins
+    def bin_ranges(self, bins):
+        length = len(self)
+        interval = max(length // bins, 1)
+        for i in range(0, length, interval):
+            end_i = i + interval
+            last = length - end_i < interval
+            if last:
+                end_i = length
+            yield i, end_i
+            if last:
+                break
+
+    # Hand frequencies of every bin, see bin_ranges
+    ## bins: int, number of bins
+    ## allcombinations: bool, count all combinations instead of hands
+    ## Returns np.ndarray of ints, shape=(bins, len(hand_labels)), has less bins if there are less hands than bins
+    def binned_frequencies(self, bins, allcombinations=False):
+        return self._binned_counts(bins, lambda indexes: self._cumulative_ranks(allcombinations, indexes))
+
+    # Number of players' hands of every bin by board length, see bin_ranges
+    ## bins: int, number of bins
+    ## Returns np.ndarray of ints, shape=(bins, 6), has less bins if there are less hands than bins
+    def binned_board_lengths(self, bins):
+        return self._binned_counts(bins, lambda indexes: self._cumulative_counts['board_lengths'].before(
+            indexes, np.arange(len(self) + 1), self.hands.board_lengths, weights=self.hands.players
+        ))
+
+    # Counts of hand ranks of all hands before each index, see CumulativeCounts.before
+    ## allcombinations: bool, count all combinations instead of hands
+    ## indexes: iterable of ints, hand indexes
+    def _cumulative_ranks(self, allcombinations, indexes):
+        if allcombinations:
+            ranks, offsets = self.hands.allcombinations_ranks, self.hands.allcombinations_rank_offsets
+        else:
+            ranks, offsets = self.hands.hand_ranks, self.hands.hand_rank_offsets
+        if ranks is None: # No hands
+            return np.zeros((len(indexes), len(self.hand_labels)), dtype=np.int64)
+        k = 'allcombinations_ranks' if allcombinations else 'hand_ranks'
+        return self._cumulative_counts[k].before(indexes, offsets, ranks)
+
+    # Count values of consecutive bins of hands at once, as differences of cumulative counts at bin edges
+    ## bins: int, number of bins
+    ## cumulative: function of list of hand indexes, returning counts of all hands before each index
+    def _binned_counts(self, bins, cumulative):
+        ranges = list(self.bin_ranges(bins))
+        edges = [start for start, _ in ranges] + [end for _, end in ranges[-1:]]
+        return np.diff(cumulative(edges), axis=0)
@@ -0,0 +1,158 @@
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+import subprocess
+import numpy as np
+import Parse
+from Audit import Audit
+from Store import HandStore
+from Results import Results
+from Statistics import ProportionStatistics, chi2_sf
+from Expected import ExpectedDistributions
+from Evaluate import hand_rank_classes, use_rank_table
+from Generate import write_hand_history
+
+# Time a function
+## function: function to call
+## Returns (return value of function, float seconds)
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    value = function(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+# Benchmark every stage of an audit of a synthetic hand history file
+# Yields (stage, hands, items, seconds) of each stage, items are the players or evaluations of the stage
+## hands: int, number of hands
+## directory: str, path to directory of generated files, files of the same size and seed are reused
+## bins: int, number of bins
+## seed: int, seed of the shuffler
+## generate_options: options of Generate.generate_lines, e.g. seats
+def benchmark(hands, directory, bins=10, seed=0, **generate_options):
+    # Generate
+    path = os.path.join(directory, 'benchmark-{}-{}.txt'.format(hands, seed))
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        _, seconds = timed(write_hand_history, path + '.tmp', hands, seed=seed, **generate_options)
+        os.replace(path + '.tmp', path)
+        yield 'Generate', hands, hands, seconds
+
+    # Parse
+    store, seconds = timed(lambda: HandStore(**Parse.Bovada(path).hand_columns()))
+    yield 'Parse', len(store), int(store.players.sum()), seconds
+
+    # Evaluate best hands, and all combinations
+    (hand_ranks, _), seconds = timed(hand_rank_classes, store)
+    yield 'Evaluate', len(store), len(hand_ranks), seconds
+    (hand_ranks, allcombinations_ranks), seconds = timed(hand_rank_classes, store, allcombinations=True)
+    yield 'Evaluate --allcombinations', len(store), len(allcombinations_ranks), seconds
+    store.set_ranks(hand_ranks, allcombinations_ranks)
+
+    # Count and bin
+    audit = Audit(allcombinations=True, holecards=True, holecardswithsuits=True)
+    _, seconds = timed(audit.add_hands, store)
+    yield 'Count', len(store), int(store.players.sum()), seconds
+    (frequencies, allcombinations_frequencies, board_lengths), seconds = timed(lambda: (
+        audit.binned_frequencies(bins),
+        audit.binned_frequencies(bins, allcombinations=True),
+        audit.binned_board_lengths(bins),
+    ))
+    yield 'Bin', len(audit), int(frequencies.sum() + allcombinations_frequencies.sum()), seconds
+
+    # Statistics of bins and of all tables
+    expected = ExpectedDistributions()
+    expected.mixture('hand', board_lengths) # Load expected distributions before timing
+    chi2_sf(0, 1) # Import the statistics backend before timing, see cold_start
+    def statistics():
+        return [
+            ProportionStatistics(expected.mixture('hand', board_lengths), frequencies),
+            ProportionStatistics(expected.mixture('allcombinations', board_lengths), allcombinations_frequencies),
+            ProportionStatistics(
+                [expected.get('hole_cards')[x] for x in audit.hole_card_frequency],
+                list(audit.hole_card_frequency.values()),
+            ),
+        ]
+    binned_statistics, seconds = timed(statistics)
+    yield 'Statistics', len(audit), sum(s.samples.size for s in binned_statistics), seconds
+
+    # Render tables of all bins
+    def render():
+        results = Results()
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            for statistics, labels in zip(binned_statistics, (audit.hand_labels, audit.hand_labels, list(audit.hole_card_frequency))):
+                for i in range(len(statistics)):
+                    results.print_proportion_statistics('Benchmark', 'Label', labels, statistics, i)
+            results.flush()
+        return output.getvalue()
+    output, seconds = timed(render)
+    yield 'Render', len(audit), output.count('\n'), seconds
+
+# Benchmark cold starts of main.py in new processes, including imports of NumPy, treys, and scipy
+# Yields (stage, hands, items, seconds) of each command, the best of repeat runs, see benchmark
+## hands: int, number of hands of the audits
+## directory: str, path to directory of generated files, see benchmark
+## seed: int, seed of the shuffler
+## repeat: int, number of runs of each command
+def cold_start(hands, directory, seed=0, repeat=3):
+    # main.py audits directories, so the file has a directory of its own
+    audit_directory = os.path.join(directory, 'cold-start-{}-{}'.format(hands, seed))
+    path = os.path.join(audit_directory, 'hands.txt')
+    if not os.path.exists(path):
+        os.makedirs(audit_directory, exist_ok=True)
+        write_hand_history(path + '.tmp', hands, seed=seed)
+        os.replace(path + '.tmp', path)
+
+    main = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    commands = [
+        ('Cold start --help', ['--help'], 0),
+        ('Cold start audit', [audit_directory, '--summaryonly'], hands),
+        ('Cold start audit, NumPy stats', [audit_directory, '--summaryonly', '--statistics', 'numpy'], hands),
+    ]
+    for stage, arguments, command_hands in commands:
+        seconds = min(
+            timed(subprocess.run, [sys.executable, main] + arguments, stdout=subprocess.DEVNULL, check=True)[1]
+            for _ in range(repeat)
+        )
+        yield stage, command_hands, command_hands, seconds
+
+def main():
+    argparser = argparse.ArgumentParser(description='Benchmark throughput of each stage of an audit on synthetic Bovada hand history.')
+    argparser.add_argument('--sizes', default=[10000, 1000000], type=int, nargs='+',
+        help='Number of hands of each benchmark, e.g. 10000 1000000 10000000. Default=10000 1000000')
+    argparser.add_argument('--directory', default='benchmark', type=str,
+        help='Path to directory of generated hand history files, reused by later runs. Default=benchmark')
+    argparser.add_argument('--seats', default=6, type=int, help='Number of players dealt hole cards, 2-9. Default=6')
+    argparser.add_argument('--foldrate', default=0.3, type=float, help='Proportion of hands that end before the flop. Default=0.3')
+    argparser.add_argument('--bins', default=10, type=int, help='Number of bins. Default=10')
+    argparser.add_argument('--seed', default=0, type=int, help='Seed of the shuffler. Default=0')
+    argparser.add_argument('--ranktable', action='store_true', help='Evaluate hands with a table of all 5 card hands')
+    argparser.add_argument('--coldstarthands', default=1000, type=int,
+        help='Number of hands of the audits of cold start benchmarks, 0 to skip them. Default=1000')
+    args = argparser.parse_args()
+
+    if args.ranktable:
+        use_rank_table(os.path.join(ExpectedDistributions.DEFAULT_DIRECTORY, 'rank_table.npy'))
+
+    results = Results(label_column_size=30)
+    results.set_full_width(4)
+    results.print_horizontal_divider()
+    results.print_results_row('Stage', 'Hands', 'Items', 'Seconds', 'Hands/sec', divider=True)
+    runs = [
+        benchmark(size, args.directory, bins=args.bins, seed=args.seed, seats=args.seats, fold_rate=args.foldrate)
+        for size in args.sizes
+    ]
+    if args.coldstarthands:
+        runs.append(cold_start(args.coldstarthands, args.directory, seed=args.seed))
+    for run in runs:
+        for stage, hands, items, seconds in run:
+            results.print_results_row(
+                stage, hands, items, '{:.3f}'.format(seconds), '{:.0f}'.format(hands / seconds if seconds else np.inf)
+            )
+            results.flush() # Each stage as it finishes
+        results.print_horizontal_divider()
+        results.flush()
+
+if __name__ == '__main__':
+    main()
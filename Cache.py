@@ -0,0 +1,68 @@
+import os
+import hashlib
+import tempfile
+import zipfile
+import numpy as np
+from Store import HandStore, load_npz
+from Parse import source_file
+
+# On-disk cache of parsed hands and rank classes of hand history files.
+# Each file has one .npz entry of the columns of its HandStore, including
+# rank classes, and is reused while the file's size and modification time
+# are unchanged. Members of an archive are reused while the archive is unchanged.
+class Cache:
+    VERSION = 2 # Increment when the format of entries changes
+
+    ## directory: str, path to cache directory, created if it doesn't exist
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    # Get path of the cache entry of a file
+    ## file: str, filename including path
+    ## only_me: bool, entry of only my ([ME]) hole cards
+    def entry_path(self, file, only_me=False):
+        key = hashlib.sha1(os.path.abspath(file).encode()).hexdigest()
+        return os.path.join(self.directory, '{}{}.npz'.format(key, '-me' if only_me else ''))
+
+    # Get cached hands of a file
+    # Returns Store.HandStore, or None if not cached or stale
+    ## file: str, filename including path
+    ## only_me: bool, only my ([ME]) hole cards
+    ## allcombinations: bool, rank classes of all combinations are required
+    def load(self, file, only_me=False, allcombinations=False):
+        try:
+            # Read rather than memory map, so the entry can be replaced while the hands are in use
+            hands = load_npz(self.entry_path(file, only_me))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return None
+        stat = os.stat(source_file(file))
+        if (hands.pop('version', None) != self.VERSION
+                or hands.pop('size', None) != stat.st_size
+                or hands.pop('mtime_ns', None) != stat.st_mtime_ns
+                or allcombinations and 'allcombinations_ranks' not in hands):
+            return None
+        return HandStore(**hands)
+
+    # Save hands of a file
+    ## file: str, filename including path
+    ## hands: Store.HandStore
+    ## only_me: bool, only my ([ME]) hole cards
+    ## stat: os.stat_result, stat of file (or its archive) before it was parsed, default is current stat
+    def save(self, file, hands, only_me=False, stat=None):
+        stat = stat or os.stat(source_file(file))
+        # Write to a temporary file first, so an interrupted run never leaves a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    version=np.int64(self.VERSION),
+                    size=np.int64(stat.st_size),
+                    mtime_ns=np.int64(stat.st_mtime_ns),
+                    **hands.columns()
+                )
+            os.replace(temp_path, self.entry_path(file, only_me))
+        except BaseException:
+            os.remove(temp_path)
+            raise
@@ -0,0 +1,231 @@
+import os
+import sqlite3
+import numpy as np
+from Store import HandStore
+from Parse import source_file
+from Evaluate import hand_rank_classes
+from Profile import NULL_PROFILER
+
+# SQLite database of parsed hands, for audits of subsets of hand history without parsing it again.
+# Files are ingested once while their size and modification time are unchanged, with the hand number, time, and
+# board of every hand, which are indexed, and the card IDs, position, [ME] label, and rank classes of its players,
+# stored as fixed-width BLOBs of each hand, so that selected hands are read as arrays.
+# Hand numbers are unique, so hands repeated in overlapping files are only ingested once.
+# Audits select hands with filters, see select(), in order of files, as first ingested, and of hands in each file, so
+# bins follow the order of files, also after a changed file is ingested again.
+class HandDatabase:
+    VERSION = 2 # Increment when the schema changes, saved as user_version
+    _SCHEMA = '''
+        CREATE TABLE files (
+            id INTEGER PRIMARY KEY, -- In order of ingestion
+            name TEXT UNIQUE, -- Filename including absolute path
+            size INTEGER,
+            mtime_ns INTEGER
+        );
+        CREATE TABLE positions (
+            id INTEGER PRIMARY KEY,
+            name TEXT UNIQUE -- e.g. 'Big Blind'
+        );
+        CREATE TABLE hands (
+            id INTEGER PRIMARY KEY,
+            file INTEGER REFERENCES files(id) ON DELETE CASCADE,
+            hand_index INTEGER, -- Index of the hand in its file
+            hand_number INTEGER, -- NULL if unknown
+            time TEXT, -- Date and time of the hand, e.g. '2021-01-01 12:00:00', NULL if unknown
+            board_length INTEGER,
+            board BLOB, -- 5 card IDs, padded with 0
+            hole_cards BLOB, -- 2 card IDs of each player
+            positions BLOB, -- positions(id) of each player
+            is_me BLOB, -- 1 of each of my players, 0 of others
+            hand_ranks BLOB, -- Rank class of each player, empty without a board
+            allcombinations_ranks BLOB -- Rank class of each 5 card combination of each player, empty without a board
+        );
+        CREATE UNIQUE INDEX hands_hand_number ON hands(hand_number);
+        CREATE INDEX hands_file ON hands(file, hand_index);
+        CREATE INDEX hands_time ON hands(time);
+        CREATE INDEX hands_board_length ON hands(board_length);
+    '''
+    _BATCH_SIZE = 1 << 13 # Hands selected at once, bounds memory of select()
+    _LOOKUP_SIZE = 500 # Hand numbers looked up at once, below the limit of SQL variables
+
+    ## path: str, path of database file, created if it doesn't exist
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version == 0:
+            with self.connection:
+                self.connection.executescript(self._SCHEMA)
+                self.connection.execute('PRAGMA user_version = {}'.format(self.VERSION))
+        elif version != self.VERSION:
+            self.connection.close()
+            raise ValueError('{} is a hand database of version {}, not {}'.format(path, version, self.VERSION))
+        self.duplicates = 0 # Number of hands not ingested as duplicates
+
+    def close(self):
+        self.connection.close()
+
+    # Number of hands in the database
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM hands').fetchone()[0]
+
+    # Parse, evaluate, and add hands of a file, replacing hands of an earlier version of the file
+    # Hands with a hand number already in the database are skipped as duplicates
+    ## Parser: parser class of the file, e.g. Parse.Bovada
+    ## file: str, filename including path
+    ## profiler: Profile.Profiler
+    ## Returns int, number of hands added, 0 if the file is unchanged
+    def ingest(self, Parser, file, profiler=NULL_PROFILER):
+        name = os.path.abspath(file)
+        stat = os.stat(source_file(file))
+        row = self.connection.execute('SELECT id, size, mtime_ns FROM files WHERE name = ?', (name,)).fetchone()
+        if row is not None and row[1:] == (stat.st_size, stat.st_mtime_ns):
+            return 0
+
+        with profiler.stage('parsing'):
+            records = list(Parser(file).hands(details=True))
+            hands = HandStore.from_hands(record[:3] for record in records)
+        ## Hands audited are counted as selected, see main.count_database
+        profiler.count('hands ingested', len(hands))
+        profiler.count('players ingested', hands.players.sum())
+        with profiler.stage('evaluation'):
+            hands.set_ranks(*hand_rank_classes(hands, allcombinations=True))
+        profiler.count('evaluations', len(hands.hand_ranks) + len(hands.allcombinations_ranks))
+
+        with profiler.stage('database'), self.connection:
+            if row is None:
+                file_id = self.connection.execute(
+                    'INSERT INTO files (name, size, mtime_ns) VALUES (?, ?, ?)', (name, stat.st_size, stat.st_mtime_ns)
+                ).lastrowid
+            else:
+                file_id = row[0]
+                self.connection.execute('DELETE FROM hands WHERE file = ?', (file_id,))
+                self.connection.execute(
+                    'UPDATE files SET size = ?, mtime_ns = ? WHERE id = ?', (stat.st_size, stat.st_mtime_ns, file_id)
+                )
+            keep = self._new_hands(hands.hand_ids)
+            self.duplicates += len(keep) - int(keep.sum())
+            self._insert(file_id, hands, records, keep)
+        return int(keep.sum())
+
+    # Find hands with a hand number that is unknown, or not in the database or earlier in hand_ids
+    ## hand_ids: np.ndarray of uint64, 0 if unknown
+    ## Returns np.ndarray of bools
+    def _new_hands(self, hand_ids):
+        _, first = np.unique(hand_ids, return_index=True)
+        keep = np.zeros(len(hand_ids), dtype=bool)
+        keep[first] = True
+        keep |= hand_ids == 0
+        numbers = np.unique(hand_ids[hand_ids != 0]).tolist()
+        existing = set()
+        for i in range(0, len(numbers), self._LOOKUP_SIZE):
+            lookup = numbers[i:i+self._LOOKUP_SIZE]
+            existing.update(x for x, in self.connection.execute(
+                'SELECT hand_number FROM hands WHERE hand_number IN ({})'.format(','.join('?' * len(lookup))), lookup
+            ))
+        if existing:
+            keep &= ~np.isin(hand_ids, np.array(sorted(existing), dtype=np.uint64))
+        return keep
+
+    def _insert(self, file_id, hands, records, keep):
+        seats = [seat for record in records for seat in record[4]]
+        position_ids = self._position_ids({position for position, _ in seats})
+        positions = bytes(position_ids[position] for position, _ in seats)
+        is_me = bytes(int(is_me) for _, is_me in seats)
+        hole_cards = hands.hole_cards.tobytes()
+        hand_ranks = hands.hand_ranks.tobytes()
+        allcombinations_ranks = hands.allcombinations_ranks.tobytes()
+        player_offsets = hands.player_offsets.tolist()
+        rank_offsets = hands.hand_rank_offsets.tolist()
+        combination_offsets = hands.allcombinations_rank_offsets.tolist()
+        self.connection.executemany(
+            'INSERT INTO hands (file, hand_index, hand_number, time, board_length, board, hole_cards, positions, is_me, '
+            'hand_ranks, allcombinations_ranks) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                (file_id, i, int(hands.hand_ids[i]) or None, records[i][3], int(hands.board_lengths[i]),
+                 hands.boards[i].tobytes(),
+                 hole_cards[2*player_offsets[i]:2*player_offsets[i+1]],
+                 positions[player_offsets[i]:player_offsets[i+1]],
+                 is_me[player_offsets[i]:player_offsets[i+1]],
+                 hand_ranks[rank_offsets[i]:rank_offsets[i+1]],
+                 allcombinations_ranks[combination_offsets[i]:combination_offsets[i+1]])
+                for i in np.flatnonzero(keep).tolist()
+            )
+        )
+
+    # Get the IDs of positions, adding positions not in the database
+    ## names: set of strs, e.g. {'Dealer', 'Big Blind'}
+    ## Returns dict of str to int
+    def _position_ids(self, names):
+        ids = dict(self.connection.execute('SELECT name, id FROM positions'))
+        for name in sorted(names - ids.keys()):
+            ids[name] = self.connection.execute('INSERT INTO positions (name) VALUES (?)', (name,)).lastrowid
+        return ids
+
+    # Select hands of a subset of the database, in order of files and of hands in each file, in batches
+    # Hands are only selected with the players that match the filters, and hands without any are skipped
+    ## only_me: bool, only my ([ME]) hole cards
+    ## since: str or None, only hands at or after a date or time, e.g. '2021-01' or '2021-01-15 18:00'
+    ## until: str or None, only hands before a date or time, e.g. '2021-02' for hands of January with since='2021-01'
+    ## positions: list of strs or None, only players of these positions, e.g. ['Dealer', 'Big Blind']
+    ## board_lengths: list of ints or None, only hands with these numbers of board cards, e.g. [5] for the river
+    ## allcombinations: bool, select rank classes of all combinations
+    ## Yields Store.HandStore of hands with rank classes
+    def select(self, only_me=False, since=None, until=None, positions=None, board_lengths=None, allcombinations=False):
+        conditions = []
+        parameters = []
+        if since is not None:
+            conditions.append('time >= ?')
+            parameters.append(since)
+        if until is not None:
+            conditions.append('time < ?')
+            parameters.append(until)
+        if board_lengths:
+            conditions.append('board_length IN ({})'.format(','.join('?' * len(board_lengths))))
+            parameters += board_lengths
+        position_ids = None
+        if positions:
+            position_ids = np.array([x for x, in self.connection.execute(
+                'SELECT id FROM positions WHERE name IN ({})'.format(','.join('?' * len(positions))), positions
+            )], dtype=np.uint8)
+        cursor = self.connection.execute(
+            'SELECT hand_number, board_length, board, hole_cards, positions, is_me, hand_ranks, {} '
+            'FROM hands {} ORDER BY file, hand_index'.format(
+                'allcombinations_ranks' if allcombinations else 'NULL',
+                'WHERE ' + ' AND '.join(conditions) if conditions else '',
+            ),
+            parameters
+        )
+        while True:
+            rows = cursor.fetchmany(self._BATCH_SIZE)
+            if not rows:
+                break
+            hands = self._hand_store(rows, only_me, position_ids, allcombinations)
+            if len(hands):
+                yield hands
+
+    # Build a store of selected rows of hands, with the players that match the filters, see select()
+    ## position_ids: np.ndarray of uint8 or None, IDs of the positions of players selected, None for all players
+    @staticmethod
+    def _hand_store(rows, only_me, position_ids, allcombinations):
+        hand_numbers, board_lengths, boards, hole_cards, positions, is_me, hand_ranks, allcombinations_ranks = zip(*rows)
+        hands = HandStore(
+            hand_ids=np.array([x or 0 for x in hand_numbers], dtype=np.uint64),
+            players=np.fromiter(map(len, is_me), dtype=np.uint8, count=len(rows)),
+            hole_cards=np.frombuffer(b''.join(hole_cards), dtype=np.uint8).reshape(-1, 2),
+            board_lengths=board_lengths,
+            boards=np.frombuffer(b''.join(boards), dtype=np.uint8).reshape(-1, 5),
+        )
+        hands.set_ranks(
+            np.frombuffer(b''.join(hand_ranks), dtype=np.uint8),
+            np.frombuffer(b''.join(allcombinations_ranks), dtype=np.uint8) if allcombinations else None,
+        )
+        if not only_me and position_ids is None:
+            return hands
+        selected = np.ones(len(hands.hole_cards), dtype=bool)
+        if only_me:
+            selected &= np.frombuffer(b''.join(is_me), dtype=np.uint8) == 1
+        if position_ids is not None:
+            selected &= np.isin(np.frombuffer(b''.join(positions), dtype=np.uint8), position_ids)
+        return hands.select_players(selected)
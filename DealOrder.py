@@ -0,0 +1,133 @@
+import math
+import numpy as np
+from Parse import CARDS
+from Statistics import chi_square, chi2_sf, kstest_uniform
+
+# Tests of the order of dealt cards, which frequency tests don't cover, e.g. a shuffler that deals
+# correct proportions of cards in a correlated order. The cards of each hand are a stream of the hole
+# cards of each player, in order of players, and then the board. A fair shuffle deals any positions of
+# a stream as a uniform sample of the deck without replacement, so each test has an exact null
+# hypothesis, e.g. consecutive cards have the same suit with probability 12/51.
+# Streams must be of every dealt hand, see Audit.dealt_hands, as hands that reach a board are selected by
+# their hole cards, e.g. pocket pairs see more flops, and hole cards of only those hands aren't uniform.
+# Board cards are only in streams of hands whose board was dealt. Given the hole cards, the board is a
+# uniform sample of the rest of the deck, but its hands still lean slightly towards the hole cards
+# that see flops, so tests of positions after the hole cards are exact only up to that selection.
+# All tests are computed at once from arrays of every card of a Store.HandStore. Chi-square tests use
+# expected sizes that aren't rounded, as rounding biases tables of many small expected sizes.
+class DealOrderTests:
+    ## Correlation of card IDs of any two positions of a stream, -variance/(N-1) of a sample without replacement
+    EXPECTED_CORRELATION = -1 / (len(CARDS) - 1)
+    ## Probability of consecutive cards of the same suit and of the same rank
+    SAME_SUIT = 12 / (len(CARDS) - 1)
+    SAME_RANK = 3 / (len(CARDS) - 1)
+    GAP_TAIL = 0.05 # Gaps are counted up to a length expected to be exceeded at most this often
+
+    ## hands: Store.HandStore, every dealt hand, including hands without a board
+    def __init__(self, hands):
+        self.hands = len(hands)
+        hole_lengths = 2 * hands.players.astype(np.int64)
+        board_lengths = hands.board_lengths.astype(np.int64)
+        stream_lengths = hole_lengths + board_lengths
+        stream_offsets = np.concatenate(([0], np.cumsum(stream_lengths)))
+        self.cards = int(stream_offsets[-1])
+
+        # Card IDs of all streams, and hand of each card
+        stream = np.empty(self.cards, dtype=np.int64)
+        hole_hands = np.repeat(np.arange(self.hands), hole_lengths)
+        hole_offsets = np.concatenate(([0], np.cumsum(hole_lengths)))
+        stream[np.arange(len(hole_hands)) - hole_offsets[hole_hands] + stream_offsets[hole_hands]] = \
+            hands.hole_cards.ravel()
+        board_hands = np.repeat(np.arange(self.hands), board_lengths)
+        board_offsets = np.concatenate(([0], np.cumsum(board_lengths)))
+        stream[
+            np.arange(len(board_hands)) - board_offsets[board_hands] + stream_offsets[board_hands] + hole_lengths[board_hands]
+        ] = hands.boards[np.arange(hands.boards.shape[1]) < board_lengths[:, None]]
+        stream_hands = np.repeat(np.arange(self.hands), stream_lengths)
+
+        # Consecutive cards of each stream
+        consecutive = stream_hands[1:] == stream_hands[:-1]
+        first, second = stream[:-1][consecutive], stream[1:][consecutive]
+        pair_hands = stream_hands[:-1][consecutive]
+        pairs = stream_lengths - 1
+
+        mean, variance = (len(CARDS) - 1) / 2, (len(CARDS)**2 - 1) / 12
+        products = (first - mean) * (second - mean) / variance
+        self.serial_correlation = float(products.mean()) if len(products) else math.nan
+        self.serial_correlation_pvalue = self._pvalue(products, pair_hands, pairs * self.EXPECTED_CORRELATION)
+
+        # Runs of cards of the same suit and rank, one more than the number of changes of each stream
+        self.suit_runs, self.expected_suit_runs, self.suit_runs_pvalue = self._runs(
+            first % 4 == second % 4, pair_hands, pairs, stream_lengths, self.SAME_SUIT
+        )
+        self.rank_runs, self.expected_rank_runs, self.rank_runs_pvalue = self._runs(
+            first // 4 == second // 4, pair_hands, pairs, stream_lengths, self.SAME_RANK
+        )
+
+        # 52x52 transition counts of non-overlapping consecutive pairs of each stream, i.e. cards 1-2, 3-4, ...
+        # Pairs are uniform over the 52*51 pairs of different cards, so the diagonal is excluded
+        starts = consecutive & ((np.arange(self.cards - 1) - stream_offsets[stream_hands[:-1]]) % 2 == 0)
+        transitions = np.bincount(
+            stream[:-1][starts] * len(CARDS) + stream[1:][starts], minlength=len(CARDS)**2
+        )
+        expected = (1 - np.eye(len(CARDS)).ravel()) * transitions.sum() / (len(CARDS) * (len(CARDS) - 1))
+        self.transition_chi_square, self.transition_degrees_of_freedom = (float(x) for x in chi_square(transitions, expected))
+        self.transition_pvalue = float(chi2_sf(self.transition_chi_square, self.transition_degrees_of_freedom))
+
+        # Gap tests of each card, the number of hands until the card is dealt again, see _gap_proportions
+        deal_probabilities = stream_lengths / len(CARDS)
+        mean_probability = float(deal_probabilities.mean()) if self.hands else 1.0
+        self.max_gap = max(1, math.ceil(math.log(self.GAP_TAIL) / math.log1p(-mean_probability))) \
+            if mean_probability < 1 else 1
+        order = np.lexsort((stream_hands, stream))
+        ordered_cards, ordered_hands = stream[order], stream_hands[order]
+        gaps = np.diff(ordered_hands)
+        gaps[ordered_cards[1:] != ordered_cards[:-1]] = 0 # Across cards
+        gaps = np.append(gaps, 0)
+        ## Last deals of each card, and gaps longer than max_gap, are in the last category
+        gaps[(gaps == 0) | (gaps > self.max_gap)] = self.max_gap + 1
+        gap_counts = np.bincount(
+            ordered_cards * (self.max_gap + 1) + gaps - 1, minlength=len(CARDS) * (self.max_gap + 1)
+        ).reshape(len(CARDS), self.max_gap + 1)
+        expected = gap_counts.sum(axis=1, keepdims=True) * self._gap_proportions(deal_probabilities)
+        ## p-value of the chi-square test of each card, and KS uniformity test of the p-values
+        self.gap_pvalues = chi2_sf(*chi_square(gap_counts, expected))
+        self.gap_ks, self.gap_ks_pvalue = kstest_uniform(self.gap_pvalues.tolist())
+
+    # Two-sided p-value of the sum of values of pairs, with the expected sum of each hand
+    # Hands are independent, so the sum is normalized by the deviations of the sums of each hand
+    ## values: np.ndarray of floats, value of each pair
+    ## pair_hands: np.ndarray of ints, hand of each pair
+    ## expected: np.ndarray of floats, expected sum of each hand
+    def _pvalue(self, values, pair_hands, expected):
+        deviations = np.bincount(pair_hands, weights=values, minlength=self.hands) - expected
+        scale = math.sqrt(float((deviations**2).sum()))
+        if scale == 0:
+            return math.nan
+        return math.erfc(abs(float(deviations.sum())) / scale / math.sqrt(2))
+
+    # Runs test of consecutive cards that match, e.g. have the same suit
+    ## matches: np.ndarray of bools, whether each pair matches
+    ## probability: float, probability of a match
+    ## Returns (int, float, float), number of runs, expected number of runs, p-value
+    def _runs(self, matches, pair_hands, pairs, stream_lengths, probability):
+        runs = int(stream_lengths.sum() - matches.sum())
+        expected = float(stream_lengths.sum() - pairs.sum() * probability)
+        return runs, expected, self._pvalue(matches.astype(np.float64), pair_hands, pairs * probability)
+
+    # Expected proportions of gaps of 1 to max_gap hands, and longer gaps or no later deal, of a card.
+    # A card is dealt in hand h with probability p_h, its stream length over 52, so a deal in hand h has a
+    # gap of g with probability p_h+g times the probability of no deal in hands h+1 to h+g-1.
+    # Proportions are the mean over hands of these probabilities, weighted by p_h.
+    ## deal_probabilities: np.ndarray of floats, p_h of each hand
+    ## Returns np.ndarray of floats, shape=(max_gap+1,)
+    def _gap_proportions(self, deal_probabilities):
+        later = np.append(deal_probabilities, np.zeros(self.max_gap))
+        survival = np.ones(self.hands)
+        proportions = np.zeros(self.max_gap + 1)
+        for gap in range(1, self.max_gap + 1):
+            probabilities = later[gap:gap + self.hands]
+            proportions[gap - 1] = (deal_probabilities * survival * probabilities).sum()
+            survival *= 1 - probabilities
+        proportions[-1] = (deal_probabilities * survival).sum()
+        return proportions / proportions.sum() if proportions.sum() else proportions
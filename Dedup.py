@@ -0,0 +1,181 @@
+import os
+import tempfile
+import zipfile
+import numpy as np
+from Store import load_npz
+from Parse import source_file
+
+# Bloom filter of uint64 keys, a bit array with HASHES bits set for each key.
+# Keys that were never added are found with a small false positive rate, so only keys that may
+# have been added have to be looked up in an exact index.
+class BloomFilter:
+    HASHES = 4
+    ## Odd 64 bit multipliers of each hash, the hash is the top bits of the product
+    _MULTIPLIERS = np.array([
+        0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93,
+    ], dtype=np.uint64)
+
+    ## bits: int, size of the bit array, rounded up to a power of 2 of at least 64
+    def __init__(self, bits):
+        self.shift = np.uint64(64 - max(int(bits) - 1, 63).bit_length())
+        self.bits = np.zeros(1 << (64 - int(self.shift)) >> 3, dtype=np.uint8)
+
+    def _indexes(self, keys):
+        keys = np.asarray(keys, dtype=np.uint64)
+        return (keys[None, :] * self._MULTIPLIERS[:self.HASHES, None]) >> self.shift
+
+    ## keys: np.ndarray of uint64
+    def add(self, keys):
+        indexes = self._indexes(keys).ravel()
+        np.bitwise_or.at(self.bits, indexes >> np.uint64(3), (1 << (indexes & np.uint64(7))).astype(np.uint8))
+
+    # Check if keys may have been added
+    ## keys: np.ndarray of uint64
+    ## Returns np.ndarray of bools, False if the key was never added
+    def contains(self, keys):
+        indexes = self._indexes(keys)
+        return ((self.bits[indexes >> np.uint64(3)] >> (indexes & np.uint64(7)).astype(np.uint8)) & 1).all(axis=0)
+
+# Index of hand numbers already counted, for skipping hands repeated in overlapping hand history files.
+# Hand numbers are kept in sorted uint64 runs, each at least twice as long as the next, so adding
+# hands merges runs in amortized O(log n) per hand and looking hands up is a binary search of each run.
+# The index can be saved and loaded with a cache, so each hand number has an owner, the file it was
+# first counted from. Hands of owners that are not audited again (see start()) are not duplicates.
+# Hand number 0, i.e. unknown, is never a duplicate.
+class HandIndex:
+    VERSION = 1 # Increment when the format of saved indexes changes
+
+    ## bloom_bits: int, size of a Bloom filter in front of the index, 0 for none
+    def __init__(self, bloom_bits=0):
+        self.runs = [] # List of (np.ndarray of uint64 hand numbers, np.ndarray of uint32 owners), sorted by hand number
+        self.files = [] # List of (filename, size, mtime_ns) of each owner
+        self.duplicates = 0 # Number of hands skipped as duplicates
+        self._owners = {} # Dict of (filename, size, mtime_ns) to owner
+        self._active = [] # List of bools of each owner, hands of active owners are duplicates
+        self._added = set() # Owners that were added to by this run
+        self.bloom = BloomFilter(bloom_bits) if bloom_bits else None
+
+    # Number of hand numbers in the index
+    def __len__(self):
+        return sum(len(ids) for ids, _ in self.runs)
+
+    def _owner(self, key):
+        if key not in self._owners:
+            self._owners[key] = len(self.files)
+            self.files.append(key)
+            self._active.append(True)
+        return self._owners[key]
+
+    # Set the files of this run, hands owned by any other file are not duplicates
+    # Files are identified by name, size, and modification time, so hands of changed files are owned again
+    ## files: list of strs, filenames including path
+    def start(self, files):
+        self._active = [False] * len(self.files)
+        for file in files:
+            stat = os.stat(source_file(file))
+            self._active[self._owner((os.path.abspath(file), stat.st_size, stat.st_mtime_ns))] = True
+
+    # Find hands not counted before, and add them to the index
+    ## hand_ids: np.ndarray of uint64, hand numbers of a batch of hands
+    ## file: str or None, file of the hands, should be one of the files of start()
+    ## Returns np.ndarray of bools, True for each hand that is not a duplicate
+    def add(self, hand_ids, file=None):
+        hand_ids = np.asarray(hand_ids, dtype=np.uint64)
+        if file is None:
+            owner = self._owner(('', 0, 0))
+        else:
+            stat = os.stat(source_file(file))
+            owner = self._owner((os.path.abspath(file), stat.st_size, stat.st_mtime_ns))
+        # Hands the owner had when the index was loaded were counted by the same file in an earlier run
+        owned_before = owner not in self._added
+        self._added.add(owner)
+
+        # First hand of each hand number in the batch
+        _, first = np.unique(hand_ids, return_index=True)
+        keep = np.zeros(len(hand_ids), dtype=bool)
+        keep[first] = True
+        keep |= hand_ids == 0
+        candidates = np.flatnonzero(keep & (hand_ids != 0))
+        if self.bloom is not None and len(self):
+            lookups = candidates[self.bloom.contains(hand_ids[candidates])]
+        else:
+            lookups = candidates
+
+        # Hand numbers in the index are duplicates if their owner is active
+        found = np.zeros(len(hand_ids), dtype=bool)
+        active = np.array(self._active, dtype=bool)
+        for ids, owners in self.runs:
+            i = np.searchsorted(ids, hand_ids[lookups])
+            hit = i < len(ids)
+            hit[hit] = ids[i[hit]] == hand_ids[lookups[hit]]
+            i = i[hit]
+            found[lookups[hit]] = True
+            run_owners = owners[i].astype(np.intp)
+            duplicate = active[run_owners] & ((run_owners != owner) | (not owned_before))
+            keep[lookups[hit][duplicate]] = False
+            owners[i[~duplicate]] = owner # Hands of inactive owners are owned by this file
+
+        new_ids = hand_ids[candidates[~found[candidates]]]
+        if len(new_ids):
+            self._insert(np.sort(new_ids), np.full(len(new_ids), owner, dtype=np.uint32))
+        self.duplicates += len(hand_ids) - int(keep.sum())
+        return keep
+
+    # Add a sorted run, merging runs that are not at least twice as long as the next
+    def _insert(self, ids, owners):
+        if self.bloom is not None:
+            self.bloom.add(ids)
+        while self.runs and len(self.runs[-1][0]) <= 2*len(ids):
+            run_ids, run_owners = self.runs.pop()
+            ids = np.concatenate((run_ids, ids))
+            owners = np.concatenate((run_owners, owners))
+            order = np.argsort(ids, kind='stable') # Merges the two sorted runs in linear time
+            ids, owners = ids[order], owners[order]
+        self.runs.append((ids, owners))
+
+    # Load an index saved with save(), or an empty index if there is none or it can't be read
+    ## path: str, filename including path
+    ## bloom_bits: int, size of a Bloom filter in front of the index, 0 for none
+    @classmethod
+    def load(cls, path, bloom_bits=0):
+        index = cls(bloom_bits)
+        try:
+            arrays = load_npz(path)
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+            return index
+        if arrays.get('version') != cls.VERSION:
+            return index
+        for key in zip(arrays['files'].tolist(), arrays['sizes'].tolist(), arrays['mtimes_ns'].tolist()):
+            index._owner(key)
+        index._active = [False] * len(index.files)
+        if len(arrays['ids']):
+            index._insert(arrays['ids'], arrays['owners'])
+        return index
+
+    # Save hands of the files of this run, see start()
+    # Written to a temporary file first, so an interrupted run never leaves a partial index
+    ## path: str, filename including path
+    def save(self, path):
+        active = np.array(self._active, dtype=bool)
+        numbers = np.cumsum(active) - 1 # New owner of each active owner
+        ids = np.concatenate([ids for ids, _ in self.runs] or [np.zeros(0, dtype=np.uint64)])
+        owners = np.concatenate([owners for _, owners in self.runs] or [np.zeros(0, dtype=np.uint32)])
+        kept = active[owners.astype(np.intp)]
+        order = np.argsort(ids[kept])
+        files = [key for key, is_active in zip(self.files, self._active) if is_active]
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    version=np.int64(self.VERSION),
+                    ids=ids[kept][order],
+                    owners=numbers[owners[kept].astype(np.intp)][order].astype(np.uint32),
+                    files=np.array([key[0] for key in files], dtype=str),
+                    sizes=np.array([key[1] for key in files], dtype=np.int64),
+                    mtimes_ns=np.array([key[2] for key in files], dtype=np.int64),
+                )
+            os.replace(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
@@ -0,0 +1,200 @@
+import os
+import tempfile
+import numpy as np
+from itertools import combinations
+from math import comb
+from treys import Card
+from treys.lookup import LookupTable
+from Parse import CARDS, HAND_PROBABILITIES
+
+# Hand rank labels, indexed by rank class, 0 is high card and 8 is straight flush
+HAND_LABELS = list(HAND_PROBABILITIES.keys())
+
+# Highest treys hand rank of each rank class, best to worst
+# Royal flushes are counted as straight flushes, as in HAND_PROBABILITIES
+_MAX_RANKS = [
+    (LookupTable.MAX_STRAIGHT_FLUSH, 'straight flush'),
+    (LookupTable.MAX_FOUR_OF_A_KIND, 'four of a kind'),
+    (LookupTable.MAX_FULL_HOUSE, 'full house'),
+    (LookupTable.MAX_FLUSH, 'flush'),
+    (LookupTable.MAX_STRAIGHT, 'straight'),
+    (LookupTable.MAX_THREE_OF_A_KIND, 'three of a kind'),
+    (LookupTable.MAX_TWO_PAIR, 'two pair'),
+    (LookupTable.MAX_PAIR, 'pair'),
+    (LookupTable.MAX_HIGH_CARD, 'high card'),
+]
+
+# Get rank class of treys hand rank
+## rank: int, treys hand rank, 1-7462
+def treys_rank_class(rank):
+    for max_rank, label in _MAX_RANKS:
+        if rank <= max_rank:
+            return HAND_LABELS.index(label)
+    raise ValueError('Invalid hand rank {}'.format(rank))
+
+# Precomputed tables, card ID is the index of the card in CARDS
+## Rank prime of each card ID
+CARD_PRIMES = [Card.PRIMES[i // 4] for i in range(len(CARDS))]
+## Suit of each card ID
+CARD_SUITS = [i % 4 for i in range(len(CARDS))]
+## Prime product of 5 card hand to rank class, for flushes and everything else
+_lookup_table = LookupTable()
+FLUSH_RANK_CLASSES = {p: treys_rank_class(r) for p, r in _lookup_table.flush_lookup.items()}
+UNSUITED_RANK_CLASSES = {p: treys_rank_class(r) for p, r in _lookup_table.unsuited_lookup.items()}
+del _lookup_table
+
+# Get rank class of 5 cards
+## cards: sequence of card IDs, length=5
+def five_card_rank_class(cards):
+    a, b, c, d, e = cards
+    p = CARD_PRIMES[a] * CARD_PRIMES[b] * CARD_PRIMES[c] * CARD_PRIMES[d] * CARD_PRIMES[e]
+    if CARD_SUITS[a] == CARD_SUITS[b] == CARD_SUITS[c] == CARD_SUITS[d] == CARD_SUITS[e]:
+        return FLUSH_RANK_CLASSES[p]
+    return UNSUITED_RANK_CLASSES[p]
+# Get rank class of the best 5 card hand
+# Rank class increases with hand strength, so the best hand has the highest rank class
+## cards: sequence of card IDs, length=5,6,7
+def rank_class(cards):
+    if len(cards) == 5:
+        return five_card_rank_class(cards)
+    return max(map(five_card_rank_class, combinations(cards, 5)))
+
+# Batch evaluation with NumPy
+# Prime products are looked up with a binary search over the sorted keys of the rank class tables
+_BATCH_SIZE = 1 << 14 # Hands per chunk, bounds memory of temporary arrays
+_CARD_PRIMES = np.array(CARD_PRIMES, dtype=np.int64)
+_FLUSH_KEYS = np.array(sorted(FLUSH_RANK_CLASSES), dtype=np.int64)
+_FLUSH_CLASSES = np.array([FLUSH_RANK_CLASSES[p] for p in _FLUSH_KEYS], dtype=np.uint8)
+_UNSUITED_KEYS = np.array(sorted(UNSUITED_RANK_CLASSES), dtype=np.int64)
+_UNSUITED_CLASSES = np.array([UNSUITED_RANK_CLASSES[p] for p in _UNSUITED_KEYS], dtype=np.uint8)
+## Indexes of all 5 card combinations of k cards, in itertools.combinations order
+COMBINATIONS = {k: np.array(list(combinations(range(k), 5)), dtype=np.intp) for k in (5, 6, 7)}
+## Number of 5 card combinations of k cards, indexed by k
+COMBINATION_COUNTS = np.array([comb(k, 5) for k in range(8)])
+
+# Get rank classes of N hands of 5 cards
+## cards: array-like of card IDs, shape=(N, 5)
+## Returns np.ndarray of uint8, shape=(N,)
+def five_card_rank_classes(cards):
+    cards = np.asarray(cards)
+    products = _CARD_PRIMES[cards].prod(axis=1)
+    suits = cards & 3
+    flush = (suits == suits[:, :1]).all(axis=1)
+    classes = _UNSUITED_CLASSES[np.searchsorted(_UNSUITED_KEYS, products)]
+    if flush.any():
+        classes[flush] = _FLUSH_CLASSES[np.searchsorted(_FLUSH_KEYS, products[flush])]
+    return classes
+# Get rank classes of all 5 card combinations of N hands of k cards
+## cards: array-like of card IDs, shape=(N, k), k=5,6,7
+## Returns np.ndarray of uint8, shape=(N, C(k,5)), in itertools.combinations order of the cards sorted by card ID
+def combination_rank_classes(cards):
+    cards = np.asarray(cards, dtype=np.uint8)
+    n, k = cards.shape
+    combos = COMBINATIONS[k]
+    classes = np.empty((n, len(combos)), dtype=np.uint8)
+    for i in range(0, n, _BATCH_SIZE):
+        # Combinations of sorted cards are sorted, as needed for colex indexes
+        chunk = np.sort(cards[i:i+_BATCH_SIZE], axis=1)[:, combos] # shape=(chunk, C(k,5), 5)
+        if _rank_table is not None:
+            classes[i:i+_BATCH_SIZE] = _rank_table[colex_indexes(chunk)]
+        else:
+            classes[i:i+_BATCH_SIZE] = five_card_rank_classes(chunk.reshape(-1, 5)).reshape(len(chunk), len(combos))
+    return classes
+# Get rank classes of the best 5 card hands of N hands of k cards
+## cards: array-like of card IDs, shape=(N, k), k=5,6,7
+## Returns np.ndarray of uint8, shape=(N,)
+def rank_classes(cards):
+    return combination_rank_classes(cards).max(axis=1)
+# Get rank classes of every player's hand in hands with a board
+## hands: Store.HandStore
+## allcombinations: bool, also get rank classes of all 5 card combinations
+## Returns (hand_ranks, allcombinations_ranks), np.ndarrays of uint8 in player order,
+## allcombinations_ranks is None if not allcombinations
+def hand_rank_classes(hands, allcombinations=False):
+    players = hands.players
+    player_board_lengths = np.repeat(hands.board_lengths, players)
+    has_board = player_board_lengths > 0
+    cards = np.concatenate((hands.hole_cards, np.repeat(hands.boards, players, axis=0)), axis=1)[has_board]
+    lengths = player_board_lengths[has_board] + 2
+
+    hand_ranks = np.empty(len(cards), dtype=np.uint8)
+    allcombinations_ranks = None
+    if allcombinations:
+        # Offsets of each player's combinations
+        combination_offsets = np.concatenate(([0], np.cumsum(COMBINATION_COUNTS[lengths])))
+        allcombinations_ranks = np.empty(combination_offsets[-1], dtype=np.uint8)
+    # Evaluate hands with the same number of cards together
+    for k in np.unique(lengths):
+        indexes = np.flatnonzero(lengths == k)
+        classes = combination_rank_classes(cards[indexes, :k])
+        hand_ranks[indexes] = classes.max(axis=1)
+        if allcombinations:
+            allcombinations_ranks[combination_offsets[indexes, None] + np.arange(classes.shape[1])] = classes
+    return hand_ranks, allcombinations_ranks
+
+# Full table of rank classes of every 5 card hand, indexed by colex index
+# Looking up a hand is then a single index, instead of a prime product and binary search
+RANK_TABLE_SIZE = comb(len(CARDS), 5)
+## Colex index term of card ID c at position j of sorted cards, C(c, j+1)
+_COLEX_TERMS = np.array([[comb(c, j+1) for j in range(5)] for c in range(len(CARDS))], dtype=np.int64)
+## Rank table used by combination_rank_classes, None to use prime products, see use_rank_table
+_rank_table = None
+_rank_table_path = None
+
+# Get colex indexes of N hands of 5 cards
+# The colex index of sorted card IDs c_0 < ... < c_4 is the sum of C(c_j, j+1), 0 to C(52,5)-1
+## cards: array-like of card IDs, shape=(..., 5), each row sorted in increasing order
+## Returns np.ndarray of int64, shape=(...)
+def colex_indexes(cards):
+    cards = np.asarray(cards, dtype=np.intp)
+    return _COLEX_TERMS[cards, np.arange(5)].sum(axis=-1)
+
+# Build the rank table of every 5 card hand
+## Returns np.ndarray of uint8, shape=(RANK_TABLE_SIZE,)
+def build_rank_table():
+    table = np.empty(RANK_TABLE_SIZE, dtype=np.uint8)
+    hands = np.fromiter(
+        (c for hand in combinations(range(len(CARDS)), 5) for c in hand), dtype=np.uint8, count=RANK_TABLE_SIZE*5
+    ).reshape(-1, 5)
+    for i in range(0, len(hands), _BATCH_SIZE*16):
+        chunk = hands[i:i+_BATCH_SIZE*16]
+        table[colex_indexes(chunk)] = five_card_rank_classes(chunk)
+    return table
+
+# Load the rank table from a .npy file as a memory map, building and saving it if it doesn't exist
+## path: str, path of .npy file
+## Returns np.ndarray of uint8, shape=(RANK_TABLE_SIZE,)
+def load_rank_table(path):
+    try:
+        table = np.load(path, mmap_mode='r')
+        if table.shape == (RANK_TABLE_SIZE,) and table.dtype == np.uint8:
+            return table
+    except (OSError, ValueError):
+        pass
+    table = build_rank_table()
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first, so other processes never load a partial table
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, table)
+    os.replace(temp_path, path)
+    return np.load(path, mmap_mode='r')
+
+# Use the rank table of a .npy file in combination_rank_classes, see load_rank_table
+# Is only loaded once per process
+## path: str or None, path of .npy file, None to use prime products
+def use_rank_table(path):
+    global _rank_table, _rank_table_path
+    if path != _rank_table_path:
+        _rank_table = load_rank_table(path) if path else None
+        _rank_table_path = path
+
+# Get rank class histograms of all 5 card combinations of N hands of k cards
+## cards: array-like of card IDs, shape=(N, k), k=5,6,7
+## Returns np.ndarray of ints, shape=(N, len(HAND_LABELS)), number of combinations of each rank class
+def combination_rank_histograms(cards):
+    classes = combination_rank_classes(cards)
+    n = len(classes)
+    indexes = (np.arange(n)[:, None] * len(HAND_LABELS) + classes).ravel()
+    return np.bincount(indexes, minlength=n*len(HAND_LABELS)).reshape(n, len(HAND_LABELS))
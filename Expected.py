@@ -0,0 +1,272 @@
+import os
+import json
+import argparse
+import tempfile
+import numpy as np
+from math import comb, prod
+from itertools import combinations, combinations_with_replacement
+from Parse import CARDS
+from Evaluate import HAND_LABELS, combination_rank_classes, use_rank_table
+from Audit import HOLE_CARD_LABELS, HOLE_CARD_NOSUITS_LABELS
+from Results import Results
+
+# Statistics with expected distributions
+## card: individual cards of hole cards and boards
+## hole_cards: hole cards with suits
+## hole_cards_nosuits: hole cards without suits
+## hand: best 5 card hand of hole cards and a board of board_length cards
+## allcombinations: every 5 card combination of hole cards and a board of board_length cards
+STATISTICS = ('card', 'hole_cards', 'hole_cards_nosuits', 'hand', 'allcombinations')
+## Statistics whose distribution depends on the board length
+BOARD_STATISTICS = ('hand', 'allcombinations')
+
+_RANKS = 13
+_SUITS = 4
+## Sets of ranks of each straight, including the wheel (A2345), rank 0 is 2 and 12 is A
+_STRAIGHTS = [frozenset(range(r, r+5)) for r in range(_RANKS-4)] + [frozenset((12, 0, 1, 2, 3))]
+
+# Check if a set of ranks contains a straight
+## ranks: set of ints
+def has_straight(ranks):
+    return any(straight <= ranks for straight in _STRAIGHTS)
+
+# Get rank class of cards without a flush, from the number of cards of each rank
+## multiplicities: dict of rank to number of cards of the rank
+def unsuited_rank_class(multiplicities):
+    counts = sorted(multiplicities.values(), reverse=True)
+    if counts[0] == 4:
+        label = 'four of a kind'
+    elif counts[0] == 3 and counts[1] >= 2:
+        label = 'full house'
+    elif len(counts) >= 5 and has_straight(set(multiplicities)):
+        label = 'straight'
+    elif counts[0] == 3:
+        label = 'three of a kind'
+    elif counts[0] == 2 and counts[1] == 2:
+        label = 'two pair'
+    elif counts[0] == 2:
+        label = 'pair'
+    else:
+        label = 'high card'
+    return HAND_LABELS.index(label)
+
+# Count k card hands of a 52 card deck by rank class of their best 5 card hand
+# Hands are enumerated by multiset of ranks. Suits of each multiset are counted
+# combinatorially: a flush has one suit with at least 5 distinct ranks, which for
+# k <= 7 can't also make a full house or four of a kind, so its rank class only
+# depends on the ranks of the flush suit.
+## k: int, number of cards, 5-7
+## Returns list of ints, number of hands of each rank class, summing to C(52, k)
+def count_best_hands(k):
+    if not 5 <= k <= 7:
+        raise ValueError('Can only count hands of 5-7 cards, not {}'.format(k))
+    flush_class = HAND_LABELS.index('flush')
+    straight_flush_class = HAND_LABELS.index('straight flush')
+    counts = [0] * len(HAND_LABELS)
+    for ranks in combinations_with_replacement(range(_RANKS), k):
+        multiplicities = {}
+        for r in ranks:
+            multiplicities[r] = multiplicities.get(r, 0) + 1
+        if max(multiplicities.values()) > _SUITS:
+            continue
+        hands = prod(comb(_SUITS, m) for m in multiplicities.values())
+        # Hands with a flush, by ranks of the flush suit
+        distinct = list(multiplicities)
+        for n in range(5, len(distinct)+1):
+            for flush_ranks in combinations(distinct, n):
+                flush_ranks = set(flush_ranks)
+                flushes = _SUITS * prod(
+                    comb(_SUITS-1, m-1) if r in flush_ranks else comb(_SUITS-1, m) for r, m in multiplicities.items()
+                )
+                counts[straight_flush_class if has_straight(flush_ranks) else flush_class] += flushes
+                hands -= flushes
+        counts[unsuited_rank_class(multiplicities)] += hands
+    return counts
+
+# Get number of outcomes of each label of a statistic, and the total number of outcomes
+## statistic: str, see STATISTICS
+## board_length: int 3,4,5, number of board cards, only used by BOARD_STATISTICS
+## Returns (dict of label to int, int)
+def count_outcomes(statistic, board_length=5):
+    if statistic == 'card':
+        return {x: 1 for x in CARDS}, len(CARDS)
+    if statistic == 'hole_cards':
+        return {x: 1 for x in HOLE_CARD_LABELS}, len(HOLE_CARD_LABELS)
+    if statistic == 'hole_cards_nosuits':
+        # Pairs have C(4,2) combinations of suits, other hole cards have 4*4
+        return (
+            {x: comb(_SUITS, 2) if x[0] == x[-1] else _SUITS*_SUITS for x in HOLE_CARD_NOSUITS_LABELS},
+            comb(len(CARDS), 2),
+        )
+    if statistic == 'hand':
+        return dict(zip(HAND_LABELS, count_best_hands(board_length + 2))), comb(len(CARDS), board_length + 2)
+    if statistic == 'allcombinations':
+        # Each 5 card combination of a uniformly dealt hand is a uniformly dealt 5 card hand
+        return dict(zip(HAND_LABELS, count_best_hands(5))), comb(len(CARDS), 5)
+    raise ValueError('Unknown statistic {}'.format(statistic))
+
+# Estimate the distributions of board statistics from randomly dealt hands, e.g. to check the exact distributions
+# of count_outcomes and the batch evaluator against each other. Hands are dealt and evaluated in batches,
+# each deal taking the first cards of a random permutation of the deck, and evaluated once for all statistics.
+## board_length: int 3,4,5, number of board cards
+## deals: int, number of hands dealt
+## seed: int or None, seed of the shuffler
+## batch_size: int, hands dealt at once, bounds memory
+## Returns dict of statistic of BOARD_STATISTICS to (np.ndarray of floats, np.ndarray of floats),
+##         proportion and its standard error of each label in HAND_LABELS order
+def simulate_outcomes(board_length=5, deals=1000000, seed=None, batch_size=1 << 16):
+    rng = np.random.default_rng(seed)
+    k = board_length + 2
+    # Sums of proportions of each deal, and of their squares, for standard errors of combinations of the same deal
+    sums = {x: np.zeros(len(HAND_LABELS)) for x in BOARD_STATISTICS}
+    square_sums = {x: np.zeros(len(HAND_LABELS)) for x in BOARD_STATISTICS}
+    for start in range(0, deals, batch_size):
+        n = min(batch_size, deals - start)
+        cards = np.argpartition(rng.random((n, len(CARDS))), k, axis=1)[:, :k]
+        classes = combination_rank_classes(cards)
+        for statistic, statistic_classes in (('hand', classes.max(axis=1, keepdims=True)), ('allcombinations', classes)):
+            # Proportion of each label of each deal, as a histogram of its rank classes
+            indexes = (np.arange(n)[:, None] * len(HAND_LABELS) + statistic_classes).ravel()
+            proportions = np.bincount(indexes, minlength=n*len(HAND_LABELS)).reshape(n, len(HAND_LABELS))
+            proportions = proportions / statistic_classes.shape[1]
+            sums[statistic] += proportions.sum(axis=0)
+            square_sums[statistic] += (proportions**2).sum(axis=0)
+    outcomes = {}
+    for statistic in BOARD_STATISTICS:
+        means = sums[statistic] / deals
+        variances = np.maximum(square_sums[statistic] / deals - means**2, 0) * deals / max(deals - 1, 1)
+        outcomes[statistic] = (means, np.sqrt(variances / deals))
+    return outcomes
+
+# Registry of exact expected distributions of statistics of uniformly dealt hands.
+# Distributions are keyed by (statistic, board length, only_me), computed once, and cached
+# as exact outcome counts in one JSON file per key.
+# Dealing is uniform for every seat, so only_me selects a separate entry with the same distribution.
+class ExpectedDistributions:
+    VERSION = 1 # Increment when the format or computation of entries changes
+    DEFAULT_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'Poker-Hand-Auditor')
+
+    ## directory: str or None, path to cache directory, default is DEFAULT_DIRECTORY
+    def __init__(self, directory=None):
+        self.directory = directory or self.DEFAULT_DIRECTORY
+        self._distributions = {}
+
+    # Get key of a distribution
+    ## statistic: str, see STATISTICS
+    ## board_length: int 3,4,5, number of board cards, ignored if not in BOARD_STATISTICS
+    ## only_me: bool, only my ([ME]) hole cards are counted
+    def key(self, statistic, board_length=5, only_me=False):
+        if statistic not in STATISTICS:
+            raise ValueError('Unknown statistic {}'.format(statistic))
+        return (statistic, board_length if statistic in BOARD_STATISTICS else None, bool(only_me))
+
+    # Get path of the cache file of a distribution
+    ## key: tuple, see key()
+    def path(self, key):
+        statistic, board_length, only_me = key
+        return os.path.join(self.directory, 'expected-{}{}{}.json'.format(
+            statistic,
+            '' if board_length is None else '-{}'.format(board_length),
+            '-me' if only_me else '',
+        ))
+
+    # Get expected distribution of a statistic
+    ## statistic: str, see STATISTICS
+    ## board_length: int 3,4,5, number of board cards, ignored if not in BOARD_STATISTICS
+    ## only_me: bool, only my ([ME]) hole cards are counted
+    ## Returns dict of label to expected proportion
+    def get(self, statistic, board_length=5, only_me=False):
+        key = self.key(statistic, board_length, only_me)
+        if key not in self._distributions:
+            counts, total = self._load(key) or self._compute(key)
+            self._distributions[key] = {x: count/total for x, count in counts.items()}
+        return self._distributions[key]
+
+    # Get expected distributions of a statistic for samples with a mix of board lengths
+    ## statistic: str, see BOARD_STATISTICS
+    ## board_length_counts: array-like of ints, shape=(6,) or (B, 6), size of each sample with each board length
+    ## only_me: bool, only my ([ME]) hole cards are counted
+    ## Returns np.ndarray of floats, shape=(B, len(HAND_LABELS)), expected proportions in HAND_LABELS order
+    def mixture(self, statistic, board_length_counts, only_me=False):
+        board_length_counts = np.atleast_2d(np.asarray(board_length_counts, dtype=np.float64))
+        distributions = self.components(statistic, board_length_counts.shape[1], only_me)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (board_length_counts @ distributions) / board_length_counts.sum(axis=1, keepdims=True)
+
+    # Get expected distributions of a statistic for each board length
+    ## statistic: str, see BOARD_STATISTICS
+    ## board_lengths: int, number of board lengths from 0, e.g. 6 for 0-5 board cards
+    ## only_me: bool, only my ([ME]) hole cards are counted
+    ## Returns np.ndarray of floats, shape=(board_lengths, len(HAND_LABELS)), 0 for less than 3 board cards
+    def components(self, statistic, board_lengths=6, only_me=False):
+        distributions = np.zeros((board_lengths, len(HAND_LABELS)))
+        for board_length in range(3, board_lengths):
+            distribution = self.get(statistic, board_length, only_me)
+            distributions[board_length] = [distribution[x] for x in HAND_LABELS]
+        return distributions
+
+    def _compute(self, key):
+        statistic, board_length, only_me = key
+        counts, total = count_outcomes(statistic, board_length)
+        self._save(key, counts, total)
+        return counts, total
+
+    def _load(self, key):
+        try:
+            with open(self.path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != self.VERSION:
+            return None
+        return entry['counts'], entry['total']
+
+    # The cache is optional, so entries that can't be written are only kept in memory
+    def _save(self, key, counts, total):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'version': self.VERSION, 'counts': counts, 'total': total}, f)
+            os.replace(temp_path, self.path(key))
+        except OSError:
+            pass
+
+def main():
+    argparser = argparse.ArgumentParser(description='Compare exact expected distributions of hands by board length with distributions of randomly dealt hands.')
+    argparser.add_argument('--deals', default=1000000, type=int, help='Number of hands dealt of each board length. Default=1000000')
+    argparser.add_argument('--seed', default=0, type=int, help='Seed of the shuffler. Default=0')
+    argparser.add_argument('--cache', type=str, help='Path to cache directory of expected distributions. Default={}'.format(
+        ExpectedDistributions.DEFAULT_DIRECTORY))
+    argparser.add_argument('--ranktable', action='store_true', help='Evaluate hands with a table of all 5 card hands')
+    args = argparser.parse_args()
+
+    expected = ExpectedDistributions(args.cache)
+    if args.ranktable:
+        use_rank_table(os.path.join(expected.directory, 'rank_table.npy'))
+    results = Results()
+    results.set_full_width(4)
+    for board_length in (3, 4, 5):
+        outcomes = simulate_outcomes(board_length, args.deals, seed=args.seed)
+        for statistic in BOARD_STATISTICS:
+            simulated, standard_errors = outcomes[statistic]
+            distribution = expected.get(statistic, board_length)
+            results.print_string_with_divider('')
+            results.print_fullwidth_value_span_row(
+                '{} with {} board cards, {} deals'.format(statistic, board_length, args.deals), divider=True
+            )
+            results.print_results_row('Hand', 'Exact', 'Simulated', 'Std Error', 'Z-score', divider=True)
+            for label, proportion, standard_error in zip(HAND_LABELS, simulated.tolist(), standard_errors.tolist()):
+                exact = distribution[label]
+                results.print_results_row(
+                    label,
+                    '{:.6f}'.format(exact),
+                    '{:.6f}'.format(proportion),
+                    '{:.6f}'.format(standard_error),
+                    '{:.2f}'.format((proportion - exact) / standard_error) if standard_error else 'None',
+                )
+            results.print_horizontal_divider()
+            results.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+import csv
+import json
+import math
+
+# Formats of exported results, see write_records
+FORMATS = ('text', 'csv', 'jsonl', 'parquet', 'arrow')
+# Format of each filename extension, for --export without --exportformat
+EXTENSIONS = {
+    '.txt': 'text',
+    '.csv': 'csv',
+    '.jsonl': 'jsonl',
+    '.parquet': 'parquet',
+    '.arrow': 'arrow',
+    '.feather': 'arrow',
+}
+# Formats written with pyarrow, which is optional
+ARROW_FORMATS = ('parquet', 'arrow')
+
+# Columns of records, in order, and their types
+FIELDS = {
+    'table': str, # Title of the table, e.g. 'Distribution of Hands'
+    'kind': str, # 'category', 'total', 'test', or 'summary'
+    'label': str, # Category, e.g. 'Pair', or test, e.g. 'Chi-square'
+    'n': int, # Sample size of the table
+    'expected': float, # Expected proportion of a category, or expected statistic of a test
+    'expected_size': float, # Expected count of a category
+    'sample_proportion': float,
+    'lower': float, # Lower confidence limit, None if not sampled or not normal
+    'upper': float, # Upper confidence limit
+    'sample': int, # Sampled count of a category
+    'statistic': float, # Statistic of a test
+    'pvalue': float, # p-value of a test
+    'result': str, # 'PASS' or 'FAIL' of a test, or decision of a sequential test
+}
+
+# Statistics of printed results, as columns of values of every record, for dashboards and other tools
+# Records are added by Results for every table, including binned tables that aren't printed, so exports
+# don't depend on --summaryonly or --showallbinnedtables. Missing values are None.
+class ResultRecords:
+
+    def __init__(self):
+        self.columns = {field: [] for field in FIELDS} # Dict of field to list of values
+
+    # Number of records
+    def __len__(self):
+        return len(self.columns['table'])
+
+    # Add records of a table, one for each label
+    ## table: str, title of the table
+    ## kind: str, see FIELDS
+    ## labels: list of strs, label of each record
+    ## values: lists of values of each record, or values of all records, of other fields, see FIELDS
+    def add(self, table, kind, labels, **values):
+        n = len(labels)
+        values.update(table=table, kind=kind, label=labels)
+        for field, column in self.columns.items():
+            value = values.get(field)
+            column.extend(value if isinstance(value, list) else [value] * n)
+
+    # Records as dicts of field to value
+    def rows(self):
+        return (dict(zip(FIELDS, values)) for values in zip(*self.columns.values()))
+
+# Format of a filename by its extension
+## path: str
+## Returns str or None, see FORMATS
+def format_of(path):
+    for extension, format in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return format
+    return None
+
+# Write records to a file, all at once
+## records: ResultRecords
+## path: str, filename including path
+## format: str, see FORMATS, other than 'text', which is written by Results.flush
+def write_records(records, path, format):
+    if format == 'csv':
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            writer.writerows(zip(*records.columns.values()))
+    elif format == 'jsonl':
+        ## NaN isn't valid JSON, so it's written as null
+        with open(path, 'w') as f:
+            f.write(''.join(
+                json.dumps({k: None if isinstance(v, float) and math.isnan(v) else v for k, v in row.items()}) + '\n'
+                for row in records.rows()
+            ))
+    elif format in ARROW_FORMATS:
+        import pyarrow # Optional, only needed by these formats
+        types = {str: pyarrow.string(), int: pyarrow.int64(), float: pyarrow.float64()}
+        table = pyarrow.table(
+            records.columns, schema=pyarrow.schema([(field, types[t]) for field, t in FIELDS.items()])
+        )
+        if format == 'parquet':
+            import pyarrow.parquet
+            pyarrow.parquet.write_table(table, path)
+        else:
+            import pyarrow.feather
+            pyarrow.feather.write_feather(table, path)
+    else:
+        raise ValueError('Records can\'t be written as {}'.format(format))
@@ -0,0 +1,126 @@
+import os
+import argparse
+import numpy as np
+from Parse import CARDS
+
+# Position names of each seat relative to the dealer, by number of seats
+POSITIONS = {
+    seats: ['Dealer', 'Big Blind'] if seats == 2 else
+        ['Dealer', 'Small Blind', 'Big Blind'] + ['UTG'] + ['UTG+{}'.format(i) for i in range(1, seats-3)]
+    for seats in range(2, 10)
+}
+# Street of the summary lines of folded seats, by board length
+FOLDED = {0: 'before the FLOP', 3: 'on the FLOP', 4: 'on the TURN', 5: 'on the RIVER'}
+
+# Yields lines of a Bovada hand history of uniformly dealt hands
+# Hands are dealt from a seeded shuffle of the deck, so files are reproducible.
+## hands: int, number of hands
+## seats: int 2-9, number of players dealt hole cards
+## fold_rate: float, proportion of hands that end before the flop, i.e. without a board
+## turn_rate: float, proportion of hands that reach the turn, of hands that reach the flop
+## river_rate: float, proportion of hands that reach the river, of hands that reach the turn
+## me_seat: int or None, seat (1 to seats) of my ([ME]) hole cards, None for no [ME] seat
+## seed: int, seed of the shuffler
+## first_hand_id: int, hand number of the first hand
+## chunk_size: int, number of hands dealt at once
+def generate_lines(hands, seats=6, fold_rate=0.3, turn_rate=0.75, river_rate=0.75, me_seat=1, seed=0,
+                   first_hand_id=1000000000, chunk_size=1<<14):
+    if seats not in POSITIONS:
+        raise ValueError('Number of seats must be 2-9, not {}'.format(seats))
+    if me_seat is not None and not 1 <= me_seat <= seats:
+        raise ValueError('[ME] seat must be 1-{}, not {}'.format(seats, me_seat))
+    rng = np.random.default_rng(seed)
+    positions = POSITIONS[seats]
+    for start in range(0, hands, chunk_size):
+        n = min(chunk_size, hands - start)
+        # Shuffle a deck for every hand, hole cards are dealt first and then the board
+        decks = rng.random((n, len(CARDS))).argsort(axis=1)[:, :2*seats+5].tolist()
+        reached = rng.random((n, 3)) < (1-fold_rate, turn_rate, river_rate)
+        board_lengths = np.where(reached[:, 0], 3 + reached[:, 1] + (reached[:, 1] & reached[:, 2]), 0).tolist()
+        buttons = rng.integers(0, seats, n).tolist()
+        for i in range(n):
+            hand = start + i
+            deck = [CARDS[c] for c in decks[i]]
+            # Position of each seat, the dealer button moves around the table
+            seat_positions = [positions[(seat - buttons[i]) % seats] for seat in range(seats)]
+            labels = [
+                '{} [ME]'.format(position) if seat+1 == me_seat else position
+                for seat, position in enumerate(seat_positions)
+            ]
+            yield 'Bovada Hand #{}: HOLDEM No Limit - 2021-01-01 {:02d}:{:02d}:{:02d}'.format(
+                first_hand_id + hand, hand // 3600 % 24, hand // 60 % 60, hand % 60
+            )
+            for seat, label in enumerate(labels):
+                yield 'Seat {}: {} ($10 in chips)'.format(seat+1, label)
+            yield 'Dealer : Set dealer [{}] '.format(buttons[i]+1)
+            yield '*** HOLE CARDS ***'
+            for seat, label in enumerate(labels):
+                yield '{} : Card dealt to a spot [{} {}] '.format(label, deck[2*seat], deck[2*seat+1])
+
+            board = deck[2*seats:2*seats+board_lengths[i]]
+            if len(board) >= 3:
+                yield '*** FLOP *** [{}]'.format(' '.join(board[:3]))
+            if len(board) >= 4:
+                yield '*** TURN *** [{}] [{}]'.format(' '.join(board[:3]), board[3])
+            if len(board) >= 5:
+                yield '*** RIVER *** [{}] [{}]'.format(' '.join(board[:4]), board[4])
+            # Every seat but the last folds on the last street dealt, or before the flop without a board, and the
+            # last seat wins the pot
+            for label in labels[:-1]:
+                yield '{} : Folds'.format(label)
+            yield '*** SUMMARY ***'
+            yield 'Total Pot($0.15)'
+            if board:
+                # Board line ends with a space for each missing card
+                yield 'Board [{}{}]'.format(' '.join(board), ' ' * (5 - len(board)))
+            for seat, label in enumerate(labels[:-1]):
+                yield 'Seat+{}: {} Folded {}'.format(seat+1, label, FOLDED[len(board)])
+            yield 'Seat+{}: {} $0.15 [Does not show]'.format(seats, labels[-1])
+            yield ''
+
+# Write a Bovada hand history file, see generate_lines
+## path: str, filename including path
+def write_hand_history(path, hands, **kwargs):
+    with open(path, 'w', newline='\n') as f:
+        for line in generate_lines(hands, **kwargs):
+            f.write(line)
+            f.write('\n')
+
+# Write a directory of Bovada hand history files
+## directory: str, path to directory, created if it doesn't exist
+## files: int, number of files
+## hands: int, number of hands of each file
+## seed: int, seed of the first file, each file has its own seed
+## Returns list of strs, filenames including path
+def write_hand_histories(directory, files, hands, seed=0, **kwargs):
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, 'HH{:04d}.txt'.format(i))
+        write_hand_history(path, hands, seed=seed+i, first_hand_id=1000000000+i*hands, **kwargs)
+        paths.append(path)
+    return paths
+
+def main():
+    argparser = argparse.ArgumentParser(description='Write synthetic Bovada hand history files of uniformly dealt hands, for testing and benchmarking.')
+    argparser.add_argument('path', type=str, help='Path to output directory')
+    argparser.add_argument('--files', default=1, type=int, help='Number of files. Default=1')
+    argparser.add_argument('--hands', default=10000, type=int, help='Number of hands of each file. Default=10000')
+    argparser.add_argument('--seats', default=6, type=int, help='Number of players dealt hole cards, 2-9. Default=6')
+    argparser.add_argument('--foldrate', default=0.3, type=float, help='Proportion of hands that end before the flop. Default=0.3')
+    argparser.add_argument('--meseat', default=1, type=int, help='Seat of my ([ME]) hole cards, 0 for none. Default=1')
+    argparser.add_argument('--seed', default=0, type=int, help='Seed of the shuffler. Default=0')
+    args = argparser.parse_args()
+
+    write_hand_histories(
+        args.path,
+        args.files,
+        args.hands,
+        seed=args.seed,
+        seats=args.seats,
+        fold_rate=args.foldrate,
+        me_seat=args.meseat or None,
+    )
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,10 @@
+import io
+import os
 import re
+import gzip
+import mmap
+import itertools
+import zipfile
 
 HAND_PROBABILITIES = {
     'high card': 0.501177,
@@ -13,13 +19,129 @@ HAND_PROBABILITIES = {
     # 'royal flush': 0.00000154,
 }
 
+CARDS = [
+    '2c','2d','2h','2s',
+    '3c','3d','3h','3s',
+    '4c','4d','4h','4s',
+    '5c','5d','5h','5s',
+    '6c','6d','6h','6s',
+    '7c','7d','7h','7s',
+    '8c','8d','8h','8s',
+    '9c','9d','9h','9s',
+    'Tc','Td','Th','Ts',
+    'Jc','Jd','Jh','Js',
+    'Qc','Qd','Qh','Qs',
+    'Kc','Kd','Kh','Ks',
+    'Ac','Ad','Ah','As',
+]
+# Card ID of each card as bytes, i.e. index in CARDS, 0-51
+CARD_BYTE_IDS = {x.encode(): i for i, x in enumerate(CARDS)}
+# Card ID of the rank byte of a card, and the offset of the suit byte, by byte value, e.g. b'A' is 48 and b'h' is 2
+_CARD_RANK_BYTES = bytes(4 * '23456789TJQKA'.index(chr(b)) if chr(b) in '23456789TJQKA' else 0 for b in range(256))
+_CARD_SUIT_BYTES = bytes('cdhs'.index(chr(b)) if chr(b) in 'cdhs' else 0 for b in range(256))
+
+# Extensions of hand history files, and of hand history files in zip archives
+HAND_HISTORY_EXTENSIONS = ('.txt', '.txt.gz')
+ARCHIVE_MEMBER_EXTENSIONS = ('.txt',)
+## End of the archive in filenames of archive members, e.g. 'history.zip/2021/hands.txt'
+_RE_ARCHIVE = re.compile(r'\.zip(?=[\\/])', re.I)
+
+# Yields hand history files of a directory and its subdirectories, in directory order
+# Files are .txt files, .txt.gz files, and .txt members of .zip archives, see open_hand_history
+## path: str, path to hand history directory
+def find_hand_histories(path):
+    with os.scandir(path) as entries:
+        for entry in entries:
+            name = entry.name.lower()
+            if entry.is_dir(follow_symlinks=False):
+                yield from find_hand_histories(entry.path)
+            elif name.endswith(HAND_HISTORY_EXTENSIONS) and entry.is_file():
+                yield entry.path
+            elif name.endswith('.zip') and entry.is_file():
+                with zipfile.ZipFile(entry.path) as archive:
+                    for member in archive.infolist():
+                        if not member.is_dir() and member.filename.lower().endswith(ARCHIVE_MEMBER_EXTENSIONS):
+                            yield os.path.join(entry.path, member.filename)
+
+# Split a filename of a member of a zip archive into the archive and member names
+## file: str, filename including path
+## Returns (str, str or None), (archive, member), or (file, None) if file is not in an archive
+def split_archive_path(file):
+    for m in _RE_ARCHIVE.finditer(file):
+        if os.path.isfile(file[:m.end()]):
+            return file[:m.end()], file[m.end()+1:]
+    return file, None
+# Get the file on disk of a hand history file, i.e. the archive of archive members, e.g. for os.stat
+## file: str, filename including path
+def source_file(file):
+    return split_archive_path(file)[0]
+# Check if a hand history file is compressed, so it is read as a stream instead of memory-mapped
+## file: str, filename including path
+def is_compressed(file):
+    return file.lower().endswith('.gz') or split_archive_path(file)[1] is not None
+
+# Open a hand history file, a .txt.gz file, or a member of a zip archive, see find_hand_histories
+# Compressed files are decompressed as they are read
+## file: str, filename including path
+## mode: str, 'r' for text or 'rb' for bytes
+def open_hand_history(file, mode='r'):
+    archive, member = split_archive_path(file)
+    if member is not None:
+        # The archive stays open until the member is closed
+        with zipfile.ZipFile(archive) as f:
+            member_file = f.open(member)
+        return member_file if mode == 'rb' else io.TextIOWrapper(member_file)
+    if file.lower().endswith('.gz'):
+        return gzip.open(file, mode if mode == 'rb' else 'rt')
+    return open(file, mode)
+
+# Get index of the start of the line after index i, or len(buf) on EOF
+## buf: bytes-like
+## i: int, index in a line
+def next_line(buf, i):
+    i = buf.find(b'\n', i)
+    return len(buf) if i < 0 else i+1
+# Compile regular expressions for finding lines in bytes
+# Returns a pair of (regex at start of buffer, regex after a newline), as searching for
+# a pattern starting with a literal newline is much faster than searching for a ^ anchored one
+## pattern: str, regular expression of lines without ^ and $
+def bytes_line_res(pattern):
+    pattern = pattern.encode()
+    return re.compile(pattern, re.M), re.compile(b'\n' + pattern, re.M)
+# Find every line from index pos to end that matches regexes, i.e. the matches of repeated searches from pos
+# A search from a later index finds the first of these matches at or after it, as the patterns only match at
+# newlines and don't depend on where the search started
+## buf: bytes-like
+## regexes: pair of compiled regular expressions, see bytes_line_res
+## pos: int, index of the start of a line
+## end: int, index to stop searching at
+## Returns list of re.Match, note that start() of each match is the newline before the line, or 0 for a line at 0
+def find_lines(buf, regexes, pos, end):
+    first = regexes[0].match(buf, 0, end) if pos == 0 else None
+    return ([first] if first else []) + list(regexes[1].finditer(buf, max(pos-1, 0), end))
+# Get indices of the starts of the lines after indices, see next_line
+## buf: bytes-like
+## positions: np.ndarray of ints, indices in lines
+def next_lines(buf, positions):
+    import numpy as np
+    newlines = np.fromiter(
+        map(buf.find, itertools.repeat(b'\n', len(positions)), positions.tolist()), dtype=np.int64, count=len(positions)
+    )
+    return np.where(newlines < 0, len(buf), newlines + 1)
+# Get index after the last blank line from index pos, i.e. the end of the last complete hand, or pos if there is none
+## buf: bytes-like
+## pos: int, index of the start of a line
+def complete_hands_end(buf, pos=0):
+    i = max(buf.rfind(b'\n\n', pos), buf.rfind(b'\n\r\n', pos))
+    return pos if i < 0 else next_line(buf, i+1)
+
 class Bovada:
 
     # Regular expressions for parsing and extracting card values
     _re_card = '[2-9TJQKA][cdhs]'
     _re_position = '(?:UTG(?:\+[1-5])?|Dealer|(?:Small|Big) Blind|Dealer)'
     ## Line that occurs before each hand
-    RE_HEADER = re.compile('^Bovada Hand #\d+: ')
+    RE_HEADER = re.compile('^Bovada Hand #(\d+): ')
     ## Line that occurs before each stage
     RE_STAGE = {
         'Hole Cards': re.compile('^\*\*\* HOLE CARDS \*\*\*$'),
@@ -41,6 +163,24 @@ class Bovada:
         '^Board \[((?:%s ){1,3} |(?:%s ){4}|(?:%s ){4}(?:%s))\]$' % (_re_card, _re_card, _re_card, _re_card)
     )
 
+    ## Regular expressions for parsing bytes, see scan_columns()
+    _RE_HEADER_BYTES = bytes_line_res(RE_HEADER.pattern[1:])
+    _RE_SUMMARY_BYTES = bytes_line_res(RE_STAGE['Summary'].pattern[1:-1] + r'\r?$')
+    _RE_BOARD_BYTES = bytes_line_res(RE_BOARD.pattern[1:-1] + r'\r?$')
+    ## Hole Cards header followed by consecutive hole cards lines, without groups of the cards, which are
+    ## decoded from the lines, as groups in repeated lines slow down matching
+    _RE_HOLE_CARDS_BYTES = bytes_line_res(r'%s\r?(?:\n|\Z)((?:%s\r?(?:\n|\Z))*)' % (
+        RE_STAGE['Hole Cards'].pattern[1:-1], RE_HOLE_CARDS.pattern[1:-1].replace('(%s)' % _re_card, _re_card)
+    ))
+    _RE_HOLE_CARDS_ME_ONLY_BYTES = bytes_line_res(r'%s\r?(?:\n|\Z)((?:%s\r?(?:\n|\Z))*)' % (
+        RE_STAGE['Hole Cards'].pattern[1:-1], RE_HOLE_CARDS_ME_ONLY.pattern[1:-1].replace('(%s)' % _re_card, _re_card)
+    ))
+    ## Position and [ME] label of each hole cards line, and the date and time of a header line, see scan_hands(details=True)
+    _RE_HOLE_CARDS_SEAT_BYTES = re.compile(rb'^(%s)( \[ME\])? : ' % _re_position.encode(), re.M)
+    _RE_HEADER_TIME_BYTES = re.compile(rb' - (\d{4}-\d\d-\d\d \d\d:\d\d:\d\d)')
+    ## Number of bytes searched for newlines at once, see scan_columns
+    _CHUNK_SIZE = 1 << 24
+
     ## file: str, filename including path
     def __init__(self, file):
         self.open_new_file(file)
@@ -52,7 +192,8 @@ class Bovada:
     def open_new_file(self, file):
         if hasattr(self, 'file') and self.file:
             self.file.close()
-        self.file = open(file, 'r')
+        self.path = file
+        self.file = open_hand_history(file)
 
     # Move cursor to first re match, returns empty string on EOF
     ## regex: regular expression to match
@@ -97,3 +238,253 @@ class Bovada:
             # If at next hand without getting a board return None
             if self.RE_HEADER.match(l):
                 return None
+
+    # Yields (hand_id, hole_cards, board) of every hand of the file, where
+    # hand_id: int or None, number of the hand header before the hole cards
+    # hole_cards: list of tuples of card IDs, same cards as get_hole_cards
+    # board: list of card IDs or None, same cards as get_board_cards
+    # With details, yields (hand_id, hole_cards, board, time, seats), where
+    # time: str or None, date and time of the hand header, e.g. '2021-01-01 12:00:00'
+    # seats: list of (position, is_me) of each player of hole_cards, e.g. ('Big Blind', False)
+    # The file is memory-mapped and scanned as bytes, from the start of the file regardless of cursor
+    # Compressed files are decompressed and scanned in chunks of complete hands, from the start of the file
+    # Stops at EOF or at hole cards with no matches, like a get_hole_cards loop
+    ## only_me : bool, only count my ([ME]) hole cards
+    ## details: bool, also yield the time and seats of each hand
+    def hands(self, only_me=False, details=False):
+        if is_compressed(self.path):
+            self.file.seek(0)
+            yield from self.scan_stream(self.file.buffer, only_me=only_me, details=details)
+            return
+        if os.fstat(self.file.fileno()).st_size == 0:
+            return # Can't mmap empty files
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield from self.scan_hands(buf, only_me=only_me, details=details)
+
+    # Get every hand of the file as columns of Store.HandStore, the hands of hands(), see scan_columns()
+    ## only_me : bool, only count my ([ME]) hole cards
+    ## Returns dict of np.ndarray by column name
+    def hand_columns(self, only_me=False):
+        if is_compressed(self.path):
+            self.file.seek(0)
+            return self.stream_columns(self.file.buffer, only_me=only_me)
+        if os.fstat(self.file.fileno()).st_size == 0:
+            return self.scan_columns(b'', only_me=only_me)[0] # Can't mmap empty files
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            return self.scan_columns(buf, only_me=only_me)[0]
+
+    # Get every complete hand after a byte offset, for reading a file that is still being written
+    # A hand is complete once the blank line after it is written, so hands are read up to the last blank line
+    ## offset: int, byte offset of the start of a hand, e.g. end offset of the previous call
+    ## only_me : bool, only count my ([ME]) hole cards
+    ## Returns (dict of np.ndarray by column name, see hand_columns(), int byte offset after the last complete hand)
+    def new_hands(self, offset=0, only_me=False):
+        size = os.fstat(self.file.fileno()).st_size
+        if size <= offset:
+            return self.scan_columns(b'', only_me=only_me)[0], offset
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            end = complete_hands_end(buf, offset)
+            return self.scan_columns(buf, only_me=only_me, pos=offset, end=end)[0], end
+
+    # Yields (hand_id, hole_cards, board) of every hand of a binary stream, see hands()
+    # The stream is read in chunks, and each chunk is scanned up to its last complete hand
+    ## f: binary file object, e.g. gzip.GzipFile
+    ## only_me : bool, only count my ([ME]) hole cards
+    ## chunk_size: int, number of bytes of each read
+    ## details: bool, also yield the time and seats of each hand
+    @classmethod
+    def scan_stream(cls, f, only_me=False, chunk_size=1<<24, details=False):
+        for buf, columns in cls._scan_stream_chunks(f, only_me, chunk_size, spans=True):
+            yield from cls._column_hands(buf, columns, details)
+
+    # Get every hand of a binary stream as columns of Store.HandStore, see scan_stream() and scan_columns()
+    ## f: binary file object, e.g. gzip.GzipFile
+    ## only_me : bool, only count my ([ME]) hole cards
+    ## chunk_size: int, number of bytes of each read
+    ## Returns dict of np.ndarray by column name
+    @classmethod
+    def stream_columns(cls, f, only_me=False, chunk_size=1<<24):
+        import numpy as np
+        chunks = [columns for _, columns in cls._scan_stream_chunks(f, only_me, chunk_size)]
+        return {k: np.concatenate([columns[k] for columns in chunks]) for k in chunks[0]}
+
+    # Yields (buf, columns) of each chunk of a binary stream, see scan_stream() and scan_columns()
+    # Stops after the chunk that stopped at hole cards with no matches
+    @classmethod
+    def _scan_stream_chunks(cls, f, only_me, chunk_size, spans=False):
+        buf = b''
+        while True:
+            chunk = f.read(chunk_size)
+            buf += chunk
+            end = complete_hands_end(buf) if chunk else len(buf)
+            columns, stopped = cls.scan_columns(buf, only_me=only_me, end=end, spans=spans)
+            yield buf, columns
+            if stopped or not chunk:
+                return
+            buf = buf[end:]
+
+    # Yields (hand_id, hole_cards, board) of every hand of a bytes buffer, see hands() and scan_columns()
+    ## buf: bytes-like, e.g. bytes or mmap.mmap
+    ## only_me : bool, only count my ([ME]) hole cards
+    ## pos: int, index to start scanning from
+    ## end: int or None, index to stop scanning at, default is the end of buf
+    ## details: bool, also yield the time and seats of each hand
+    ## Returns True, as the value of StopIteration, if stopped at hole cards with no matches
+    @classmethod
+    def scan_hands(cls, buf, only_me=False, pos=0, end=None, details=False):
+        columns, stopped = cls.scan_columns(buf, only_me=only_me, pos=pos, end=end, spans=True)
+        yield from cls._column_hands(buf, columns, details)
+        return stopped
+
+    # Yields hands of columns of scan_columns(spans=True), see hands()
+    ## buf: bytes-like, the buffer that was scanned
+    ## columns: dict of np.ndarray by column name
+    ## details: bool, also yield the time and seats of each hand
+    @classmethod
+    def _column_hands(cls, buf, columns, details):
+        hole_cards = list(map(tuple, columns['hole_cards'].tolist()))
+        boards = columns['boards'].tolist()
+        player_offset = 0
+        for i, (hand_id, players, board_length, header_end, (start, stop)) in enumerate(zip(
+            columns['hand_ids'].tolist(), columns['players'].tolist(), columns['board_lengths'].tolist(),
+            columns['header_ends'].tolist(), columns['card_spans'].tolist(),
+        )):
+            hand_id = hand_id if header_end >= 0 else None
+            hand_hole_cards = hole_cards[player_offset:player_offset+players]
+            player_offset += players
+            board = boards[i][:board_length] if board_length else None
+            if not details:
+                yield hand_id, hand_hole_cards, board
+                continue
+            time = cls._RE_HEADER_TIME_BYTES.search(buf, header_end, next_line(buf, header_end)) if header_end >= 0 else None
+            time = time.group(1).decode() if time else None
+            seats = [
+                (position.decode(), bool(me))
+                for position, me in cls._RE_HOLE_CARDS_SEAT_BYTES.findall(buf, start, stop)
+            ]
+            yield hand_id, hand_hole_cards, board, time, seats
+
+    # Get every hand of a bytes buffer as columns of Store.HandStore, the hands that scan_hands yields
+    # Each kind of line is found in one pass over the buffer, see find_lines, and hands are followed from the
+    # hole cards to the summary, the next header, and the board with np.searchsorted over the lines found, so
+    # no line is searched for more than once. Hole cards are decoded from their fixed offsets before the end
+    # of each hole cards line, and board cards from theirs after the start of the board.
+    ## buf: bytes-like, e.g. bytes or mmap.mmap
+    ## only_me : bool, only count my ([ME]) hole cards
+    ## pos: int, index to start scanning from
+    ## end: int or None, index to stop scanning at, default is the end of buf
+    ## spans: bool, also return the columns 'header_ends', index after the header match of each hand or -1 if
+    ##        none, and 'card_spans', indices of the hole cards lines of each hand, shape=(H, 2)
+    ## Returns (dict of np.ndarray by column name, see Store.COLUMNS, bool, True if stopped at hole cards with no matches)
+    @classmethod
+    def scan_columns(cls, buf, only_me=False, pos=0, end=None, spans=False):
+        import numpy as np
+        re_hole_cards = cls._RE_HOLE_CARDS_BYTES if not only_me else cls._RE_HOLE_CARDS_ME_ONLY_BYTES
+        end = len(buf) if end is None else end
+        # Positions of the lines of each kind, with a last position at the end for hands without one
+        def positions(matches, position, group=0, last=()):
+            return np.fromiter(
+                itertools.chain(map(position, matches, itertools.repeat(group, len(matches))), last),
+                dtype=np.int64, count=len(matches) + len(last),
+            )
+        headers = find_lines(buf, cls._RE_HEADER_BYTES, pos, end)
+        header_ids = np.array(list(map(int, map(re.Match.group, headers, itertools.repeat(1, len(headers))))) + [0], dtype=np.uint64)
+        header_starts = positions(headers, re.Match.start, last=[end])
+        header_ends = positions(headers, re.Match.end, last=[end])
+        blocks = find_lines(buf, re_hole_cards, pos, end)
+        block_starts = positions(blocks, re.Match.start)
+        card_starts = positions(blocks, re.Match.start, 1)
+        card_stops = positions(blocks, re.Match.end, 1)
+        summaries = find_lines(buf, cls._RE_SUMMARY_BYTES, pos, end)
+        summary_starts = positions(summaries, re.Match.start, last=[end])
+        summary_ends = positions(summaries, re.Match.end, last=[end])
+        boards = find_lines(buf, cls._RE_BOARD_BYTES, pos, end)
+        board_starts = positions(boards, re.Match.start, last=[end])
+        board_ends = positions(boards, re.Match.end, last=[end])
+        board_card_starts = positions(boards, re.Match.start, 1, last=[end])
+        board_card_stops = positions(boards, re.Match.end, 1, last=[end])
+        del headers, blocks, summaries, boards
+
+        array = np.frombuffer(buf, dtype=np.uint8)
+        try:
+            # Line after the hole cards, then the Summary header after it, the next hand's header after the
+            # summary, and the board before that header, of every hole cards header
+            ## Lines after the end are past the last row
+            summary = np.minimum(np.searchsorted(summary_starts, next_lines(buf, card_stops) - 1), len(summary_starts) - 1)
+            has_summary = summary < len(summary_starts) - 1
+            after_summary = next_lines(buf, summary_ends[summary])
+            header = np.minimum(np.searchsorted(header_starts, after_summary - 1), len(header_starts) - 1)
+            board = np.minimum(np.searchsorted(board_starts, after_summary - 1), len(board_starts) - 1)
+            has_board = has_summary & (board_starts[board] < header_starts[header])
+            next_pos = np.where(has_board, next_lines(buf, board_ends[board]), header_ends[header])
+            next_pos[~has_summary] = end
+            next_block = np.searchsorted(block_starts, next_pos - 1)
+
+            # Follow hands from hole cards to the next hole cards, with the last header found before them
+            hands, hand_headers = [], []
+            i, hand_header, stopped = 0, 0, False
+            empty = (card_starts == card_stops).tolist()
+            next_header = np.where(has_summary, header, -1).tolist()
+            next_block = next_block.tolist()
+            while i < len(empty):
+                if empty[i]:
+                    stopped = True
+                    break
+                hands.append(i)
+                hand_headers.append(hand_header)
+                if next_header[i] >= 0:
+                    hand_header = next_header[i]
+                i = next_block[i]
+            hands = np.array(hands, dtype=np.int64)
+            hand_headers = np.array(hand_headers, dtype=np.int64)
+            card_starts, card_stops = card_starts[hands], card_stops[hands]
+            has_header = header_starts[hand_headers] < block_starts[hands]
+            has_board = has_board[hands]
+            board = board[hands]
+
+            # Hole cards lines end at the newlines in the hole cards of each hand, and the last line at the end
+            line_ends = [np.zeros(0, dtype=np.int64)]
+            if len(hands):
+                for chunk_start in range(int(card_starts[0]), int(card_stops[-1]), cls._CHUNK_SIZE):
+                    chunk_stop = min(chunk_start + cls._CHUNK_SIZE, int(card_stops[-1]))
+                    newlines = np.flatnonzero(array[chunk_start:chunk_stop] == 10) + chunk_start
+                    ## Newlines of each hand in the chunk are a range of the newlines of the chunk
+                    chunk_hands = slice(
+                        np.searchsorted(card_stops, chunk_start, 'right'), np.searchsorted(card_starts, chunk_stop)
+                    )
+                    first = np.searchsorted(newlines, card_starts[chunk_hands])
+                    last = np.searchsorted(newlines, card_stops[chunk_hands])
+                    counts = last - first
+                    line_ends.append(newlines[np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())])
+                if card_stops[-1] == end and array[end-1] != 10:
+                    line_ends.append(np.array([end], dtype=np.int64))
+            line_ends = np.concatenate(line_ends)
+            players = np.searchsorted(line_ends, card_stops, 'right') - np.searchsorted(line_ends, card_starts)
+            ## Lines end with ' [Xx Yy] ' and an optional carriage return
+            line_ends -= array[line_ends - 1] == 13
+            ranks = np.frombuffer(_CARD_RANK_BYTES, dtype=np.uint8)
+            suits = np.frombuffer(_CARD_SUIT_BYTES, dtype=np.uint8)
+            card_bytes = line_ends[:, None] + [-7, -4]
+            hole_cards = ranks[array[card_bytes]] + suits[array[card_bytes + 1]]
+
+            ## Board cards are 3 bytes apart, and boards of fewer than 5 cards have a trailing space
+            board_lengths = np.where(has_board, (board_card_stops[board] - board_card_starts[board] + 1) // 3, 0)
+            card_bytes = np.minimum(board_card_starts[board][:, None] + 3 * np.arange(5), len(array) - 2)
+            hand_boards = np.where(
+                np.arange(5) < board_lengths[:, None], ranks[array[card_bytes]] + suits[array[card_bytes + 1]], 0
+            )
+        finally:
+            del array # Views of buf keep memory maps from closing
+        hand_ids = header_ids[hand_headers]
+        hand_ids[~has_header] = 0
+        columns = {
+            'hand_ids': hand_ids,
+            'players': players,
+            'hole_cards': hole_cards,
+            'board_lengths': board_lengths,
+            'boards': hand_boards,
+        }
+        if spans:
+            columns['header_ends'] = np.where(has_header, header_ends[hand_headers], -1)
+            columns['card_spans'] = np.stack((card_starts, card_stops), axis=1)
+        return columns, stopped
@@ -0,0 +1,36 @@
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+# Process items in two overlapping stages, yielding results in order of items
+# Items are read in reader threads, e.g. for blocking file reads, and then processed in worker
+# processes, e.g. for parsing and evaluation, so reading and processing of different items overlap.
+# At most prefetch items are read or processed ahead of the item being yielded, which caps memory
+# when results are consumed slower than they are produced.
+## items: iterable of items
+## read: function of an item, called in a reader thread, returns (True, result) if the item needs no
+##       processing, or (False, job) to call process(job)
+## process: function of a job, called in a worker process, returns result, must be picklable
+## readers: int, number of reader threads
+## workers: int, number of worker processes
+## prefetch: int, maximum number of items in progress
+## initializer: function or None, called at the start of each worker process
+## initargs: tuple, arguments of initializer
+def pipelined(items, read, process, readers=4, workers=1, prefetch=8, initializer=None, initargs=()):
+    with ThreadPoolExecutor(readers) as reader_pool, \
+            ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as worker_pool:
+        # Returns a future of the result of an item
+        def stage(item):
+            done, value = read(item)
+            if not done:
+                return worker_pool.submit(process, value)
+            future = Future()
+            future.set_result(value)
+            return future
+
+        pending = collections.deque() # Futures of futures of results, in order of items
+        for item in items:
+            if len(pending) >= prefetch:
+                yield pending.popleft().result().result()
+            pending.append(reader_pool.submit(stage, item))
+        while pending:
+            yield pending.popleft().result().result()
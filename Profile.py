@@ -0,0 +1,144 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+# Stages of an audit, in order
+STAGES = ('discovery', 'cache', 'reading', 'parsing', 'evaluation', 'deduplication', 'database', 'counting', 'binning', 'statistics', 'simulation', 'rendering')
+# Counters that are reported per second of wall time of the whole run
+RATE_COUNTERS = ('files', 'hands', 'players', 'evaluations')
+
+_NULL_STAGE = nullcontext()
+
+# Records wall time, CPU time, and peak memory of stages, and counters, of an audit.
+# When disabled, stage() and count() return immediately, so they can be called unconditionally.
+# Peak memory is the peak of memory allocated by Python and NumPy while the stage runs, above the memory
+# allocated when it starts, so it's the memory of the stage itself, see tracemalloc.
+# Peak memory is only recorded with memory=True, since tracemalloc traces every allocation and slows Python heavy
+# stages such as parsing several times over, so times of a run that records memory aren't representative.
+class Profiler:
+
+    ## enabled: bool, record stages and counters
+    ## memory: bool, also record peak memory of stages with tracemalloc, only if enabled
+    def __init__(self, enabled=False, memory=False):
+        self.enabled = enabled
+        self.memory = enabled and memory
+        self.stages = {} # Dict of stage name to dict of wall, cpu, peak_memory, calls
+        self.counters = {} # Dict of counter name to int
+        self._memory = [] # [memory at start, peak memory so far] of each running stage, innermost last
+        self._start = (time.perf_counter(), time.process_time())
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    # Options to create a Profiler of a worker process with, e.g. Profiler(*profiler.options)
+    @property
+    def options(self):
+        return self.enabled, self.memory
+
+    # Record a stage, used as a context manager, e.g. with profiler.stage('parsing'):
+    # Stages with the same name are added together
+    ## name: str, name of stage, see STAGES
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage(name)
+    @contextmanager
+    def _stage(self, name):
+        if self.memory:
+            ## Peaks of running stages are kept before the peak is reset for this stage
+            current, peak = tracemalloc.get_traced_memory()
+            for memory in self._memory:
+                memory[1] = max(memory[1], peak)
+            tracemalloc.reset_peak()
+            self._memory.append([current, current])
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            peak_memory = 0
+            if self.memory:
+                start_memory, peak_memory = self._memory.pop()
+                peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1]) - start_memory
+            stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'peak_memory': 0, 'calls': 0})
+            stage['wall'] += wall
+            stage['cpu'] += cpu
+            stage['peak_memory'] = max(stage['peak_memory'], peak_memory)
+            stage['calls'] += 1
+
+    # Add to a counter
+    ## name: str, name of counter, e.g. 'hands'
+    ## n: int, number to add
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    # Add stages and counters of another Profiler, e.g. of a worker process
+    # Wall and CPU times of stages in parallel processes are summed
+    ## other: Profiler
+    def merge(self, other):
+        for name, other_stage in other.stages.items():
+            stage = self.stages.setdefault(name, {'wall': 0.0, 'cpu': 0.0, 'peak_memory': 0, 'calls': 0})
+            stage['wall'] += other_stage['wall']
+            stage['cpu'] += other_stage['cpu']
+            stage['peak_memory'] = max(stage['peak_memory'], other_stage['peak_memory'])
+            stage['calls'] += other_stage['calls']
+        for name, n in other.counters.items():
+            self.count(name, n)
+
+    # Get all records
+    # Returns dict of total wall and cpu time, stages, counters, and rates of RATE_COUNTERS per second
+    # Total cpu time is of this process only, cpu time of worker processes is in their stages
+    # Peak memory of stages is None unless memory is recorded
+    def report(self):
+        wall = time.perf_counter() - self._start[0]
+        cpu = time.process_time() - self._start[1]
+        stages = sorted(self.stages.items(), key=lambda x: STAGES.index(x[0]) if x[0] in STAGES else len(STAGES))
+        if not self.memory:
+            stages = [(name, dict(stage, peak_memory=None)) for name, stage in stages]
+        return {
+            'wall': wall,
+            'cpu': cpu,
+            'stages': dict(stages),
+            'counters': dict(self.counters),
+            'rates': {name: self.counters[name] / wall for name in RATE_COUNTERS if name in self.counters and wall},
+        }
+
+    # Write all records as JSON
+    ## path: str, filename including path
+    def write_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    # Print tables of all records
+    ## results: Results, for formatting tables
+    def print_report(self, results):
+        report = self.report()
+        results.set_full_width(4)
+        results.print_string_with_divider('', is_summary=True)
+        results.print_fullwidth_value_span_row(
+            'PROFILE, wall={:.3f}s, cpu={:.3f}s'.format(report['wall'], report['cpu']), divider=True, is_summary=True
+        )
+        results.print_results_row('Stage', 'Wall (s)', 'CPU (s)', 'Peak MB', 'Calls', divider=True, is_summary=True)
+        for name, stage in report['stages'].items():
+            results.print_results_row(
+                name,
+                '{:.3f}'.format(stage['wall']),
+                '{:.3f}'.format(stage['cpu']),
+                '-' if stage['peak_memory'] is None else '{:.1f}'.format(stage['peak_memory'] / 2**20),
+                stage['calls'],
+                is_summary=True,
+            )
+        results.print_horizontal_divider(is_summary=True)
+        results.print_halfwidth_value_span_row('Counter', 'Total', divider=True, is_summary=True)
+        for name, n in report['counters'].items():
+            results.print_halfwidth_value_span_row(name, n, is_summary=True)
+        for name, rate in report['rates'].items():
+            results.print_halfwidth_value_span_row('{}/sec'.format(name), '{:.1f}'.format(rate), is_summary=True)
+        results.print_horizontal_divider(is_summary=True)
+        results.flush()
+
+# Disabled Profiler, default of functions that take a profiler
+NULL_PROFILER = Profiler()
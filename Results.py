@@ -1,11 +1,18 @@
-from scipy.stats import chisquare, kstest
-from math import sqrt
+import sys
+from Statistics import ProportionStatistics, kstest_uniform
 
+# Rows are buffered and written all at once by flush(), so tables of thousands of rows are written
+# with one call instead of a print() of each row.
+# Statistics of tables are also added to records, if given, for export, see Export.ResultRecords
 class Results:
     DEFAULT_COLUMN_SIZE=15
 
-    def __init__(self, label_column_size=DEFAULT_COLUMN_SIZE, value_column_size=DEFAULT_COLUMN_SIZE, columns=6, summary_only=False):
+    ## records: Export.ResultRecords or None
+    def __init__(self, label_column_size=DEFAULT_COLUMN_SIZE, value_column_size=DEFAULT_COLUMN_SIZE, columns=6, summary_only=False,
+                 records=None):
         self._summary_only = summary_only
+        self.records = records
+        self._lines = [] # Rows not written yet
         self.set_label_column_size(label_column_size)
         self.set_value_column_size(value_column_size)
         self.set_full_width(6)
@@ -33,12 +40,21 @@ class Results:
         self._halfwidth_value_span_row = self._value_column_span_halfwidth*2
         self._totals_row = self._label_column + self._float_value_column + self._value_column + self._float_value_column*(columns-3) + self._value_column
 
+    # Write all buffered rows at once
+    ## file: file object or None, sys.stdout if None
+    ## Returns str, written text
+    def flush(self, file=None):
+        text = ''.join([line + '\n' for line in self._lines])
+        self._lines = []
+        (sys.stdout if file is None else file).write(text)
+        return text
+
     # Printing rows
     def _print_row(self, s, divider=False, is_summary=False):
         if not self._summary_only or self._summary_only and is_summary:
-            print(s)
+            self._lines.append(s)
             if divider:
-                self.print_horizontal_divider(is_summary=is_summary)
+                self._lines.append(self._horizontal_divider)
     def print_results_row(self, *argv, divider=False, is_summary=False):
         self._print_row(self._results_row.format(*argv), divider, is_summary)
     def print_halfwidth_value_span_row(self, *argv, divider=False, is_summary=False):
@@ -62,11 +78,9 @@ class Results:
         return format_str.format(val) if val != None else str(val)+append_on_none
     def print_horizontal_divider(self, is_summary=False):
         if not self._summary_only or self._summary_only and is_summary:
-            print(self._horizontal_divider)
+            self._lines.append(self._horizontal_divider)
     def print_string_with_divider(self, s, is_summary=False):
-        if not self._summary_only or self._summary_only and is_summary:
-            print(s)
-            self.print_horizontal_divider(is_summary=is_summary)
+        self._print_row(s, divider=True, is_summary=is_summary)
 
     # Print table of results
     ## title: str, title of the table
@@ -74,13 +88,27 @@ class Results:
     ## expected: dict, expected values
     ## sample: dict, sampled values
     ## std_dev: int 1,2,3, std_dev for use in confidence limit
-    ## label_column_size: int, width of first column
-    ## value_column_size: int, width of other columns
     ## is_normal: bool, is normally distributed, whether to calculate confidence intervals
-    ## Returns float, chi_square_pvalue
     def calculate_and_print_results(self, title, label, expected, sample, summary=None,
                                     test_results=None, std_dev=2, is_normal=True, pvalues=None,
                                     no_output=False):
+        labels, statistics = ProportionStatistics.from_dicts(expected, sample, std_dev)
+        self.print_proportion_statistics(
+            title, label, labels, statistics,
+            summary=summary, test_results=test_results, is_normal=is_normal, pvalues=pvalues, no_output=no_output,
+        )
+
+    # Print table of precomputed results of one sample
+    ## title: str, title of the table
+    ## label: str, label of the first column
+    ## labels: list of strs, label of each category
+    ## statistics: Statistics.ProportionStatistics
+    ## i: int, index of the sample in statistics
+    ## is_normal: bool, is normally distributed, whether to print confidence intervals
+    ## empirical_pvalue: float or None, empirical chi-square p-value of simulated replicates, see Simulate.NullDistribution
+    def print_proportion_statistics(self, title, label, labels, statistics, i=0, summary=None,
+                                    test_results=None, is_normal=True, pvalues=None, no_output=False,
+                                    empirical_pvalue=None):
         if no_output:
             prev_summary_only_val = self._summary_only
             self._summary_only = True
@@ -88,108 +116,100 @@ class Results:
         columns = 6 if is_normal else 4
         self.set_full_width(columns)
 
-        sample_size = sum(sample.values())
-
-        # Print title and column headers
-        self.print_string_with_divider('')
-        if is_normal:
-            confidence_limit = ['68', '95', '99.7'][std_dev-1]
-            table_title = '{}, {}% Confidence Level, n={}'.format(title, confidence_limit, sample_size)
-            column_name_args = (label, 'Expected', 'Expected Size','Sample', 'Lower', 'Upper', 'Sample Size')
-            # Track proportion values as list of tuples (sample,lower,upper)
-            proportions = []
-        else:
-            table_title = '{}, n={}'.format(title, sample_size)
-            column_name_args = (label, 'Expected', 'Expected Size','Sample', 'Sample Size')
-        self.print_fullwidth_value_span_row(table_title, divider=True)
-        self.print_results_row(*column_name_args, divider=True)
+        sample_size = int(statistics.sample_sizes[i])
+        chi_square = float(statistics.chi_square[i])
+        chi_square_pvalue = float(statistics.chi_square_pvalues[i])
 
-        totals = [0 for _ in range(columns)]
-        expected_sizes = []
+        # Only format rows if they are printed
+        if not self._summary_only:
+            # Print title and column headers
+            self.print_string_with_divider('')
+            if is_normal:
+                confidence_limit = ['68', '95', '99.7'][statistics.std_dev-1]
+                table_title = '{}, {}% Confidence Level, n={}'.format(title, confidence_limit, sample_size)
+                column_name_args = (label, 'Expected', 'Expected Size','Sample', 'Lower', 'Upper', 'Sample Size')
+            else:
+                table_title = '{}, n={}'.format(title, sample_size)
+                column_name_args = (label, 'Expected', 'Expected Size','Sample', 'Sample Size')
+            self.print_fullwidth_value_span_row(table_title, divider=True)
+            self.print_results_row(*column_name_args, divider=True)
 
-        # Print column values
-        for key in sample:
-            sample_percentage = sample[key]/sample_size
-            expected_size = round(expected[key]*sample_size)
-            expected_sizes.append(expected_size)
+            # Print column values
+            rows = zip(
+                labels,
+                statistics.expected[i].tolist(),
+                statistics.expected_sizes[i].tolist(),
+                statistics.sample_proportions[i].tolist(),
+                statistics.lower[i].tolist(),
+                statistics.upper[i].tolist(),
+                statistics.samples[i].tolist(),
+            )
+            for key, expected, expected_size, sample_percentage, lower_percentage, upper_percentage, sample in rows:
+                if is_normal:
+                    ## Confidence limits of categories not sampled can't be calculated
+                    if sample == 0:
+                        lower_percentage = None
+                        upper_percentage = None
+                    self.print_results_row(
+                        key, # Label
+                        self._format_if_valid(self._float_value, expected), # Expected proportion
+                        expected_size, # Expected size
+                        self._format_if_valid(self._float_value, sample_percentage), # Sample proportion
+                        self._format_if_valid(self._float_value, lower_percentage), # Upper confidence limit
+                        self._format_if_valid(self._float_value, upper_percentage), # Lower confidence limit
+                        sample, # Sample size
+                    )
+                else:
+                    self.print_results_row(
+                        key, # Label
+                        self._format_if_valid(self._float_value, expected), # Expected proportion
+                        expected_size, # Expected size
+                        self._format_if_valid(self._float_value, sample_percentage), # Sample proportion
+                        sample, # Sample size
+                    )
+            self.print_horizontal_divider()
 
-            # Print row of values
+            # Print totals
             if is_normal:
-                # Calculate standard error
-                ## can't divide by zero
-                if sample[key] != 0:
-                    standard_error = sqrt((expected[key] * (1-expected[key])) / sample[key])
-                    lower_percentage = expected[key] - std_dev*standard_error
-                    upper_percentage = expected[key] + std_dev*standard_error
-                    proportions.append((sample_percentage, lower_percentage, upper_percentage))
-                else:
-                    standard_error = None
-                    lower_percentage = None
-                    upper_percentage = None
-
-                self.print_results_row(
-                    key, # Label
-                    self._format_if_valid(self._float_value, expected[key]), # Expected proportion
-                    expected_size, # Expected size
-                    self._format_if_valid(self._float_value, sample_percentage), # Sample proportion
-                    self._format_if_valid(self._float_value, lower_percentage), # Upper confidence limit
-                    self._format_if_valid(self._float_value, upper_percentage), # Lower confidence limit
-                    sample[key], # Sample size
+                totals = (
+                    float(statistics.total_expected[i]),
+                    int(statistics.total_expected_sizes[i]),
+                    float(statistics.total_counted_sample_proportions[i]),
+                    float(statistics.total_lower[i]),
+                    float(statistics.total_upper[i]),
+                    sample_size,
                 )
             else:
-                self.print_results_row(
-                    key, # Label
-                    self._format_if_valid(self._float_value, expected[key]), # Expected proportion
-                    expected_size, # Expected size
-                    self._format_if_valid(self._float_value, sample_percentage), # Sample proportion
-                    sample[key], # Sample size
+                totals = (
+                    float(statistics.total_expected[i]),
+                    int(statistics.total_expected_sizes[i]),
+                    float(statistics.total_sample_proportions[i]),
+                    sample_size,
                 )
+            self.print_totals_row('Total', *totals, divider=True)
 
+            # Print chi-square values
+            self.print_fullwidth_value_span_row(
+                'Chi-Square Goodness of Fit Test{}'.format(
+                    ' (Excluding expected value(s)==0)' if statistics.excluded[i] else ''
+                ),
+                divider=True
+            )
+            self.print_halfwidth_float_span_row('Chi-square', chi_square, divider=False)
+            self.print_halfwidth_float_span_row('Chi-square p-value', chi_square_pvalue, divider=empirical_pvalue is None)
+            if empirical_pvalue is not None:
+                self.print_halfwidth_float_span_row('Empirical chi-square p-value', empirical_pvalue, divider=True)
 
-            # Count totals
-            totals[0] += expected[key]
-            if is_normal:
-                totals[1] += expected_size
-                if standard_error:
-                    totals[2] += sample_percentage
-                    totals[3] += lower_percentage
-                    totals[4] += upper_percentage
-                totals[5] += sample[key]
-            else:
-                totals[1] += expected_size
-                totals[2] += sample_percentage
-                totals[3] += sample[key]
-        self.print_horizontal_divider()
-        self.print_totals_row('Total', *(total for total in totals), divider=True)
-
-        # Find and print chi-square and Kolmogorov-Smirnov values
-        sample_values = list(sample.values())
-        # Remove expected sizes of 0
-        zero_in_expected_sizes = 0 in expected_sizes
-        if zero_in_expected_sizes:
-            for adjust, index in enumerate([i for i in range(len(expected_sizes)) if expected_sizes[i] == 0]):
-                del sample_values[index-adjust]
-                del expected_sizes[index-adjust]
-        chi_square, chi_square_pvalue = chisquare(sample_values, f_exp=expected_sizes)
-
-        self.print_fullwidth_value_span_row(
-            'Chi-Square Goodness of Fit Test{}'.format(
-                ' (Excluding expected value(s)==0)' if zero_in_expected_sizes else ''
-            ),
-            divider=True
-        )
-        self.print_halfwidth_float_span_row('Chi-square', chi_square, divider=False)
-        self.print_halfwidth_float_span_row('Chi-square p-value', chi_square_pvalue, divider=True)
-
-        assert sample_size == totals[5 if is_normal else 3] # Sanity check for sample size
+        if self.records is not None:
+            self._add_proportion_records(title, labels, statistics, i, is_normal, empirical_pvalue)
 
         # Write summary of results
         if summary != None and test_results != None:
             summary.append(('{}, n={}'.format(title, sample_size), []))
             if is_normal:
-                test_results.append(all([l < s < u for s,l,u in proportions]))
+                test_results.append(bool(statistics.in_interval[i]))
                 summary[-1][1].append((
-                    'Sample in {}% confidence interval'.format(confidence_limit),
+                    'Sample in {}% confidence interval'.format(['68', '95', '99.7'][statistics.std_dev-1]),
                     'PASS' if test_results[-1] else 'FAIL',
                 ))
             if chi_square_pvalue != None:
@@ -198,6 +218,9 @@ class Results:
                     'Chi-square p-value > 0.05',
                     'PASS' if test_results[-1] else 'FAIL',
                 ))
+            # Empirical p-values are reported, not counted in the passing tests
+            if empirical_pvalue is not None:
+                summary[-1][1].append(('Empirical chi-square p-value', '{:f}'.format(empirical_pvalue)))
 
         if pvalues != None:
             pvalues.append((sample_size, chi_square_pvalue))
@@ -205,9 +228,67 @@ class Results:
         if no_output:
             self._summary_only = prev_summary_only_val
 
+    # Add records of a table of print_proportion_statistics
+    def _add_proportion_records(self, title, labels, statistics, i, is_normal, empirical_pvalue):
+        sample_size = int(statistics.sample_sizes[i])
+        samples = statistics.samples[i].tolist()
+        if is_normal:
+            ## Confidence limits of categories not sampled can't be calculated
+            lower = [x if sample else None for x, sample in zip(statistics.lower[i].tolist(), samples)]
+            upper = [x if sample else None for x, sample in zip(statistics.upper[i].tolist(), samples)]
+            total_proportion = float(statistics.total_counted_sample_proportions[i])
+            total_lower, total_upper = float(statistics.total_lower[i]), float(statistics.total_upper[i])
+        else:
+            lower = upper = total_lower = total_upper = None
+            total_proportion = float(statistics.total_sample_proportions[i])
+        self.records.add(
+            title, 'category', [str(x) for x in labels],
+            n=sample_size,
+            expected=statistics.expected[i].tolist(),
+            expected_size=statistics.expected_sizes[i].astype(float).tolist(),
+            sample_proportion=statistics.sample_proportions[i].tolist(),
+            lower=lower,
+            upper=upper,
+            sample=samples,
+        )
+        self.records.add(
+            title, 'total', ['Total'],
+            n=sample_size,
+            expected=float(statistics.total_expected[i]),
+            expected_size=float(statistics.total_expected_sizes[i]),
+            sample_proportion=total_proportion,
+            lower=total_lower,
+            upper=total_upper,
+            sample=sample_size,
+        )
+        tests = [] # (label, statistic, p-value, passed)
+        if is_normal:
+            tests.append(('Confidence interval', None, None, bool(statistics.in_interval[i])))
+        chi_square_pvalue = float(statistics.chi_square_pvalues[i])
+        tests.append(('Chi-square', float(statistics.chi_square[i]), chi_square_pvalue, chi_square_pvalue > 0.05))
+        if empirical_pvalue is not None:
+            tests.append(('Empirical chi-square', None, empirical_pvalue, None))
+        self._add_test_records(title, sample_size, tests)
+
+    # Add records of tests of a table
+    ## tests: list of (label, statistic, p-value, passed), statistic and p-value may be None, passed is None for tests
+    ##        that are only reported, e.g. empirical p-values
+    ## expected: list of expected statistics or None
+    def _add_test_records(self, title, sample_size, tests, expected=None):
+        labels, statistics, pvalues, passed = (list(x) for x in zip(*tests))
+        self.records.add(
+            title, 'test', labels,
+            n=sample_size,
+            expected=expected,
+            statistic=statistics,
+            pvalue=pvalues,
+            result=[None if x is None else 'PASS' if x else 'FAIL' for x in passed],
+        )
+
     # Print kstest table
+    ## empirical_pvalue: float or None, empirical KS p-value of simulated replicates, see Simulate.NullDistribution
     def print_kstest_table(self, chi_square_pvalues, title, summary=None,
-                           test_results=None, column_size=30):
+                           test_results=None, column_size=30, empirical_pvalue=None):
         initial_sizes = (self._label_column_size, self._value_column_size, self._full_width)
         sample_size = sum([x[0] for x in chi_square_pvalues])
         self.set_label_column_size(column_size)
@@ -225,14 +306,27 @@ class Results:
         self.print_horizontal_divider()
 
         self.print_fullwidth_value_span_row('Kolmogorov-Smirnov uniformity test of Chi-square p-values', divider=True)
-        ks, ks_pvalue = kstest([p[1] for p in chi_square_pvalues], 'uniform')
+        ks, ks_pvalue = kstest_uniform([p[1] for p in chi_square_pvalues])
         self.print_halfwidth_float_span_row('KS', ks, divider=False)
-        self.print_halfwidth_float_span_row('p-value', ks_pvalue, divider=True)
+        self.print_halfwidth_float_span_row('p-value', ks_pvalue, divider=empirical_pvalue is None)
+        if empirical_pvalue is not None:
+            self.print_halfwidth_float_span_row('Empirical p-value', empirical_pvalue, divider=True)
 
         self.set_label_column_size(initial_sizes[0])
         self.set_value_column_size(initial_sizes[1])
         self.set_full_width(initial_sizes[2])
 
+        if self.records is not None:
+            self.records.add(
+                title, 'category', [str(i) for i in range(len(chi_square_pvalues))],
+                n=[x[0] for x in chi_square_pvalues],
+                pvalue=[x[1] for x in chi_square_pvalues],
+            )
+            tests = [('KS', float(ks), ks_pvalue, ks_pvalue > 0.05)]
+            if empirical_pvalue is not None:
+                tests.append(('Empirical KS', None, empirical_pvalue, None))
+            self._add_test_records(title, sample_size, tests)
+
         # Add to last summary test results
         if summary != None and test_results != None:
             # Assume
@@ -241,6 +335,108 @@ class Results:
                 'KS uniformity p-value > 0.05',
                 'PASS' if test_results[-1] else 'FAIL',
             ))
+            if empirical_pvalue is not None:
+                summary[-1][1].append(('Empirical KS uniformity p-value', '{:f}'.format(empirical_pvalue)))
+
+    # Print tests of the order of dealt cards
+    ## tests: DealOrder.DealOrderTests
+    def print_deal_order_tests(self, tests, summary=None, test_results=None, column_size=40):
+        initial_sizes = (self._label_column_size, self._value_column_size, self._full_width)
+        self.set_label_column_size(column_size)
+        self.set_full_width(3)
+
+        self.print_string_with_divider('')
+        self.print_fullwidth_value_span_row(
+            'Order of Dealt Cards, hands={}, cards={}'.format(tests.hands, tests.cards), divider=True
+        )
+        self.print_results_row('Test', 'Statistic', 'Expected', 'p-value', divider=True)
+        rows = [ # (label, label of summary, statistic, expected statistic, p-value)
+            ('Serial correlation of card IDs', 'Serial correlation', '{:.6f}'.format(tests.serial_correlation),
+             '{:.6f}'.format(tests.EXPECTED_CORRELATION), tests.serial_correlation_pvalue),
+            ('Runs of suits', 'Suit runs', tests.suit_runs, '{:.1f}'.format(tests.expected_suit_runs), tests.suit_runs_pvalue),
+            ('Runs of ranks', 'Rank runs', tests.rank_runs, '{:.1f}'.format(tests.expected_rank_runs), tests.rank_runs_pvalue),
+            ('Transitions chi-square', 'Transitions', '{:.3f}'.format(tests.transition_chi_square),
+             tests.transition_degrees_of_freedom, tests.transition_pvalue),
+            ('Gaps KS of cards, max gap={}'.format(tests.max_gap), 'Gaps KS', '{:.6f}'.format(tests.gap_ks), '',
+             tests.gap_ks_pvalue),
+        ]
+        for label, _, statistic, expected, pvalue in rows:
+            self.print_results_row(label, statistic, expected, '{:f}'.format(pvalue))
+        self.print_horizontal_divider()
+
+        self.set_label_column_size(initial_sizes[0])
+        self.set_value_column_size(initial_sizes[1])
+        self.set_full_width(initial_sizes[2])
+
+        if self.records is not None:
+            statistics = (
+                tests.serial_correlation, tests.suit_runs, tests.rank_runs, tests.transition_chi_square, tests.gap_ks,
+            )
+            self._add_test_records(
+                'Order of Dealt Cards', tests.cards,
+                [(summary_label, float(statistic), pvalue, pvalue > 0.05)
+                 for (_, summary_label, _, _, pvalue), statistic in zip(rows, statistics)],
+                expected=[
+                    tests.EXPECTED_CORRELATION, tests.expected_suit_runs, tests.expected_rank_runs,
+                    float(tests.transition_degrees_of_freedom), None,
+                ],
+            )
+
+        if summary != None and test_results != None:
+            summary.append(('Order of Dealt Cards, n={}'.format(tests.cards), []))
+            for _, summary_label, _, _, pvalue in rows:
+                test_results.append(pvalue > 0.05)
+                summary[-1][1].append((
+                    '{} p-value > 0.05'.format(summary_label),
+                    'PASS' if test_results[-1] else 'FAIL',
+                ))
+
+    # Print decisions of sequential tests, see Sequential.SequentialTests
+    ## sequential: Sequential.SequentialTests
+    ## hands: int, number of hands read
+    def print_sequential_tests(self, sequential, hands, summary=None, test_results=None, column_size=40):
+        initial_sizes = (self._label_column_size, self._value_column_size, self._full_width)
+        self.set_label_column_size(column_size)
+        self.set_full_width(3)
+
+        self.print_string_with_divider('', is_summary=True)
+        self.print_fullwidth_value_span_row(
+            'Sequential Chi-square Tests, alpha={}, beta={}, effect size={}'.format(
+                sequential.alpha, sequential.beta, sequential.effect_size
+            ),
+            divider=True,
+            is_summary=True,
+        )
+        self.print_fullwidth_value_span_row(
+            '{} after {} hands, {} looks'.format(
+                'All decided' if sequential.decided else 'Undecided', hands, sequential.looks
+            ),
+            divider=True,
+            is_summary=True,
+        )
+        self.print_results_row('Table', 'Decision', 'Sample Size', 'Log LR', divider=True, is_summary=True)
+        for title, (decision, sample_size, log_ratio) in sequential.decisions.items():
+            self.print_results_row(title, decision, sample_size, '{:.3f}'.format(log_ratio), is_summary=True)
+        self.print_horizontal_divider(is_summary=True)
+
+        self.set_label_column_size(initial_sizes[0])
+        self.set_value_column_size(initial_sizes[1])
+        self.set_full_width(initial_sizes[2])
+
+        if self.records is not None and sequential.decisions:
+            titles, decisions = zip(*sequential.decisions.items())
+            self.records.add(
+                'Sequential Chi-square Tests', 'test', list(titles),
+                n=[sample_size for _, sample_size, _ in decisions],
+                statistic=[log_ratio for _, _, log_ratio in decisions],
+                result=[decision for decision, _, _ in decisions],
+            )
+
+        if summary != None and test_results != None:
+            summary.append(('Sequential Chi-square Tests, n={}'.format(hands), []))
+            for title, (decision, _, _) in sequential.decisions.items():
+                test_results.append(decision == sequential.PASS)
+                summary[-1][1].append((title, decision))
 
     # Print summary
     ## summary: list of pair of strs
@@ -261,3 +457,12 @@ class Results:
             divider=True,
             is_summary=True,
         )
+
+        if self.records is not None:
+            for title, details in summary:
+                self.records.add(
+                    title, 'summary', [test for test, _ in details], result=[result for _, result in details]
+                )
+            self.records.add(
+                'SUMMARY', 'total', ['Passing Tests'], n=len(test_results), sample=test_results.count(True)
+            )
@@ -0,0 +1,76 @@
+import math
+import numpy as np
+
+# Sequential probability ratio tests of the chi-square goodness of fit tests of an audit, for stopping
+# early once every test is decided. At each look, the chi-square statistic of all hands so far is
+# compared under the null hypothesis (central chi-square) and an alternative of effect size w, i.e.
+# Cohen's w (noncentral chi-square with noncentrality n*w^2 for a sample of n), which is Wald's
+# invariant SPRT. A test passes once the likelihood ratio falls to beta/(1-alpha), and fails once it
+# reaches (1-beta)/alpha, so it fails with probability at most about alpha if the RNG is fair, and
+# passes with probability at most about beta if the RNG is off by the effect size.
+# Categories with small expected sizes, e.g. straight flushes of few hands, are pooled before each look,
+# as their chi-square terms are far from asymptotic and would fail fair samples early.
+class SequentialTests:
+    PASS = 'PASS'
+    FAIL = 'FAIL'
+    UNDECIDED = 'UNDECIDED'
+    MIN_EXPECTED_SIZE = 5 # Categories expected less often are pooled
+
+    ## alpha: float, error rate of failing a fair RNG
+    ## beta: float, error rate of passing an RNG off by the effect size
+    ## effect_size: float, Cohen's w of the alternative hypothesis
+    def __init__(self, alpha=0.05, beta=0.05, effect_size=0.1):
+        self.alpha = alpha
+        self.beta = beta
+        self.effect_size = effect_size
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.decisions = {} # Dict of title to (decision, sample size, log likelihood ratio), in order of tables
+        self.looks = 0
+
+    # Update the tests with statistics of all hands so far
+    ## tables: list of (title, Statistics.ProportionStatistics), statistics of all hands of each table
+    ## Returns bool, True if every test is decided
+    def update(self, tables):
+        from scipy.stats import chi2, ncx2 # Only needed by --sequential, and slow to import
+        self.looks += 1
+        for title, statistics in tables:
+            decision = self.decisions.get(title)
+            if decision is not None and decision[0] != self.UNDECIDED:
+                continue
+            n = int(statistics.sample_sizes[0])
+            chi_square, df = self._pooled_chi_square(statistics.samples[0], statistics.expected[0] * n)
+            if df < 1:
+                self.decisions[title] = (self.UNDECIDED, n, 0.0)
+                continue
+            log_ratio = ncx2.logpdf(chi_square, df, n * self.effect_size**2) - chi2.logpdf(chi_square, df)
+            if math.isnan(log_ratio):
+                log_ratio = 0.0
+            if log_ratio <= self.lower:
+                self.decisions[title] = (self.PASS, n, log_ratio)
+            elif log_ratio >= self.upper:
+                self.decisions[title] = (self.FAIL, n, log_ratio)
+            else:
+                self.decisions[title] = (self.UNDECIDED, n, log_ratio)
+        return self.decided
+
+    # Chi-square statistic of a sample, with categories expected less than MIN_EXPECTED_SIZE times pooled,
+    # and pooled into the next smallest category while still expected less often
+    ## samples: np.ndarray of ints, shape=(K,), sampled count of each category
+    ## expected_sizes: np.ndarray of floats, shape=(K,), expected count of each category
+    ## Returns (float, int), chi-square and degrees of freedom
+    def _pooled_chi_square(self, samples, expected_sizes):
+        order = np.argsort(expected_sizes, kind='stable')
+        samples, expected_sizes = samples[order], expected_sizes[order]
+        pooled = int(np.searchsorted(np.cumsum(expected_sizes), self.MIN_EXPECTED_SIZE)) + 1
+        pooled = min(pooled, len(samples))
+        samples = np.concatenate(([samples[:pooled].sum()], samples[pooled:]))
+        expected_sizes = np.concatenate(([expected_sizes[:pooled].sum()], expected_sizes[pooled:]))
+        if expected_sizes[0] <= 0:
+            return 0.0, 0
+        return float(((samples - expected_sizes)**2 / expected_sizes).sum()), len(samples) - 1
+
+    # Whether every test is decided
+    @property
+    def decided(self):
+        return bool(self.decisions) and all(d[0] != self.UNDECIDED for d in self.decisions.values())
@@ -0,0 +1,334 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+from Parse import CARDS
+from Evaluate import HAND_LABELS, COMBINATION_COUNTS, combination_rank_classes
+from Statistics import chi_square, chi2_sf, ks_uniform, kstest_uniform
+
+## Players dealt hole cards of each hand dealt to estimate distributions, see board_level_distributions
+_POOL_PLAYERS = 9
+
+## Board lengths of hands with a board, whose hands are evaluated
+BOARD_LENGTHS = (3, 4, 5)
+
+# Draw multinomial counts of many samples at once, with probabilities of any shape, which NumPy 1.19's
+# Generator.multinomial doesn't take. Counts of each category are binomial given the counts of categories before it,
+# and are only drawn for samples with trials left, as most samples of sparse tables have none.
+## rng: np.random.Generator
+## n: array-like of ints, shape=(..., M), number of trials of each sample
+## pvals: array-like of floats, shape=(M, K) or (K,), probability of each category of each sample of the last axis
+## Returns np.ndarray of ints, shape=(..., M, K) or (..., K)
+def multinomial(rng, n, pvals):
+    n = np.asarray(n, dtype=np.int64)
+    pvals = np.asarray(pvals, dtype=np.float64)
+    rows = pvals.reshape(-1, pvals.shape[-1])
+    ## Probability of each category and all categories after it, so that the last category takes every trial left
+    tails = np.cumsum(rows[:, ::-1], axis=1)[:, ::-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        conditional = np.clip(np.where(tails > 0, rows / tails, 0), 0, 1)
+    counts = np.zeros((n.size, rows.shape[1]), dtype=np.int64)
+    remaining = n.ravel().copy()
+    active = np.flatnonzero(remaining)
+    for k in range(rows.shape[1] - 1):
+        taken = rng.binomial(remaining[active], conditional[active % len(rows), k])
+        counts[active, k] = taken
+        remaining[active] -= taken
+        active = active[remaining[active] > 0]
+    counts[:, -1] = remaining
+    return counts.reshape(n.shape + rows.shape[1:])
+
+# Classes of boards that the hands of players sharing a board depend on most, the multiplicities of the ranks of the
+# board, e.g. a pair, the number of cards of its most common suit, and the number of ranks of the board in the five
+# ranks of a straight that has most of them, aces also low. Boards with at most 2 cards of a suit, or 2 ranks of a
+# straight, make no flushes or straights, so they're of one class.
+## boards: np.ndarray of card IDs, shape=(N, L)
+## Returns np.ndarray of ints, shape=(N,), e.g. 21133 for a board with a pair, three cards of one suit, and three ranks
+##         of a straight
+def board_classes(boards):
+    indexes = np.arange(len(boards))[:, None]
+    ranks = np.bincount((indexes * 13 + boards // 4).ravel(), minlength=len(boards) * 13).reshape(-1, 13)
+    suits = np.bincount((indexes * 4 + boards % 4).ravel(), minlength=len(boards) * 4).reshape(-1, 4)
+    ## Cumulative numbers of ranks from the ace low to the ace high, so windows of five ranks are differences
+    straights = np.cumsum(np.concatenate((np.zeros((len(boards), 1), dtype=np.int64), ranks[:, -1:] > 0, ranks > 0), axis=1), axis=1)
+    straights = (straights[:, 5:] - straights[:, :-5]).max(axis=1)
+    flushes = np.maximum(suits.max(axis=1), 2)
+    return (-np.sort(-ranks, axis=1)[:, :3] @ [1000, 100, 10] + flushes) * 10 + np.maximum(straights, 2)
+
+# Scale a table so that its rows and columns sum to margins, by iterative proportional fitting
+## table: np.ndarray of floats, shape=(M, N), with a nonzero entry in every row and column
+## rows: np.ndarray of floats, shape=(M,), sum of each row
+## columns: np.ndarray of floats, shape=(N,), sum of each column, with the same total as rows
+## Returns np.ndarray of floats, shape=(M, N), columns sum to columns exactly
+def rake(table, rows, columns, iterations=1000, tolerance=1e-12):
+    for _ in range(iterations):
+        table = table * (rows / table.sum(axis=1))[:, None]
+        table = table * (columns / table.sum(axis=0))
+        if np.abs(table.sum(axis=1) - rows).max() < tolerance:
+            break
+    return table
+
+# Distributions of a model of hands with a board, in which the players of a hand share its board.
+# The board of a hand is drawn from board classes, see board_classes, players' best hands are drawn from the
+# distribution of hands with a board of that class, and the combinations of each player from the distribution of
+# combinations of players with that best hand. Distributions are estimated once from hands dealt at random, and
+# scaled to the exact expected distributions by rake(), so hands and combinations of the model have exactly the
+# expected distributions, and only their dependence is estimated.
+## expected: Expected.ExpectedDistributions
+## only_me: bool, only my ([ME]) hole cards are counted
+## deals: int, number of hands dealt to estimate distributions, each with _POOL_PLAYERS players
+## seed: int, np.random.SeedSequence or None, seed of the shuffler
+## Returns list of (np.ndarray of floats, np.ndarray of floats, np.ndarray of floats), shape=(G,), (G, K), (K, K),
+##         distribution of board classes, of players' best hands given the board class, and of combinations given the
+##         best hand, for each of BOARD_LENGTHS
+def board_level_distributions(expected, only_me=False, deals=1 << 14, seed=None):
+    rng = np.random.default_rng(seed)
+    hand_distributions = expected.components('hand', BOARD_LENGTHS[-1] + 1, only_me=only_me)
+    allcombinations_distributions = expected.components('allcombinations', BOARD_LENGTHS[-1] + 1, only_me=only_me)
+    ## Boards are dealt first, and each board length is the first cards of the board, as in a hand. Deals are the
+    ## first cards of a permutation of the deck, as cards selected by argpartition aren't in a random order
+    cards = np.argsort(rng.random((deals, len(CARDS))), axis=1)[:, :5 + 2*_POOL_PLAYERS]
+    hole_cards = cards[:, 5:].reshape(-1, 2)
+    k = len(HAND_LABELS)
+    distributions = []
+    for board_length in BOARD_LENGTHS:
+        boards = cards[:, :board_length]
+        classes = combination_rank_classes(np.concatenate((hole_cards, np.repeat(boards, _POOL_PLAYERS, axis=0)), axis=1))
+        best = classes.max(axis=1)
+        _, board_class = np.unique(board_classes(boards), return_inverse=True)
+        board_class = np.repeat(board_class, _POOL_PLAYERS)
+        hands, combinations = hand_distributions[board_length], allcombinations_distributions[board_length]
+        # Best hands by board class, and combinations by best hand. Hands and combinations never dealt get one hand of
+        # the expected distributions, so that they can be scaled up, and others keep the ones that can't be dealt at 0
+        board_hands = np.bincount(board_class * k + best, minlength=(board_class.max() + 1) * k).reshape(-1, k)
+        never = board_hands.sum(axis=0) == 0
+        board_hands = board_hands + np.outer(board_hands.sum(axis=1) / len(best), hands * never)
+        board_hands = rake(board_hands, board_hands.sum(axis=1) / board_hands.sum(), hands)
+        best_combinations = np.bincount((best[:, None] * k + classes).ravel(), minlength=k * k).reshape(k, k)
+        never = (best_combinations.sum(axis=1) == 0)[:, None] | (best_combinations.sum(axis=0) == 0)
+        ## A player's combinations are at most as good as the player's best hand
+        best_combinations = best_combinations + np.tril(np.outer(hands, combinations)) * never
+        best_combinations = rake(best_combinations, hands, combinations)
+        distributions.append((
+            board_hands.sum(axis=1),
+            board_hands / board_hands.sum(axis=1, keepdims=True),
+            best_combinations / best_combinations.sum(axis=1, keepdims=True),
+        ))
+    return distributions
+
+# Draw card counts of deals, each deal taking cards of a shuffled deck
+# Cards are drawn in order, each deal taking a card with the probability that it's one of the cards it has left to
+# take, so deals hold their cards without replacement, and counts are exact.
+## rng: np.random.Generator
+## replicates: int, number of replicates
+## deal_sizes: np.ndarray of ints, number of deals of each number of cards
+## Returns np.ndarray of ints, shape=(replicates, len(CARDS)), number of deals with each card
+def deal_card_counts(rng, replicates, deal_sizes):
+    ## Number of deals of each replicate by number of cards left to take
+    deals = np.tile(deal_sizes, (replicates, 1))
+    left = np.arange(len(deal_sizes))
+    counts = np.empty((replicates, len(CARDS)), dtype=np.int64)
+    for card in range(len(CARDS)):
+        ## Deals can't have more cards left than the deck, so probabilities above 1 are of no deals
+        taken = rng.binomial(deals, np.minimum(left / (len(CARDS) - card), 1))
+        counts[:, card] = taken.sum(axis=1)
+        deals -= taken
+        deals[:, :-1] += taken[:, 1:]
+    return counts
+
+# Draw counts of hands with a board and of their combinations for each bin, see board_level_distributions
+## rng: np.random.Generator
+## replicates: int, number of replicates
+## hands: np.ndarray of ints, shape=(B, len(BOARD_LENGTHS), P), number of hands of each bin with each board length and
+##        each number of players
+## distributions: list of distributions of board_level_distributions
+## allcombinations: bool, also draw counts of all combinations
+## Returns (np.ndarray of ints, np.ndarray of ints or None), shape=(replicates, B, K), counts of best hands and of
+##         combinations of each bin
+def draw_hand_counts(rng, replicates, hands, distributions, allcombinations=False):
+    k = len(HAND_LABELS)
+    hand_counts = np.zeros((replicates, len(hands), k), dtype=np.int64)
+    allcombinations_counts = np.zeros_like(hand_counts) if allcombinations else None
+    for board_length, board_length_hands, (boards, board_hands, best_combinations) in zip(
+        BOARD_LENGTHS, hands.transpose(1, 0, 2), distributions
+    ):
+        ## Only numbers of players of any hand are drawn
+        players = np.flatnonzero(board_length_hands.any(axis=0))
+        if not len(players):
+            continue
+        # Boards of hands with each number of players, and best hands of all players of each board class
+        board_counts = multinomial(rng, np.broadcast_to(board_length_hands[:, players], (replicates, len(hands), len(players))), boards)
+        player_counts = (board_counts * players[:, None]).sum(axis=-2)
+        best_counts = multinomial(rng, player_counts, board_hands).sum(axis=-2)
+        hand_counts += best_counts
+        if allcombinations:
+            combinations = COMBINATION_COUNTS[board_length + 2] * best_counts
+            allcombinations_counts += multinomial(rng, combinations, best_combinations).sum(axis=-2)
+    return hand_counts, allcombinations_counts
+
+# Draw and test a batch of replicates, see NullDistribution.simulate
+## job: tuple of (seed, replicates, hands, distributions, deal_sizes, players, tables)
+## Returns list of np.ndarray of floats, shape=(replicates, B), chi-square statistics of each sample of each table
+def _replicate_batch(job):
+    seed, replicates, hands, distributions, deal_sizes, players, tables = job
+    rng = np.random.default_rng(seed)
+    hand_counts, allcombinations_counts = draw_hand_counts(
+        rng, replicates, hands, distributions, allcombinations=any(t[0] == 'allcombinations' for t in tables)
+    )
+    chi_squares = []
+    for statistic, expected, expected_sizes in tables:
+        if statistic in ('hand', 'allcombinations'):
+            samples = hand_counts if statistic == 'hand' else allcombinations_counts
+            ## Tables of all hands are tables of one bin of all hands
+            if len(expected_sizes) != samples.shape[1]:
+                samples = samples.sum(axis=1, keepdims=True)
+        elif statistic == 'card':
+            samples = deal_card_counts(rng, replicates, deal_sizes)[:, None]
+        else:
+            samples = rng.multinomial(players, expected / expected.sum(), size=replicates)[:, None]
+        chi_squares.append(chi_square(samples, expected_sizes)[0])
+    return chi_squares
+
+# Monte Carlo null distributions of the chi-square and KS tests of an audit, at its sample and bin sizes.
+# Replicates draw the counts of every table as batched multinomials of the exact expected distributions, keeping the
+# number of hands of each bin with each board length and number of players, and are tested against the expected
+# sizes of the audit, so empirical p-values don't rely on asymptotic distributions, e.g. of categories with small
+# expected sizes. Counts of hands aren't multinomial, as players of a hand share its board, and the combinations
+# of a player share their cards, so hands are drawn from board level multinomials, see board_level_distributions.
+# Counts of cards are drawn exactly, see deal_card_counts, and hole cards of each player are drawn independently,
+# though players of a hand can't share cards. Nothing is dealt or evaluated for replicates, so 10,000
+# replicates of an audit take seconds.
+# Replicates are drawn in batches with seeds spawned in order, so results don't depend on map.
+class NullDistribution:
+    BATCH_SIZE = 1 << 15 # Replicates times bins of a batch, bounds memory
+
+    ## replicates: int, number of replicates of the audit
+    ## seed: int or None, seed of all replicates, None for a random seed
+    ## map: function like map, e.g. multiprocessing.Pool.map to draw batches in processes
+    def __init__(self, replicates=10000, seed=None, map=map):
+        self.replicates = replicates
+        self.map = map
+        self._seed_sequence = np.random.SeedSequence(seed)
+
+    # Chi-square statistics of replicates of the tables of an audit
+    ## audit: Audit, with dealt_hands, see Audit.keep_dealt_hands
+    ## bins: int, number of bins of binned tables, see Audit.bin_ranges
+    ## tables: list of (str, Statistics.ProportionStatistics), statistic of Expected.STATISTICS and statistics of each
+    ##         table, of each bin of binned tables, or of all hands
+    ## expected: Expected.ExpectedDistributions
+    ## Returns list of np.ndarray of floats, shape=(replicates, B), chi-square statistics of each of B samples of each table
+    def simulate(self, audit, bins, tables, expected):
+        ranges = list(audit.bin_ranges(bins))
+        batch_size = max(self.BATCH_SIZE // max(len(ranges), 1), 1)
+        batches = range(0, self.replicates, batch_size)
+        distributions_seed, *seeds = self._seed_sequence.spawn(1 + len(batches))
+        distributions = board_level_distributions(expected, audit.only_me, seed=distributions_seed)
+
+        # Hands of each bin by board length and number of players, and cards and players of every dealt hand
+        bin_indexes = np.repeat(np.arange(len(ranges)), [end - start for start, end in ranges])
+        board_lengths = audit.hands.board_lengths.astype(np.int64) - BOARD_LENGTHS[0]
+        players = audit.hands.players.astype(np.int64)
+        max_players = int(players.max(initial=0)) + 1
+        hands = np.bincount(
+            (bin_indexes * len(BOARD_LENGTHS) + board_lengths) * max_players + players,
+            minlength=len(ranges) * len(BOARD_LENGTHS) * max_players,
+        ).reshape(len(ranges), len(BOARD_LENGTHS), max_players)
+        dealt_players = audit.dealt_hands.players.astype(np.int64)
+        deal_sizes = np.bincount(2 * dealt_players + audit.dealt_hands.board_lengths)
+        table_specs = [(statistic, s.expected[0], s.expected_sizes) for statistic, s in tables]
+
+        jobs = [
+            (seed, min(batch_size, self.replicates - start), hands, distributions, deal_sizes, int(dealt_players.sum()), table_specs)
+            for seed, start in zip(seeds, batches)
+        ]
+        results = list(self.map(_replicate_batch, jobs))
+        return [
+            np.concatenate([result[i] for result in results]) if results else np.zeros((0, len(statistics)))
+            for i, (_, statistics) in enumerate(tables)
+        ]
+
+    # Empirical p-values of the tables of an audit, the fraction of replicates with a statistic at least as
+    # large, counting the audit
+    ## audit, bins, tables, expected: see simulate()
+    ## Returns list of (np.ndarray of floats, float), p-values of the chi-square test of each sample, and of the KS
+    ##         uniformity test of the chi-square p-values of all samples, see Results.print_kstest_table, of each table
+    def pvalues(self, audit, bins, tables, expected):
+        pvalues = []
+        for (_, table), chi_squares in zip(tables, self.simulate(audit, bins, tables, expected)):
+            with np.errstate(invalid='ignore'):
+                ks = ks_uniform(chi2_sf(chi_squares, table.degrees_of_freedom))
+            pvalues.append((
+                self._empirical_pvalues(table.chi_square, chi_squares),
+                float(self._empirical_pvalues(ks_uniform(table.chi_square_pvalues), ks)),
+            ))
+        return pvalues
+
+    def _empirical_pvalues(self, observed, simulated):
+        return (1 + (simulated >= observed).sum(axis=0)) / (len(simulated) + 1)
+
+# Check calibration of empirical p-values on generated hand history of a fair shuffler: each dataset is audited
+# by main.py with --simulate, and the empirical p-values of each test, of all bins and datasets, should be
+# about uniform, e.g. at most 0.05 in about 5% of them
+def main():
+    argparser = argparse.ArgumentParser(description='Check that empirical p-values of --simulate are uniform on generated hand history of a fair shuffler.')
+    argparser.add_argument('--datasets', default=20, type=int, help='Number of generated hand histories. Default=20')
+    argparser.add_argument('--hands', default=2000, type=int, help='Number of hands of each hand history. Default=2000')
+    argparser.add_argument('--replicates', default=1000, type=int, help='Replicates of --simulate of each audit. Default=1000')
+    argparser.add_argument('--bins', default=10, type=int, help='Number of bins of each audit. Default=10')
+    argparser.add_argument('--jobs', default=1, type=int, help='Number of processes of each audit. Default=1')
+    argparser.add_argument('--seed', default=0, type=int, help='Seed of the first hand history and its replicates. Default=0')
+    argparser.add_argument('--directory', default='calibration', type=str,
+        help='Path to directory of generated hand history files, reused by later runs. Default=calibration')
+    args = argparser.parse_args()
+    from Generate import write_hand_history
+    from Results import Results
+
+    main = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+    pvalues = {} # Dict of (table, test) to list of empirical p-values
+    for seed in range(args.seed, args.seed + args.datasets):
+        # main.py audits directories, so each file has a directory of its own
+        directory = os.path.join(args.directory, 'calibration-{}-{}'.format(args.hands, seed))
+        path = os.path.join(directory, 'hands.txt')
+        if not os.path.exists(path):
+            os.makedirs(directory, exist_ok=True)
+            write_hand_history(path + '.tmp', args.hands, seed=seed)
+            os.replace(path + '.tmp', path)
+        export = os.path.join(directory, 'results.jsonl')
+        subprocess.run([
+            sys.executable, main, directory, '--allcombinations', '--holecards', '--summaryonly',
+            '--bins', str(args.bins), '--simulate', str(args.replicates), '--seed', str(seed), '--jobs', str(args.jobs),
+            '--export', export,
+        ], stdout=subprocess.DEVNULL, check=True)
+        with open(export) as f:
+            for record in map(json.loads, f):
+                if record['kind'] == 'test' and record['label'].startswith('Empirical'):
+                    ## Tests of all bins are tests of one binned table
+                    table = re.sub(r'^BIN #\d+ ', '', record['table'])
+                    pvalues.setdefault((table, record['label']), []).append(record['pvalue'])
+
+    results = Results(label_column_size=85)
+    results.set_full_width(4)
+    results.print_string_with_divider('')
+    results.print_fullwidth_value_span_row(
+        'Empirical p-values of {} audits of {} hands, {} replicates'.format(args.datasets, args.hands, args.replicates),
+        divider=True,
+    )
+    results.print_results_row('Test', 'p-values', 'p <= 0.05', 'KS', 'KS p-value', divider=True)
+    for (table, test), values in pvalues.items():
+        values = np.array(values)
+        ks, ks_pvalue = kstest_uniform(values.tolist())
+        results.print_results_row(
+            '{}, {}'.format(table, test),
+            len(values),
+            '{:.3f}'.format((values <= 0.05).mean()),
+            '{:.4f}'.format(ks),
+            '{:.4f}'.format(ks_pvalue),
+        )
+    results.print_horizontal_divider()
+    results.flush()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import numpy as np
+
+## Backend of chi2_sf and kstest_uniform, 'scipy' or 'numpy', see use_backend
+BACKENDS = ('scipy', 'numpy')
+_backend = 'scipy'
+
+# Compute p-values with scipy.stats, imported on first use, or with Distributions, which only needs NumPy
+# and starts faster, with p-values matching scipy to 1e-10
+## backend: str, one of BACKENDS
+def use_backend(backend):
+    global _backend
+    if backend not in BACKENDS:
+        raise ValueError('Unknown statistics backend {}'.format(backend))
+    _backend = backend
+
+# Survival function of the chi-square distribution, i.e. p-values of chi-square statistics
+## x: array-like of floats, chi-square statistics
+## df: array-like of ints, degrees of freedom
+## Returns np.ndarray of floats, nan where df < 1
+def chi2_sf(x, df):
+    if _backend == 'numpy':
+        from Distributions import chi2_sf
+        return chi2_sf(x, df)
+    from scipy.stats import chi2
+    return chi2.sf(x, df)
+
+# Kolmogorov-Smirnov test of values against the uniform distribution on [0, 1]
+## values: sequence of floats
+## Returns (float, float), KS statistic and p-value
+def kstest_uniform(values):
+    if _backend == 'numpy':
+        from Distributions import kolmogorov_sf
+        statistic = float(ks_uniform(np.asarray(values, dtype=np.float64)))
+        return statistic, kolmogorov_sf(len(values), statistic)
+    from scipy.stats import kstest
+    return tuple(kstest(values, 'uniform'))
+
+# Chi-square statistics of samples, excluding categories with expected size of 0
+## samples: np.ndarray of ints, shape=(..., K), sampled count of each category
+## expected_sizes: np.ndarray of ints, shape=(..., K), expected count of each category
+## Returns (np.ndarray of floats, np.ndarray of ints), chi-square and degrees of freedom, shape=(...)
+def chi_square(samples, expected_sizes):
+    included = expected_sizes != 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(included, (samples - expected_sizes)**2 / np.where(included, expected_sizes, 1), 0)
+    return terms.sum(axis=-1), included.sum(axis=-1) - 1
+
+# Kolmogorov-Smirnov statistics of samples against the uniform distribution on [0, 1]
+## values: np.ndarray of floats, shape=(..., N), N values of each sample
+## Returns np.ndarray of floats, shape=(...)
+def ks_uniform(values):
+    values = np.sort(values, axis=-1)
+    n = values.shape[-1]
+    d_plus = (np.arange(1, n + 1) / n - values).max(axis=-1)
+    d_minus = (values - np.arange(n) / n).max(axis=-1)
+    return np.maximum(d_plus, d_minus)
+
+# Goodness of fit of samples to expected proportions, computed for every row of samples at once.
+# Arrays have shape=(B, K) for B samples (e.g. bins) of K categories, and shape=(B,) per sample.
+# Values that can't be computed, e.g. confidence limits of categories never sampled, are nan.
+class ProportionStatistics:
+
+    ## expected: array-like of floats, shape=(K,) or (B, K), expected proportion of each category
+    ## samples: array-like of ints, shape=(K,) or (B, K), sampled count of each category
+    ## std_dev: int 1,2,3, std_dev for use in confidence limit
+    def __init__(self, expected, samples, std_dev=2):
+        self.std_dev = std_dev
+        self.samples = np.atleast_2d(np.asarray(samples, dtype=np.int64))
+        self.expected = np.broadcast_to(np.asarray(expected, dtype=np.float64), self.samples.shape)
+        self.sample_sizes = self.samples.sum(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sample_sizes = self.sample_sizes[:, None]
+            self.sample_proportions = self.samples / sample_sizes
+            self.expected_sizes = np.round(self.expected * sample_sizes).astype(np.int64)
+
+            # Confidence limits of expected proportions, for samples of each category
+            sampled = self.samples != 0
+            standard_errors = np.sqrt((self.expected * (1-self.expected)) / np.where(sampled, self.samples, 1))
+            self.standard_errors = np.where(sampled, standard_errors, np.nan)
+            self.lower = self.expected - std_dev*self.standard_errors
+            self.upper = self.expected + std_dev*self.standard_errors
+            ## Samples of categories not sampled are always in the interval
+            self.in_interval = ((self.lower < self.sample_proportions) & (self.sample_proportions < self.upper) | ~sampled).all(axis=1)
+
+            # Chi-square goodness of fit test, excluding categories with expected size of 0
+            self.chi_square, self.degrees_of_freedom = chi_square(self.samples, self.expected_sizes)
+            self.excluded = self.degrees_of_freedom != self.samples.shape[1] - 1
+            self.chi_square_pvalues = chi2_sf(self.chi_square, self.degrees_of_freedom)
+
+        # Totals of columns, summed in category order as when adding the rows of a table
+        ## Sample and confidence limits only include categories with a nonzero standard error
+        counted = sampled & (self.standard_errors != 0)
+        self.total_expected = self._ordered_sum(self.expected)
+        self.total_expected_sizes = self.expected_sizes.sum(axis=1)
+        self.total_sample_proportions = self._ordered_sum(self.sample_proportions)
+        self.total_counted_sample_proportions = self._ordered_sum(np.where(counted, self.sample_proportions, 0))
+        self.total_lower = self._ordered_sum(np.where(counted, self.lower, 0))
+        self.total_upper = self._ordered_sum(np.where(counted, self.upper, 0))
+
+    # Get statistics of one sample of dicts of labels
+    ## expected: dict, expected proportion of each label
+    ## sample: dict, sampled count of each label, in table order
+    ## std_dev: int 1,2,3, std_dev for use in confidence limit
+    ## Returns (list of labels, ProportionStatistics)
+    @classmethod
+    def from_dicts(cls, expected, sample, std_dev=2):
+        labels = list(sample.keys())
+        return labels, cls([expected[key] for key in labels], [sample[key] for key in labels], std_dev)
+
+    # Number of samples
+    def __len__(self):
+        return len(self.samples)
+
+    # Sum rows from first to last category, instead of the pairwise summation of np.sum
+    @staticmethod
+    def _ordered_sum(values):
+        return np.cumsum(values, axis=1)[:, -1] if values.shape[1] else np.zeros(len(values))
@@ -0,0 +1,292 @@
+import zipfile
+import numpy as np
+from math import comb
+
+# Data type of each column of HandStore
+COLUMNS = {
+    'hand_ids': np.uint64, # shape=(H,), hand number, 0 if unknown
+    'players': np.uint8, # shape=(H,), number of players dealt hole cards
+    'board_lengths': np.uint8, # shape=(H,), number of board cards, 0 if no board
+    'boards': np.uint8, # shape=(H, 5), card IDs of board cards, padded with 0
+    'hole_cards': np.uint8, # shape=(P, 2), card IDs of hole cards of every player in order
+    'hand_ranks': np.uint8, # shape=(R,), rank class of every player of hands with a board, optional
+    'allcombinations_ranks': np.uint8, # shape=(C,), rank class of all 5 card combinations of those players, optional
+}
+## Columns that are optional, see Evaluate.hand_rank_classes
+RANK_COLUMNS = ('hand_ranks', 'allcombinations_ranks')
+## Number of 5 card combinations of hole cards and a board of length k-2, indexed by board length
+_BOARD_COMBINATION_COUNTS = np.array([0] + [comb(k + 2, 5) for k in range(1, 6)], dtype=np.uint64)
+
+# Load arrays of a .npz file, see HandStore.save
+# Arrays that are stored uncompressed are memory mapped instead of read if mmap_mode is given
+## path: str, path of .npz file
+## mmap_mode: str or None, mode of np.memmap, e.g. 'r'
+## Returns dict of np.ndarray
+def load_npz(path, mmap_mode=None):
+    if mmap_mode is None:
+        with np.load(path) as npz:
+            return {k: npz[k] for k in npz.files}
+    arrays = {}
+    with open(path, 'rb') as f, zipfile.ZipFile(f) as zf:
+        for info in zf.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member:
+                    arrays[info.filename[:-len('.npy')]] = np.lib.format.read_array(member)
+                continue
+            # Skip the zip local file header to the start of the .npy data
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = np.frombuffer(f.read(4), dtype='<u2')
+            f.seek(info.header_offset + 30 + int(name_length) + int(extra_length))
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if not shape or 0 in shape:
+                arrays[info.filename[:-len('.npy')]] = np.empty(shape, dtype=dtype)
+                continue
+            arrays[info.filename[:-len('.npy')]] = np.memmap(
+                path, dtype=dtype, mode=mmap_mode, offset=f.tell(), shape=shape, order='F' if fortran_order else 'C'
+            )
+    return arrays
+
+# Columnar store of hands, as arrays of card IDs (see Parse.CARDS) with one row per hand,
+# and hole cards with one row per player. Hands are located in the per-player columns
+# by offsets, the cumulative sum of players of each hand.
+# Slicing a store by hands returns a store of views, so bins share the memory of the store.
+class HandStore:
+
+    ## columns: np.ndarrays by column name, see COLUMNS, default is an empty store
+    def __init__(self, **columns):
+        unknown = columns.keys() - COLUMNS.keys()
+        if unknown:
+            raise ValueError('Unknown columns {}'.format(', '.join(sorted(unknown))))
+        self._columns = {}
+        self._sizes = {}
+        for k, dtype in COLUMNS.items():
+            if k in columns:
+                self._columns[k] = np.asarray(columns[k], dtype=dtype)
+            elif k not in RANK_COLUMNS:
+                self._columns[k] = np.zeros((0, 5) if k == 'boards' else (0, 2) if k == 'hole_cards' else 0, dtype=dtype)
+            else:
+                continue
+            self._sizes[k] = len(self._columns[k])
+        self._offsets = {}
+        if len(self.hole_cards) != self.player_offsets[-1]:
+            raise ValueError('{} hole cards for {} players'.format(len(self.hole_cards), self.player_offsets[-1]))
+
+    # Build a store from hands of a parser
+    ## hands: iterable of (hand_id, hole_cards, board), e.g. Parse.Bovada.hands()
+    @classmethod
+    def from_hands(cls, hands):
+        hand_ids = []
+        players = []
+        hole_cards = []
+        board_lengths = []
+        boards = []
+        for hand_id, hand_hole_cards, board in hands:
+            hand_ids.append(hand_id or 0)
+            players.append(len(hand_hole_cards))
+            for c_1, c_2 in hand_hole_cards:
+                hole_cards.append(c_1)
+                hole_cards.append(c_2)
+            board = board or ()
+            board_lengths.append(len(board))
+            boards.extend(board)
+            boards.extend((0,)*(5-len(board)))
+        return cls(
+            hand_ids=np.array(hand_ids, dtype=np.uint64),
+            players=np.array(players, dtype=np.uint8),
+            hole_cards=np.array(hole_cards, dtype=np.uint8).reshape(-1, 2),
+            board_lengths=np.array(board_lengths, dtype=np.uint8),
+            boards=np.array(boards, dtype=np.uint8).reshape(-1, 5),
+        )
+
+    # Load a store saved with save()
+    ## path: str, path of .npz file
+    ## mmap_mode: str or None, memory map the arrays instead of reading them, e.g. 'r'
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        return cls(**load_npz(path, mmap_mode=mmap_mode))
+
+    # Save the store to an uncompressed .npz file, so it can be loaded with memory mapping
+    ## file: str or file object
+    def save(self, file):
+        np.savez(file, **self.columns())
+
+    # Number of hands
+    def __len__(self):
+        return self._sizes['players']
+
+    # Get the columns
+    # Returns dict of np.ndarray views by column name
+    def columns(self):
+        return {k: self._columns[k][:n] for k, n in self._sizes.items()}
+
+    # Column views, rank columns are None if missing
+    @property
+    def hand_ids(self):
+        return self._column('hand_ids')
+    @property
+    def players(self):
+        return self._column('players')
+    @property
+    def board_lengths(self):
+        return self._column('board_lengths')
+    @property
+    def boards(self):
+        return self._column('boards')
+    @property
+    def hole_cards(self):
+        return self._column('hole_cards')
+    @property
+    def hand_ranks(self):
+        return self._column('hand_ranks')
+    @property
+    def allcombinations_ranks(self):
+        return self._column('allcombinations_ranks')
+    def _column(self, k):
+        if k not in self._columns:
+            return None
+        return self._columns[k][:self._sizes[k]]
+
+    # Offsets where each hand starts and ends in the per-player and rank columns, shape=(H+1,)
+    @property
+    def player_offsets(self):
+        return self._cumulative_offsets('players', lambda: self.players)
+    @property
+    def hand_rank_offsets(self):
+        return self._cumulative_offsets('hand_ranks', lambda: self.players * (self.board_lengths > 0))
+    @property
+    def allcombinations_rank_offsets(self):
+        return self._cumulative_offsets(
+            'allcombinations_ranks', lambda: self.players * _BOARD_COMBINATION_COUNTS[self.board_lengths]
+        )
+    def _cumulative_offsets(self, k, counts):
+        if k not in self._offsets:
+            offsets = np.zeros(len(self) + 1, dtype=np.uint64)
+            np.cumsum(counts(), dtype=np.uint64, out=offsets[1:])
+            self._offsets[k] = offsets
+        return self._offsets[k]
+
+    # Get a store of views of hands start to end
+    ## key: slice, hand indexes, step must be 1
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError('HandStore indexes must be slices')
+        start, end, step = key.indices(len(self))
+        if step != 1:
+            raise ValueError('HandStore slices must have step 1')
+        end = max(start, end)
+        columns = {k: self._column(k)[start:end] for k in ('hand_ids', 'players', 'board_lengths', 'boards')}
+        for k, offsets in (
+                ('hole_cards', self.player_offsets),
+                ('hand_ranks', self.hand_rank_offsets),
+                ('allcombinations_ranks', self.allcombinations_rank_offsets)):
+            if k in self._columns:
+                columns[k] = self._column(k)[int(offsets[start]):int(offsets[end])]
+        return HandStore(**columns)
+
+    # Get a store of the hands where mask is True
+    ## mask: np.ndarray of bools, shape=(len(self),)
+    def select(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        columns = {k: self._column(k)[mask] for k in ('hand_ids', 'players', 'board_lengths', 'boards')}
+        for k, offsets in (
+                ('hole_cards', self.player_offsets),
+                ('hand_ranks', self.hand_rank_offsets),
+                ('allcombinations_ranks', self.allcombinations_rank_offsets)):
+            if k in self._columns:
+                columns[k] = self._column(k)[np.repeat(mask, np.diff(offsets).astype(np.intp))]
+        return HandStore(**columns)
+
+    # Get a store of the players where mask is True, and the hands with any of them
+    ## mask: np.ndarray of bools, shape=(number of players,)
+    def select_players(self, mask):
+        mask = np.asarray(mask, dtype=bool)
+        hand_indexes = np.repeat(np.arange(len(self)), self.players)
+        players = np.bincount(hand_indexes[mask], minlength=len(self))
+        player_board_lengths = self.board_lengths[hand_indexes]
+        columns = {k: self._column(k) for k in ('hand_ids', 'board_lengths', 'boards')}
+        columns['players'] = players
+        columns['hole_cards'] = self.hole_cards[mask]
+        if 'hand_ranks' in self._columns:
+            columns['hand_ranks'] = self.hand_ranks[mask[player_board_lengths > 0]]
+        if 'allcombinations_ranks' in self._columns:
+            columns['allcombinations_ranks'] = self.allcombinations_ranks[
+                np.repeat(mask, _BOARD_COMBINATION_COUNTS[player_board_lengths].astype(np.intp))
+            ]
+        return HandStore(**columns).select(players > 0)
+
+    # Set rank columns, see Evaluate.hand_rank_classes
+    ## hand_ranks: np.ndarray of uint8
+    ## allcombinations_ranks: np.ndarray of uint8 or None
+    def set_ranks(self, hand_ranks, allcombinations_ranks=None):
+        for k, ranks in zip(RANK_COLUMNS, (hand_ranks, allcombinations_ranks)):
+            if ranks is None:
+                continue
+            self._columns[k] = np.asarray(ranks, dtype=COLUMNS[k])
+            self._sizes[k] = len(ranks)
+
+    # Append a hand
+    # Rank columns are removed, as the hand isn't evaluated
+    ## hand_id: int or None, hand number
+    ## hole_cards: list of tuples of card IDs, hole cards of every player
+    ## board: list of card IDs or None, 3-5 board cards
+    def append(self, hand_id, hole_cards, board):
+        board = board or ()
+        self._drop_ranks()
+        self._append('hand_ids', [hand_id or 0])
+        self._append('players', [len(hole_cards)])
+        self._append('board_lengths', [len(board)])
+        self._append('boards', [tuple(board) + (0,)*(5-len(board))])
+        self._append('hole_cards', hole_cards)
+        self._offsets.clear()
+
+    # Append all hands of another store
+    # Rank columns are kept only if both stores have them
+    ## other: HandStore
+    def extend(self, other):
+        empty = not len(self)
+        for k in RANK_COLUMNS:
+            if k not in other._columns or k not in self._columns and not empty:
+                self._drop_ranks(k)
+        for k in other._sizes:
+            if k in self._columns or empty:
+                self._append(k, other._column(k))
+        self._offsets.clear()
+
+    def _drop_ranks(self, *ks):
+        for k in ks or RANK_COLUMNS:
+            self._columns.pop(k, None)
+            self._sizes.pop(k, None)
+
+    # Append rows to a column, doubling its capacity when full
+    def _append(self, k, rows):
+        rows = np.asarray(rows, dtype=COLUMNS[k])
+        if k not in self._columns:
+            self._columns[k] = np.zeros((0,) + rows.shape[1:], dtype=COLUMNS[k])
+            self._sizes[k] = 0
+        column = self._columns[k]
+        size = self._sizes[k]
+        if size + len(rows) > len(column) or not column.flags.writeable or column.base is not None:
+            # Reallocate rather than write into arrays that may be views of another store or a file
+            capacity = max(size + len(rows), 2*size, 16)
+            new_column = np.empty((capacity,) + column.shape[1:], dtype=column.dtype)
+            new_column[:size] = column[:size]
+            self._columns[k] = column = new_column
+        column[size:size+len(rows)] = rows
+        self._sizes[k] = size + len(rows)
+
+    # Check if another store has the same hands and rank columns
+    ## other: HandStore
+    def equals(self, other):
+        return self._sizes.keys() == other._sizes.keys() and all(
+            np.array_equal(self._column(k), other._column(k)) for k in self._sizes
+        )
+
+    # Pickle only the used part of the columns, e.g. when returned from a worker process
+    def __getstate__(self):
+        return self.columns()
+    def __setstate__(self, state):
+        self.__init__(**state)
@@ -0,0 +1,42 @@
+import os
+from Store import HandStore
+from Parse import source_file, is_compressed
+
+# Reads hands appended to hand history files since the last poll, for files that are still being written.
+# The byte offset after the last complete hand of each file is kept, so each poll only parses new bytes.
+# Compressed files can't be read from an offset, so they are read whole, and again only if replaced.
+class Watcher:
+
+    ## Parser: parser class of the files, e.g. Parse.Bovada
+    ## only_me : bool, only count my ([ME]) hole cards
+    def __init__(self, Parser, only_me=False):
+        self.Parser = Parser
+        self.only_me = only_me
+        self.offsets = {} # Dict of filename to byte offset after the last complete hand read
+        self.compressed_stats = {} # Dict of filename of compressed files to (size, mtime) of the file when read
+
+    # Read complete hands appended to files since the last poll
+    # Files smaller than their offset were replaced, and are read again from the start
+    ## files: list of strs, filenames including path
+    ## Returns Store.HandStore of new hands, in order of files
+    def poll(self, files):
+        hands = HandStore()
+        for file in files:
+            offset = self.offsets.get(file, 0)
+            try:
+                stat = os.stat(source_file(file))
+            except OSError:
+                continue # Removed since files were listed
+            if is_compressed(file):
+                if self.compressed_stats.get(file) != (stat.st_size, stat.st_mtime_ns):
+                    hands.extend(HandStore(**self.Parser(file).hand_columns(only_me=self.only_me)))
+                    self.compressed_stats[file] = (stat.st_size, stat.st_mtime_ns)
+                continue
+            size = stat.st_size
+            if size < offset:
+                offset = 0
+            if size == offset:
+                continue
+            new_hands, self.offsets[file] = self.Parser(file).new_hands(offset, only_me=self.only_me)
+            hands.extend(HandStore(**new_hands))
+        return hands
@@ -1,282 +1,671 @@
 import os
 import re
+import time
 import argparse
+import contextlib
+import importlib.util
 import Parse
-from Results import Results
-from treys import Card, Evaluator
-from itertools import combinations
-
-CARDS = [
-    '2c','2d','2h','2s',
-    '3c','3d','3h','3s',
-    '4c','4d','4h','4s',
-    '5c','5d','5h','5s',
-    '6c','6d','6h','6s',
-    '7c','7d','7h','7s',
-    '8c','8d','8h','8s',
-    '9c','9d','9h','9s',
-    'Tc','Td','Th','Ts',
-    'Jc','Jd','Jh','Js',
-    'Qc','Qd','Qh','Qs',
-    'Kc','Kd','Kh','Ks',
-    'Ac','Ad','Ah','As',
-]
-
-# Helper function for counting hole cards
-## hole_cards: tuple, pair of hole cards
-## frequency_dict: dict, dict for counting cards
-def count_hole_cards_frequency(hole_cards, frequency_dict):
-    k = ' '.join(hole_cards)
-    # If key doesn't exist, then must be in opposite order
-    if k not in frequency_dict:
-        k = ' '.join(hole_cards[::-1]) # Reverse order of cards in key
-    frequency_dict[k] += 1
-# Get hand rank of hole and board cards
-## evaluator: trey.Evaluator
-## hole_cards: list of trey.Card, length=2
-## board: list of trey.Card, length=3,4,5
-def get_hand_rank(evaluator, hole_cards, board):
-    return evaluator.class_to_string(
-        evaluator.get_rank_class(
-            evaluator.evaluate(
-                [Card.new(x) for x in hole_cards],
-                [Card.new(x) for x in board]
-            )
-        )
-    )
-# Helper functions for counting hands
-## hole_cards: list of strs, 2 card hand
-## board: list of strs, 3-5 cards
-## evaluator: treys.Evaluator
-## hand_frequency: dict, count hand frequency
-def count_hand_frequency(player_hole_cards, board, evaluator, hand_frequency):
-    hand_frequency[get_hand_rank(evaluator, player_hole_cards, board).lower()] += 1
-def count_hand_frequencies(evaluator, hole_cards, board, hand_frequency, allcombinations=False, allcombinations_hand_frequency=None):
-    # Count hand frequencies
-    for player_hole_cards in hole_cards:
-        # Hand frequency of hole cards with board
-        count_hand_frequency(player_hole_cards, board, evaluator, hand_frequency)
-
-        # Hand frequency of all combinations of hole cards with board
-        if allcombinations:
-            for hand in combinations(list(player_hole_cards)+board, 5):
-                count_hand_frequency(hand[:2], hand[2:], evaluator, allcombinations_hand_frequency)
+from Profile import Profiler, NULL_PROFILER
+from Export import FORMATS, ARROW_FORMATS, format_of
+# Modules that import NumPy, treys, or scipy are imported by the functions of the stages that use
+# them, so --help and worker processes don't load modules before they are needed
 
-def main():
-    # Argparse
-    argparser = argparse.ArgumentParser(description="This script takes a user's poker hand history and calculates proportions of card draws and hands compared to the expected values, their confidence intervals, and chi-square p-values to determine if the site's RNG is behaving as expected.")
-    argparser.add_argument('path', type=str, help='Path to hand history directory')
-    argparser.add_argument('--site', choices=['Bovada'], default='Bovada', type=str,
-        help='Which site\'s hand history is being parsed. Default=Bovada')
-    argparser.add_argument('--summaryonly', action='store_true', help='Show summary only, no tables.')
-    argparser.add_argument('--stdev', choices=[1,2,3], default=2, type=int,
-        help='Stdev for confidence limit, so 1 for 68%%, 2 for 95%%, and 3 for 99.7%%. Default=2')
-    argparser.add_argument('--bins', default=10, type=int,
-        help='Number of bins for p-value uniformity test (Kolmogorov-Smirnov test on Chi-square p-values). Default=10')
-    argparser.add_argument('--showallbinnedtables', action='store_true', help='Show tables for all bins.')
-    argparser.add_argument('--onlyme', action='store_true', help='Only count my hands')
-    argparser.add_argument('--holecards', action='store_true', help='Show results for frequency of hole cards without suits')
-    argparser.add_argument('--holecardswithsuits', action='store_true', help='Show results for frequency of hole cards with suits (Long output)')
-    argparser.add_argument('--allcombinations', action='store_true', help='Show results for frequency of all combinations between hole and board cards.')
-    args = argparser.parse_args()
+# Seconds between polls of the hand history directory in --watch mode
+WATCH_INTERVAL = 1
 
-    # Determine correct parser
-    if args.site == 'Bovada':
-        Parser = Parse.Bovada
+# Get parsed hands and rank classes of one file, from the cache if it is up to date
+# Returns (hands, mismatch), mismatch is True if verify and the cache entry differs from the file
+## Parser: parser class, e.g. Parse.Bovada
+## file: str, filename including path
+## only_me : bool, only count my ([ME]) hole cards
+## allcombinations: bool, also evaluate all combinations of hole and board cards
+## cache: Cache or None, cache of parsed hands
+## rebuild: bool, ignore cached hands and parse the file again
+## verify: bool, parse the file again and compare with cached hands
+## profiler: Profile.Profiler, records stages and counters
+def read_hands(Parser, file, only_me, allcombinations, cache=None, rebuild=False, verify=False, profiler=NULL_PROFILER):
+    cached = load_cached(file, only_me, allcombinations, cache, rebuild, profiler)
+    if cached is not None and not verify:
+        return cached, False
+    return parse_hands(Parser, file, only_me, allcombinations, cache, cached, profiler)
 
-    hand_probabilites = Parse.HAND_PROBABILITIES
-    card_frequency = {x: 0 for x in CARDS}
-    hand_frequency = {x: 0 for x in hand_probabilites.keys()}
-    all_hole_cards = []
-    all_board_cards = []
-    if args.allcombinations:
-        hand_allcombinations_frequency = {x: 0 for x in hand_probabilites.keys()}
-    if args.holecardswithsuits:
-        hole_card_frequency = {' '.join(x): 0 for x in combinations(CARDS, 2)}
-    if args.holecards:
-        hole_card_nosuits_frequency = {' '.join(x): 0 for x in combinations([c[0] for c in CARDS], 2)} # Remove suit from cards
+# Get cached hands of one file, see read_hands
+# Returns Store.HandStore, or None if the file isn't cached or rebuild
+def load_cached(file, only_me, allcombinations, cache, rebuild, profiler):
+    profiler.count('files')
+    if cache is None or rebuild:
+        return None
+    with profiler.stage('cache'):
+        cached = cache.load(file, only_me=only_me, allcombinations=allcombinations)
+    if cached is not None:
+        profiler.count('cache hits')
+        profiler.count('hands', len(cached))
+        profiler.count('players', cached.players.sum())
+    return cached
 
-    # Treys evaluator
-    evaluator = Evaluator()
+# Parse and evaluate hands of one file, and save them to the cache, see read_hands
+# Returns (hands, mismatch), mismatch is True if cached hands differ from the file
+## cached: Store.HandStore or None, cached hands of the file, for verifying the cache
+## data: bytes or None, contents of the file, read from the file if None
+## stat: os.stat_result or None, stat of the file before data was read
+def parse_hands(Parser, file, only_me, allcombinations, cache, cached, profiler, data=None, stat=None):
+    from Store import HandStore
+    from Evaluate import hand_rank_classes
+    with profiler.stage('parsing'):
+        if data is None:
+            stat = os.stat(Parse.source_file(file))
+            hands = HandStore(**Parser(file).hand_columns(only_me=only_me))
+        else:
+            hands = HandStore(**Parser.scan_columns(data, only_me=only_me)[0])
+    profiler.count('hands', len(hands))
+    profiler.count('players', hands.players.sum())
+    with profiler.stage('evaluation'):
+        # Evaluate all combinations if cached, so verified entries can be compared
+        allcombinations = allcombinations or cached is not None and cached.allcombinations_ranks is not None
+        hands.set_ranks(*hand_rank_classes(hands, allcombinations=allcombinations))
+    profiler.count('evaluations', len(hands.hand_ranks) + (len(hands.allcombinations_ranks) if allcombinations else 0))
+    mismatch = cached is not None and not hands.equals(cached)
+    if cache is not None and (cached is None or mismatch):
+        with profiler.stage('cache'):
+            cache.save(file, hands, only_me=only_me, stat=stat)
+    return hands, mismatch
 
-    for file in os.listdir(args.path):
-        # Only open .txt files
-        if not file.lower().endswith('.txt'):
-            continue
+# Get parsed hands and rank classes of one file, used by worker processes, see read_hands
+## job: tuple, (parser class, filename including path, only_me, allcombinations, dict of read_hands cache options, Profiler options)
+## Returns (hands, mismatch, Profile.Profiler)
+def read_file(job):
+    Parser, file, only_me, allcombinations, cache_options, profile = job
+    profiler = Profiler(*profile)
+    hands, mismatch = read_hands(Parser, file, only_me, allcombinations, profiler=profiler, **cache_options)
+    return hands, mismatch, profiler
 
-        # Open file with parser
-        b = Parser('{}\{}'.format(args.path, file))
+# Get cached hands of one file, or read the file for parse_file, used by reader threads of --readers
+## job: tuple, see read_file
+## Returns (True, (hands, mismatch, Profile.Profiler)) if cached, else (False, job of parse_file)
+def read_source(job):
+    Parser, file, only_me, allcombinations, cache_options, profile = job
+    profiler = Profiler(*profile)
+    cached = load_cached(file, only_me, allcombinations, cache_options['cache'], cache_options['rebuild'], profiler)
+    if cached is not None and not cache_options['verify']:
+        return True, (cached, False, profiler)
+    with profiler.stage('reading'):
+        stat = os.stat(Parse.source_file(file))
+        with Parse.open_hand_history(file, 'rb') as f:
+            data = f.read()
+    return False, (Parser, file, only_me, allcombinations, cache_options['cache'], cached, data, stat, profiler)
 
+# Parse and evaluate bytes of one file, used by worker processes of --readers, see read_source
+## job: tuple, (parser class, filename including path, only_me, allcombinations, cache, cached hands, bytes, stat, profiler)
+## Returns (hands, mismatch, Profile.Profiler)
+def parse_file(job):
+    Parser, file, only_me, allcombinations, cache, cached, data, stat, profiler = job
+    file_profiler = Profiler(*profiler.options)
+    hands, mismatch = parse_hands(Parser, file, only_me, allcombinations, cache, cached, file_profiler, data=data, stat=stat)
+    profiler.merge(file_profiler)
+    return hands, mismatch, profiler
+
+# Remove hands that were already counted, e.g. from overlapping hand history files
+## index: Dedup.HandIndex or None, hand numbers already counted, None to keep all hands
+## hands: Store.HandStore
+## file: str or None, file of the hands, see Dedup.HandIndex.add
+## profiler: Profile.Profiler
+def skip_duplicates(index, hands, file, profiler):
+    if index is None:
+        return hands
+    with profiler.stage('deduplication'):
+        keep = index.add(hands.hand_ids, file)
+        if keep.all():
+            return hands
+        profiler.count('duplicates', len(keep) - keep.sum())
+        return hands.select(keep)
+
+# Count hands as they are written to a hand history directory, printing results every
+# args.watchhands new hands or args.watchseconds seconds, until interrupted
+# Each poll only parses hands appended since the last poll, and bins are counted from
+# cumulative counts, so the cost of each poll and refresh is proportional to the new hands
+## Parser: parser class, e.g. Parse.Bovada
+## audit: Audit, counts of all hands
+## args: argparse.Namespace, options of main
+## expected: ExpectedDistributions
+## index: Dedup.HandIndex or None, see skip_duplicates
+## profiler: Profile.Profiler
+def watch(Parser, audit, args, expected, index, profiler):
+    from Watch import Watcher
+    from Evaluate import hand_rank_classes
+    watcher = Watcher(Parser, only_me=args.onlyme)
+    total_hands = 0
+    new_hands = 0
+    refreshed = None # Time of the last refresh, None before the first
+    try:
         while True:
-            # Get hole cards
-            hole_cards = b.get_hole_cards(only_me=args.onlyme)
-            if not hole_cards:
-                break # EOF
-
-            # Count card frequency of hole cards
-            for c_1, c_2 in hole_cards:
-                # Individual card frequency
-                card_frequency[c_1] += 1
-                card_frequency[c_2] += 1
-                # Frequency of hole cards together
-                if args.holecardswithsuits:
-                    count_hole_cards_frequency((c_1,c_2), hole_card_frequency)
-                if args.holecards:
-                    count_hole_cards_frequency([x[0] for x in (c_1,c_2)], hole_card_nosuits_frequency)
-
-            # Get board cards
-            board = b.get_board_cards()
-            if not board:
-                continue
-
-            # Count frequency of individual board cards
-            for c in board:
-                card_frequency[c] += 1
-
-            # Count hand frequencies
-            count_hand_frequencies(
-                evaluator,
-                hole_cards,
-                board,
-                hand_frequency,
-                allcombinations=args.allcombinations,
-                allcombinations_hand_frequency=None if not args.allcombinations else hand_allcombinations_frequency
-            )
+            with profiler.stage('discovery'):
+                files = list(Parse.find_hand_histories(args.path))
+            with profiler.stage('parsing'):
+                hands = watcher.poll(files)
+            profiler.count('hands', len(hands))
+            profiler.count('players', hands.players.sum())
+            with profiler.stage('evaluation'):
+                hands.set_ranks(*hand_rank_classes(hands, allcombinations=args.allcombinations))
+            hands = skip_duplicates(index, hands, None, profiler)
+            with profiler.stage('counting'):
+                audit.add_hands(hands)
+            total_hands += len(hands)
+            new_hands += len(hands)
 
-            # Track all hole_card with board results
-            all_hole_cards.append(hole_cards)
-            all_board_cards.append(board)
+            now = time.monotonic()
+            # Results need hands with a board
+            refresh = refreshed is None or new_hands >= args.watchhands or now - refreshed >= args.watchseconds
+            if new_hands and len(audit) and refresh:
+                print('{} Watching {}, {} new hands, {} hands in total, {} duplicate hands skipped'.format(
+                    time.strftime('%Y-%m-%d %H:%M:%S'), args.path, new_hands, total_hands, index.duplicates if index else 0
+                ))
+                print_results(audit, args, expected, profiler)
+                new_hands = 0
+                refreshed = now
+            time.sleep(WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        pass
 
-    assert len(all_hole_cards)==len(all_board_cards) # Sanity check on lengths
+# Parse, or load from the cache, and count all hand history files
+## Parser: parser class, e.g. Parse.Bovada
+## audit: Audit, counts of all hands
+## args: argparse.Namespace, options of main
+## rank_table: str or None, path to rank table, see Evaluate.use_rank_table
+## index: Dedup.HandIndex or None, see skip_duplicates
+## profiler: Profile.Profiler
+## stop: function or None, called after each file is counted, files are no longer read once it returns True
+## Returns int, number of hands counted
+def count_files(Parser, audit, args, rank_table, index, profiler, stop=None):
+    from Cache import Cache
+    from Evaluate import use_rank_table
+    cache_options = {
+        'cache': Cache(args.cache) if args.cache else None,
+        'rebuild': args.rebuildcache,
+        'verify': args.verifycache,
+    }
 
-    results = Results(summary_only=args.summaryonly)
-    summary = [] # List of strs of result summaries
-    test_results = [] # List of bool of pass/fail test results
+    with profiler.stage('discovery'):
+        files = list(Parse.find_hand_histories(args.path))
+    if index is not None:
+        index.start(files)
 
-    # P-value uniformity test of chisquare pvalues based with args.bins bins
-    all_length = len(all_hole_cards)
-    interval = len(all_hole_cards) // args.bins
-    binned_frequencies = [
-        {x: 0 for x in hand_probabilites.keys()} for _ in range(args.bins)
-    ]
-    if args.allcombinations:
-        binned_all_frequencies = [
-            {x: 0 for x in hand_probabilites.keys()} for _ in range(args.bins)
-        ]
-    chisquare_pvalues = []
-    if args.allcombinations:
-        chisquare_allcombinations_pvalues = []
-    for x, i in enumerate(range(0, all_length, interval)):
-        end_i = i + interval
-        last = all_length - end_i < interval
-        if last:
-            end_i = all_length
-        # Count binned hand frequencies
-        for bin_hole_cards, bin_board_cards in zip(all_hole_cards[i:end_i], all_board_cards[i:end_i]):
-            count_hand_frequencies(
-                evaluator,
-                bin_hole_cards,
-                bin_board_cards,
-                binned_frequencies[x],
-                allcombinations=args.allcombinations,
-                allcombinations_hand_frequency=None if not args.allcombinations else binned_all_frequencies[x]
+    mismatches = 0 # Number of files with a cache entry different from the file
+    hands_counted = 0
+    jobs = [(Parser, file, args.onlyme, args.allcombinations, cache_options, profiler.options) for file in files]
+    with contextlib.ExitStack() as stack:
+        if args.readers > 0:
+            # Read files in threads and parse them in worker processes, at most args.prefetch files ahead of counting
+            from Pipeline import pipelined
+            file_results = pipelined(
+                jobs, read_source, parse_file, readers=args.readers, workers=args.jobs, prefetch=args.prefetch,
+                initializer=use_rank_table, initargs=(rank_table,),
             )
-        results.calculate_and_print_results(
-            'BIN #{} Distribution of Hands'.format(x),
-            'Hand',
-            hand_probabilites,
-            binned_frequencies[x],
-            pvalues=chisquare_pvalues,
-            std_dev=args.stdev,
-            no_output=not args.showallbinnedtables,
+        elif args.jobs > 1:
+            # Read files in worker processes
+            from multiprocessing import Pool
+            pool = stack.enter_context(Pool(args.jobs, initializer=use_rank_table, initargs=(rank_table,)))
+            file_results = pool.imap(read_file, jobs)
+        else:
+            file_results = map(read_file, jobs)
+
+        # Count in file order, so duplicates and bins are the same however files are read
+        for file, (hands, mismatch, file_profiler) in zip(files, file_results):
+            profiler.merge(file_profiler)
+            hands = skip_duplicates(index, hands, file, profiler)
+            with profiler.stage('counting'):
+                audit.add_hands(hands)
+            mismatches += mismatch
+            hands_counted += len(hands)
+            if stop is not None and stop():
+                break
+    if args.verifycache and cache_options['cache'] is not None:
+        print('Verified cache of {} files, {} mismatched and rebuilt'.format(len(files), mismatches))
+    return hands_counted
+
+# Add new or changed hand history files of args.path to the database of args.database, if args.path,
+# and count the hands of the database selected by args.onlyme, args.since, args.until, args.positions,
+# and args.boardlengths
+## Parser: parser class, e.g. Parse.Bovada
+## audit: Audit, counts of all hands
+## args: argparse.Namespace, options of main
+## profiler: Profile.Profiler
+## stop: function or None, called after each batch of hands is counted, hands are no longer selected once it returns True
+## Returns int, number of hands counted
+def count_database(Parser, audit, args, profiler, stop=None):
+    from Database import HandDatabase
+    database = HandDatabase(args.database)
+    try:
+        if args.path is not None:
+            with profiler.stage('discovery'):
+                files = list(Parse.find_hand_histories(args.path))
+            for file in files:
+                profiler.count('files')
+                database.ingest(Parser, file, profiler)
+            if database.duplicates:
+                print('Skipped {} duplicate hands'.format(database.duplicates))
+
+        selected = database.select(
+            only_me=args.onlyme,
+            since=args.since,
+            until=args.until,
+            positions=args.positions,
+            board_lengths=args.boardlengths,
+            allcombinations=args.allcombinations,
         )
-        if args.allcombinations:
-            results.calculate_and_print_results(
-                'BIN #{} Distribution of All Hand Combinations'.format(x),
-                'Hand',
-                hand_probabilites,
-                binned_all_frequencies[x],
-                pvalues=chisquare_allcombinations_pvalues,
-                std_dev=args.stdev,
-                no_output=not args.showallbinnedtables,
-            )
-        if last:
-            break
+        hands_counted = 0
+        while True:
+            with profiler.stage('database'):
+                hands = next(selected, None)
+            if hands is None:
+                break
+            profiler.count('hands', len(hands))
+            profiler.count('players', hands.players.sum())
+            with profiler.stage('counting'):
+                audit.add_hands(hands)
+            hands_counted += len(hands)
+            if stop is not None and stop():
+                break
+        selected.close()
+    finally:
+        database.close()
+    return hands_counted
+
+# Merge partial result files, see Audit.save
+# Hands of each file are ordered after hands of the files before it, so bins follow the order of files
+## files: list of strs, paths of partial result files
+## profiler: Profile.Profiler
+## Returns Audit
+def reduce_files(files, profiler):
+    from Audit import Audit
+    audit = None
+    for file in files:
+        with profiler.stage('cache'):
+            file_audit = Audit.load(file)
+        profiler.count('files')
+        with profiler.stage('counting'):
+            if audit is None:
+                audit = file_audit
+            else:
+                audit.merge(file_audit)
+    return audit
 
-    # Print all results
-    results.calculate_and_print_results(
+# Calculate statistics of all hands of each table
+## audit: Audit, counts of all hands
+## args: argparse.Namespace, options of main
+## expected: ExpectedDistributions
+## board_lengths: np.ndarray of ints, shape=(6,), number of players' hands with each board length
+## Returns list of (statistic, title, label, labels, ProportionStatistics, is_normal, title of binned chi-square p-values
+##         or None), statistic of Expected.STATISTICS
+def table_statistics(audit, args, expected, board_lengths):
+    from Statistics import ProportionStatistics
+    hand_labels = audit.hand_labels
+    hand_expected = dict(zip(hand_labels, expected.mixture('hand', board_lengths, only_me=args.onlyme)[0]))
+    tables = [(
+        'hand',
         'Distribution of All Hands',
         'Hand',
-        hand_probabilites,
-        hand_frequency,
-        summary,
-        test_results,
-        std_dev=args.stdev,
-    )
-    results.print_kstest_table(
-        chisquare_pvalues,
+        *ProportionStatistics.from_dicts(hand_expected, audit.hand_frequency, args.stdev),
+        True,
         'Chi-square p-values of binned Distribution of Hands',
-        summary,
-        test_results,
-        column_size=40
-    )
+    )]
     if args.allcombinations:
-        results.calculate_and_print_results(
+        allcombinations_expected = dict(zip(
+            hand_labels, expected.mixture('allcombinations', board_lengths, only_me=args.onlyme)[0]
+        ))
+        tables.append((
+            'allcombinations',
             'Distribution of Hands, All Combinations',
             'Hand',
-            hand_probabilites,
-            hand_allcombinations_frequency,
-            summary,
-            test_results,
-            std_dev=args.stdev,
-        )
-        results.print_kstest_table(
-            chisquare_allcombinations_pvalues,
+            *ProportionStatistics.from_dicts(allcombinations_expected, audit.hand_allcombinations_frequency, args.stdev),
+            True,
             'Chi-square p-values of binned Distribution of Hands, All Combinations',
-            summary,
-            test_results,
-            column_size=40
-        )
-    results.calculate_and_print_results(
+        ))
+    tables.append((
+        'card',
         'Distribution of Cards',
         'Card',
-        {x: 1/len(CARDS) for x in CARDS},
-        card_frequency,
-        summary,
-        test_results,
-        std_dev=args.stdev,
-        is_normal=False
-    )
+        *ProportionStatistics.from_dicts(expected.get('card', only_me=args.onlyme), audit.card_frequency, args.stdev),
+        False,
+        None,
+    ))
     if args.holecardswithsuits:
-        hole_card_combinations = [' '.join(x) for x in combinations(CARDS, 2)]
-        hole_card_expected_frequency = {x: hole_card_combinations.count(x) / len(hole_card_combinations) for x in hole_card_combinations}
-
-        results.calculate_and_print_results(
+        tables.append((
+            'hole_cards',
             'Distribution of Hole Cards with suits',
             'Hole Cards',
-            hole_card_expected_frequency,
-            hole_card_frequency,
-            summary,
-            test_results,
-            std_dev=args.stdev,
-            is_normal=False,
-        )
+            *ProportionStatistics.from_dicts(
+                expected.get('hole_cards', only_me=args.onlyme), audit.hole_card_frequency, args.stdev
+            ),
+            False,
+            None,
+        ))
     if args.holecards:
-        hole_card_nosuit_combinations = [' '.join((x[0], y[0])) for x, y in combinations(CARDS, 2)]
-        hole_card_nosuits_expected_frequency = {x: hole_card_nosuit_combinations.count(x) / len(hole_card_nosuit_combinations) for x in hole_card_nosuit_combinations}
-
-        results.calculate_and_print_results(
+        tables.append((
+            'hole_cards_nosuits',
             'Distribution of Hole Cards without suits',
             'Hole Cards',
-            hole_card_nosuits_expected_frequency,
-            hole_card_nosuits_frequency,
-            summary,
-            test_results,
-            std_dev=args.stdev,
-            is_normal=False,
-        )
+            *ProportionStatistics.from_dicts(
+                expected.get('hole_cards_nosuits', only_me=args.onlyme), audit.hole_card_nosuits_frequency, args.stdev
+            ),
+            False,
+            None,
+        ))
+    return tables
+
+# Statistics of the binned tables and all tables of an audit
+## Hands are evaluated with 3-5 board cards, so expected distributions are mixed by board length of each bin
+## audit: Audit, counts of all hands
+## args: argparse.Namespace, options of main
+## expected: ExpectedDistributions
+## profiler: Profile.Profiler
+## Returns (list of ProportionStatistics, tables), statistics of the bins of hands, and of all combinations if
+##         args.allcombinations, and tables of table_statistics
+def audit_statistics(audit, args, expected, profiler=NULL_PROFILER):
+    from Statistics import ProportionStatistics
+    with profiler.stage('binning'):
+        binned_board_lengths = audit.binned_board_lengths(args.bins)
+        binned_frequencies = [('hand', audit.binned_frequencies(args.bins))]
+        if args.allcombinations:
+            binned_frequencies.append(('allcombinations', audit.binned_frequencies(args.bins, allcombinations=True)))
+    with profiler.stage('statistics'):
+        binned_statistics = [
+            ProportionStatistics(
+                expected.mixture(statistic, binned_board_lengths, only_me=args.onlyme), frequencies, args.stdev
+            )
+            for statistic, frequencies in binned_frequencies
+        ]
+        tables = table_statistics(audit, args, expected, binned_board_lengths.sum(axis=0))
+    return binned_statistics, tables
+
+# Calculate and print results of all counted hands
+## audit: Audit, counts of all hands
+## args: argparse.Namespace, options of main
+## expected: ExpectedDistributions
+## profiler: Profile.Profiler
+## sequential: (Sequential.SequentialTests, int) or None, tests of --sequential and number of hands read
+def print_results(audit, args, expected, profiler, sequential=None):
+    from Results import Results
+    from Export import ResultRecords, write_records
+    ## Records are only kept for formats other than the text of the tables
+    records = ResultRecords() if args.export and args.exportformat != 'text' else None
+    results = Results(summary_only=args.summaryonly, records=records)
+    summary = [] # List of strs of result summaries
+    test_results = [] # List of bool of pass/fail test results
+
+    # P-value uniformity test of chisquare pvalues based with args.bins bins
+    # Statistics of all tables are calculated before printing any
+    ## Statistics of all bins are calculated at once, and tables are only printed if args.showallbinnedtables
+    ## tables: list of tables of table_statistics
+    hand_labels = audit.hand_labels
+    binned_statistics, tables = audit_statistics(audit, args, expected, profiler)
+    if args.dealorder:
+        from DealOrder import DealOrderTests
+        with profiler.stage('statistics'):
+            deal_order = DealOrderTests(audit.dealt_hands)
+
+    # Empirical p-values of replicates of the audit, see Simulate.NullDistribution
+    binned_empirical = [(None, None)] * len(binned_statistics) # (np.ndarray of chi-square p-values of bins, KS p-value) of each binned table
+    table_empirical = [None] * len(tables) # Chi-square p-value of each table
+    if args.simulate:
+        from multiprocessing import Pool
+        from Simulate import NullDistribution
+        with profiler.stage('simulation'), contextlib.ExitStack() as stack:
+            pool = stack.enter_context(Pool(args.jobs)) if args.jobs > 1 else None
+            null = NullDistribution(args.simulate, args.seed, map=pool.map if pool else map)
+            empirical = null.pvalues(
+                audit,
+                args.bins,
+                list(zip(('hand', 'allcombinations'), binned_statistics))
+                    + [(statistic, statistics) for statistic, _, _, _, statistics, _, _ in tables],
+                expected,
+            )
+        binned_empirical = empirical[:len(binned_statistics)]
+        table_empirical = [float(pvalues[0]) for pvalues, _ in empirical[len(binned_statistics):]]
+
+    with profiler.stage('rendering'):
+        chisquare_pvalues = []
+        chisquare_allcombinations_pvalues = []
+        for x in range(len(binned_statistics[0])):
+            results.print_proportion_statistics(
+                'BIN #{} Distribution of Hands'.format(x),
+                'Hand',
+                hand_labels,
+                binned_statistics[0],
+                x,
+                pvalues=chisquare_pvalues,
+                no_output=not args.showallbinnedtables,
+                empirical_pvalue=None if binned_empirical[0][0] is None else float(binned_empirical[0][0][x]),
+            )
+            if args.allcombinations:
+                results.print_proportion_statistics(
+                    'BIN #{} Distribution of All Hand Combinations'.format(x),
+                    'Hand',
+                    hand_labels,
+                    binned_statistics[1],
+                    x,
+                    pvalues=chisquare_allcombinations_pvalues,
+                    no_output=not args.showallbinnedtables,
+                    empirical_pvalue=None if binned_empirical[1][0] is None else float(binned_empirical[1][0][x]),
+                )
+
+        # Print all results
+        binned_pvalues = iter(zip((chisquare_pvalues, chisquare_allcombinations_pvalues), binned_empirical))
+        for (_, title, label, labels, statistics, is_normal, kstest_title), empirical_pvalue in zip(tables, table_empirical):
+            results.print_proportion_statistics(
+                title, label, labels, statistics, summary=summary, test_results=test_results, is_normal=is_normal,
+                empirical_pvalue=empirical_pvalue,
+            )
+            if kstest_title is not None:
+                pvalues, (_, ks_empirical_pvalue) = next(binned_pvalues)
+                results.print_kstest_table(
+                    pvalues, kstest_title, summary, test_results, column_size=40, empirical_pvalue=ks_empirical_pvalue,
+                )
+
+        if args.dealorder:
+            results.print_deal_order_tests(deal_order, summary, test_results)
+        if sequential is not None:
+            results.print_sequential_tests(*sequential, summary=summary, test_results=test_results)
+        results.print_summary(summary, test_results)
+        text = results.flush()
+
+        # Export results, replacing results of earlier calls of --watch
+        if args.export:
+            if records is None:
+                with open(args.export, 'w') as f:
+                    f.write(text)
+            else:
+                write_records(records, args.export, args.exportformat)
+
+def main():
+    # Argparse
+    argparser = argparse.ArgumentParser(description="This script takes a user's poker hand history and calculates proportions of card draws and hands compared to the expected values, their confidence intervals, and chi-square p-values to determine if the site's RNG is behaving as expected.")
+    argparser.add_argument('path', type=str, nargs='?',
+        help='Path to hand history directory, including subdirectories, .txt.gz files, and .zip archives')
+    argparser.add_argument('--site', choices=['Bovada'], default='Bovada', type=str,
+        help='Which site\'s hand history is being parsed. Default=Bovada')
+    argparser.add_argument('--summaryonly', action='store_true', help='Show summary only, no tables.')
+    argparser.add_argument('--stdev', choices=[1,2,3], default=2, type=int,
+        help='Stdev for confidence limit, so 1 for 68%%, 2 for 95%%, and 3 for 99.7%%. Default=2')
+    argparser.add_argument('--bins', default=10, type=int,
+        help='Number of bins for p-value uniformity test (Kolmogorov-Smirnov test on Chi-square p-values). Default=10')
+    argparser.add_argument('--showallbinnedtables', action='store_true', help='Show tables for all bins.')
+    argparser.add_argument('--onlyme', action='store_true', help='Only count my hands')
+    argparser.add_argument('--holecards', action='store_true', help='Show results for frequency of hole cards without suits')
+    argparser.add_argument('--holecardswithsuits', action='store_true', help='Show results for frequency of hole cards with suits (Long output)')
+    argparser.add_argument('--allcombinations', action='store_true', help='Show results for frequency of all combinations between hole and board cards.')
+    argparser.add_argument('--dealorder', action='store_true',
+                           help='Show results of tests of the order of dealt cards: serial correlation, runs of suits and ranks, transitions, and gaps')
+    argparser.add_argument('--jobs', default=1, type=int,
+        help='Number of processes for parsing and counting hand history files. Default=1')
+    argparser.add_argument('--readers', default=0, type=int,
+        help='Number of threads reading files ahead of parsing in --jobs processes, e.g. for network drives. Default=0 (off)')
+    argparser.add_argument('--prefetch', default=8, type=int,
+        help='Maximum number of files read or parsed ahead of counting with --readers, which caps memory. Default=8')
+    argparser.add_argument('--cache', type=str,
+        help='Path to cache directory of parsed hands, only new or changed files are parsed')
+    argparser.add_argument('--rebuildcache', action='store_true', help='Parse all files again and replace the cache')
+    argparser.add_argument('--verifycache', action='store_true', help='Parse all files again and compare with the cache')
+    argparser.add_argument('--keepduplicates', action='store_true',
+        help='Count every copy of hands with the same hand number, e.g. in overlapping hand history files')
+    argparser.add_argument('--bloomfilter', default=0, type=int,
+        help='Size in MB of a Bloom filter in front of the index of hand numbers, for faster lookups of 100M+ hands. Default=0 (none)')
+    argparser.add_argument('--watch', action='store_true',
+        help='Keep counting hands as they are written to the directory, until interrupted. --jobs and the cache are not used')
+    argparser.add_argument('--watchhands', default=1000, type=int,
+        help='Print results of --watch after this many new hands. Default=1000')
+    argparser.add_argument('--watchseconds', default=60, type=float,
+        help='Print results of --watch after this many seconds, if there are new hands. Default=60')
+    argparser.add_argument('--simulate', default=0, type=int, metavar='REPLICATES',
+        help='Number of replicates of the audit drawn under the null hypothesis, for empirical p-values of chi-square and KS tests, drawn in --jobs processes. Default=0 (off)')
+    argparser.add_argument('--seed', type=int, help='Seed of --simulate replicates. Default=random')
+    argparser.add_argument('--sequential', action='store_true',
+                           help='Stop reading hands once sequential chi-square tests of all tables pass or fail, checked after each file')
+    argparser.add_argument('--alpha', default=0.05, type=float, help='Error rate of --sequential failing a fair RNG. Default=0.05')
+    argparser.add_argument('--beta', default=0.05, type=float,
+                           help='Error rate of --sequential passing an RNG off by --effectsize. Default=0.05')
+    argparser.add_argument('--effectsize', default=0.1, type=float,
+                           help='Effect size (Cohen\'s w) of an RNG that --sequential should fail. Default=0.1')
+    argparser.add_argument('--statistics', choices=['scipy', 'numpy'], default='scipy', type=str,
+                           help='Compute chi-square and KS p-values with scipy, or with NumPy only, which starts faster. Default=scipy')
+    argparser.add_argument('--database', type=str, metavar='FILE',
+        help='Path to SQLite database of hands, new or changed files of path are added to it, and hands selected from it are audited')
+    argparser.add_argument('--since', type=str,
+        help='Only audit hands of --database at or after a date or time, e.g. 2021-01 or "2021-01-15 18:00"')
+    argparser.add_argument('--until', type=str,
+        help='Only audit hands of --database before a date or time, e.g. 2021-02')
+    argparser.add_argument('--positions', type=str, nargs='+', metavar='POSITION',
+        help='Only audit players of --database in these positions, e.g. Dealer "Big Blind" UTG+1')
+    argparser.add_argument('--boardlengths', type=int, nargs='+', choices=[0, 3, 4, 5], metavar='CARDS',
+        help='Only audit hands of --database with these numbers of board cards, e.g. 5 for hands that reached the river')
+    argparser.add_argument('--map', type=str, metavar='FILE',
+        help='Write counts and hands to a partial result file for --reduce, instead of showing results')
+    argparser.add_argument('--reduce', type=str, nargs='+', metavar='FILE',
+        help='Merge partial result files of --map in order and show results, instead of reading a directory')
+    argparser.add_argument('--profile', action='store_true',
+        help='Show wall time and CPU time of each stage, and throughput counters')
+    argparser.add_argument('--profilememory', action='store_true',
+        help='Like --profile, also with peak memory of each stage, which slows Python heavy stages such as parsing')
+    argparser.add_argument('--profilejson', type=str, help='Write profile of --profile as JSON to a file')
+    argparser.add_argument('--ranktable', action='store_true',
+        help='Evaluate hands with a table of all 5 card hands, saved to the cache directory (2.5 MB)')
+    argparser.add_argument('--export', type=str, metavar='FILE',
+        help='Also write results to a file, as the text of the tables, or as records of every table, see --exportformat')
+    argparser.add_argument('--exportformat', choices=FORMATS, type=str,
+        help='Format of --export: text, CSV, JSON Lines, Parquet, or Arrow IPC (Parquet and Arrow need pyarrow). '
+             'Default=format of the extension of FILE, e.g. .csv')
+    args = argparser.parse_args()
+    if args.path is None and args.reduce is None and args.database is None:
+        argparser.error('either path, --reduce, or --database is required')
+    if args.reduce and (args.path is not None or args.database):
+        argparser.error('--reduce merges partial result files, not a path or --database')
+    if args.reduce and args.watch:
+        argparser.error('--watch reads a directory, not --reduce files')
+    if args.database and (args.watch or args.keepduplicates):
+        argparser.error('--database can\'t be used with --watch or --keepduplicates')
+    if not args.database and (args.since or args.until or args.positions or args.boardlengths):
+        argparser.error('--since, --until, --positions, and --boardlengths select hands of --database')
+    if args.sequential and (args.watch or args.reduce or args.map):
+        argparser.error('--sequential reads hands, not --watch, --reduce, or --map')
+    if args.dealorder and (args.map or args.reduce or args.boardlengths):
+        argparser.error('--dealorder needs every dealt hand, which partial result files of --map and --reduce, '
+                        'and --boardlengths, don\'t keep')
+    if args.simulate and args.reduce:
+        argparser.error('--simulate needs the players and board length of every dealt hand, which partial result files of --reduce don\'t keep')
+    if args.export:
+        args.exportformat = args.exportformat or format_of(args.export)
+        if args.exportformat is None:
+            argparser.error('--exportformat is required for --export {}'.format(args.export))
+        if args.map:
+            argparser.error('--export writes results, not partial result files of --map')
+        if args.exportformat in ARROW_FORMATS and importlib.util.find_spec('pyarrow') is None:
+            argparser.error('--exportformat {} requires pyarrow: python -m pip install pyarrow'.format(args.exportformat))
+    elif args.exportformat:
+        argparser.error('--exportformat is the format of --export')
+    args.profile = args.profile or args.profilememory
+    profiler = Profiler(args.profile or bool(args.profilejson), memory=args.profilememory)
+
+    from Audit import Audit
+    from Evaluate import use_rank_table
+    from Expected import ExpectedDistributions
+    from Dedup import HandIndex
+    from Results import Results
+    from Statistics import use_backend
+    use_backend(args.statistics)
+
+    # Determine correct parser
+    if args.site == 'Bovada':
+        Parser = Parse.Bovada
+
+    # Exact expected distributions, cached with parsed hands if args.cache
+    expected = ExpectedDistributions(args.cache)
+    # Table of rank classes of all 5 card hands, built on first use
+    rank_table = os.path.join(expected.directory, 'rank_table.npy') if args.ranktable else None
+    use_rank_table(rank_table)
+    options = {
+        'allcombinations': args.allcombinations,
+        'holecards': args.holecards,
+        'holecardswithsuits': args.holecardswithsuits,
+        'only_me': args.onlyme,
+        'keep_dealt_hands': args.dealorder or bool(args.simulate),
+    }
+    audit = Audit(**options)
+    # Index of counted hand numbers, saved with the cache
+    index = None
+    index_path = None
+    if args.cache and not (args.watch or args.reduce or args.database):
+        index_path = os.path.join(args.cache, 'hand-index.npz')
+    if not args.keepduplicates and not args.database: # Hand numbers are unique in databases
+        bloom_bits = args.bloomfilter * 8 * 2**20
+        index = HandIndex.load(index_path, bloom_bits) if index_path else HandIndex(bloom_bits)
+
+    # Sequential tests of all hands so far, checked after counting each file or batch of database hands
+    sequential = None
+    stop = None
+    if args.sequential:
+        from Sequential import SequentialTests
+        sequential = SequentialTests(args.alpha, args.beta, args.effectsize)
+        def sequential_stop():
+            if len(audit) == 0:
+                return False
+            with profiler.stage('statistics'):
+                board_lengths = audit.binned_board_lengths(1)[0]
+                tables = table_statistics(audit, args, expected, board_lengths)
+                return sequential.update([(title, statistics) for _, title, _, _, statistics, _, _ in tables])
+        stop = sequential_stop
+
+    if args.watch:
+        watch(Parser, audit, args, expected, index, profiler)
+    else:
+        if args.reduce:
+            # Merge partial result files, results are shown with the options of the files
+            try:
+                audit = reduce_files(args.reduce, profiler)
+            except (OSError, ValueError) as e: # Not a partial result file, or files with different options
+                argparser.error(str(e))
+            args.allcombinations = audit.allcombinations
+            args.holecards = audit.holecards
+            args.holecardswithsuits = audit.holecardswithsuits
+            args.onlyme = audit.only_me
+        elif args.database:
+            hands = count_database(Parser, audit, args, profiler, stop)
+        else:
+            hands = count_files(Parser, audit, args, rank_table, index, profiler, stop)
+            if index is not None and index.duplicates:
+                print('Skipped {} duplicate hands'.format(index.duplicates))
+        if args.map:
+            audit.save(args.map)
+        else:
+            print_results(
+                audit, args, expected, profiler,
+                sequential=(sequential, hands) if sequential else None,
+            )
+    if index_path and index is not None:
+        index.save(index_path)
 
-    results.print_summary(summary, test_results)
+    if args.profile:
+        profiler.print_report(Results())
+    if args.profilejson:
+        profiler.write_json(args.profilejson)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,38 @@
+import os
+import sys
+import pytest
+
+# Modules are at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Exact expected distributions are cached in a directory of the test session, not of the user
+@pytest.fixture(scope='session')
+def expected_directory(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('expected'))
+
+# Run main.py with arguments, and get what it printed
+@pytest.fixture
+def audit(expected_directory, monkeypatch, capsys):
+    import main
+    from Expected import ExpectedDistributions
+    monkeypatch.setattr(ExpectedDistributions, 'DEFAULT_DIRECTORY', expected_directory)
+    def audit(*args):
+        capsys.readouterr()
+        monkeypatch.setattr(sys, 'argv', ['main.py'] + [str(arg) for arg in args])
+        main.main()
+        return capsys.readouterr().out
+    return audit
+
+# Write generated hand history files
+@pytest.fixture
+def hand_history():
+    from Generate import write_hand_history
+    ## path: pathlib.Path, filename including path, its directories are created
+    ## hands: int, number of hands
+    ## seed: int, seed of the shuffler, hand numbers of each seed are distinct
+    ## Returns pathlib.Path
+    def hand_history(path, hands, seed=0):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_hand_history(str(path), hands, seed=seed, first_hand_id=1000000000 + seed * hands)
+        return path
+    return hand_history
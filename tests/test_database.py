@@ -0,0 +1,25 @@
+import os
+import pytest
+
+OPTIONS = ['--allcombinations', '--holecards', '--bins', 4]
+
+@pytest.fixture
+def hands(tmp_path, hand_history):
+    for seed in range(3):
+        hand_history(tmp_path / 'hands' / 'hands-{}.txt'.format(seed), 300, seed=seed)
+    return tmp_path / 'hands'
+
+# Hands of a database are audited as the files they were ingested from, also after a file changed
+@pytest.mark.parametrize('only_me', [False, True])
+def test_database_audit_is_audit_of_files(tmp_path, audit, hands, only_me):
+    options = OPTIONS + (['--onlyme'] if only_me else [])
+    expected = audit(hands, *options)
+    database = tmp_path / 'hands.db'
+    assert audit(hands, '--database', database, *options) == expected
+    assert audit('--database', database, *options) == expected
+
+    ## A changed file is ingested again, at its place in the order of files
+    first = next(os.scandir(hands)).path
+    stat = os.stat(first)
+    os.utime(first, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert audit(hands, '--database', database, *options) == expected
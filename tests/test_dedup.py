@@ -0,0 +1,20 @@
+import gzip
+import shutil
+import zipfile
+
+# Copies of a file in a .txt.gz file and a .zip archive are skipped as duplicates, also when files only overlap
+def test_copies_in_compressed_files_are_skipped(tmp_path, audit, hand_history):
+    original = hand_history(tmp_path / 'original' / 'hands.txt', 300)
+    expected = audit(original.parent, '--allcombinations', '--holecards')
+
+    copies = tmp_path / 'copies'
+    shutil.copytree(original.parent, copies)
+    with open(original, 'rb') as f, gzip.open(copies / 'copy.txt.gz', 'wb') as g:
+        shutil.copyfileobj(f, g)
+    with zipfile.ZipFile(copies / 'copies.zip', 'w') as archive:
+        archive.write(original, 'copy.txt')
+        ## A file of the first half of the hands of the original
+        archive.writestr('overlap.txt', 'Bovada Hand #'.join(original.read_text().split('Bovada Hand #')[:151]))
+    lines = audit(copies, '--allcombinations', '--holecards').splitlines(keepends=True)
+    assert lines[0] == 'Skipped 750 duplicate hands\n'
+    assert ''.join(lines[1:]) == expected
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from Distributions import chi2_sf, kolmogorov_sf
+
+stats = pytest.importorskip('scipy.stats')
+
+# Degrees of freedom of the tables of an audit, e.g. 1325 of hole cards with suits, and large ones
+@pytest.mark.parametrize('df', [1, 2, 3, 7, 8, 51, 90, 1325, 100000])
+def test_chi2_sf_matches_scipy(df):
+    x = np.geomspace(1e-3, 1e6, 400)
+    expected = stats.chi2.sf(x, df)
+    np.testing.assert_allclose(chi2_sf(x, df), expected, rtol=1e-10, atol=1e-300)
+
+def test_chi2_sf_of_invalid_degrees_of_freedom_is_nan():
+    assert np.isnan(chi2_sf(1.0, 0))
+
+# Sample sizes of each method of kolmogorov_sf, with statistics up to 1 and around the usual 1/sqrt(n)
+@pytest.mark.parametrize('n', [1, 2, 5, 10, 50, 140, 141, 1000, 10000])
+def test_kolmogorov_sf_matches_scipy(n):
+    for d in np.concatenate((np.linspace(1e-4, 1, 50), np.linspace(0.2, 3, 50) / np.sqrt(n))).tolist():
+        assert kolmogorov_sf(n, d) == pytest.approx(stats.kstwo.sf(d, n), rel=1e-6, abs=1e-300)
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from treys import Card, Evaluator
+from Parse import CARDS
+from Evaluate import HAND_LABELS, treys_rank_class, rank_class, rank_classes, combination_rank_classes, use_rank_table
+
+# A hand of 7 cards of each rank class, worst to best, with hole cards first
+HANDS = [
+    'Ac Jd 9h 7s 5c 3d 2h', # high card
+    'Ac Ad 9h 7s 5c 3d 2h', # pair
+    'Ac Ad 9h 9s 5c 3d 2h', # two pair
+    'Ac Ad Ah 9s 5c 3d 2h', # three of a kind
+    'Ac 2d 3h 4s 5c 9d Jh', # straight, ace low
+    'Ah 9h 7h 4h 2h Kc Qd', # flush
+    'Ks Kd Kh 2c 2d 7h 8s', # full house
+    'As Ad Ah Ac Kd 2c 3d', # four of a kind
+    'Ah Kh Qh Jh Th 2c 3d', # straight flush, royal
+]
+
+def card_ids(hand):
+    return [CARDS.index(card) for card in hand.split()]
+
+# Hands dealt at random, the first cards of a shuffled deck
+def random_hands(n, k, seed=0):
+    return np.argsort(np.random.default_rng(seed).random((n, len(CARDS))), axis=1)[:, :k]
+
+# Rank classes of hands evaluated by treys, with hole cards first
+def treys_rank_classes(hands):
+    evaluator = Evaluator()
+    return np.array([
+        treys_rank_class(evaluator.evaluate([Card.new(CARDS[c]) for c in hand[2:]], [Card.new(CARDS[c]) for c in hand[:2]]))
+        for hand in np.asarray(hands).tolist()
+    ])
+
+def test_hands_of_each_rank_class():
+    hands = np.array([card_ids(hand) for hand in HANDS])
+    assert treys_rank_classes(hands).tolist() == list(range(len(HAND_LABELS)))
+    assert rank_classes(hands).tolist() == list(range(len(HAND_LABELS)))
+
+@pytest.mark.parametrize('k', [5, 6, 7])
+def test_evaluators_match_treys(k):
+    hands = random_hands(2000, k, seed=k)
+    expected = treys_rank_classes(hands)
+    assert (rank_classes(hands) == expected).all()
+    assert [rank_class(hand) for hand in hands.tolist()] == expected.tolist()
+
+def test_rank_table_matches_prime_products(tmp_path):
+    hands = random_hands(2000, 7)
+    expected = combination_rank_classes(hands)
+    use_rank_table(str(tmp_path / 'rank-table.npy'))
+    try:
+        assert (combination_rank_classes(hands) == expected).all()
+    finally:
+        use_rank_table(None)
@@ -0,0 +1,17 @@
+import os
+import Parse
+
+OPTIONS = ['--allcombinations', '--holecards', '--holecardswithsuits', '--bins', 4]
+
+# Partial results of each shard merged in the order of files are the results of auditing every file at once
+def test_reduce_of_shards_is_audit_of_all_files(tmp_path, audit, hand_history):
+    for seed in range(3):
+        hand_history(tmp_path / 'hands' / 'shard-{}'.format(seed) / 'hands.txt', 300, seed=seed)
+    expected = audit(tmp_path / 'hands', *OPTIONS)
+    assert 'bins=4' in expected
+
+    partials = []
+    for file in Parse.find_hand_histories(str(tmp_path / 'hands')):
+        partials.append(tmp_path / '{}.npz'.format(len(partials)))
+        audit(os.path.dirname(file), '--map', partials[-1], *OPTIONS)
+    assert audit('--reduce', *partials, *OPTIONS) == expected
@@ -0,0 +1,37 @@
+import numpy as np
+from Parse import CARDS
+from Simulate import multinomial, deal_card_counts
+
+def test_multinomial_draws_every_trial_at_expected_proportions():
+    rng = np.random.default_rng(0)
+    pvals = np.array([[0.5, 0.3, 0.2, 0.0], [0.0, 0.1, 0.0, 0.9]])
+    n = np.broadcast_to([1000, 0], (5000, 2))
+    counts = multinomial(rng, n, pvals)
+    assert counts.shape == (5000, 2, 4)
+    assert (counts.sum(axis=-1) == n).all()
+    assert (counts[:, pvals == 0] == 0).all()
+    np.testing.assert_allclose(counts.mean(axis=0)[0], 1000 * pvals[0], rtol=0.01)
+
+# Cards of a deal are drawn without replacement, so a deal of the whole deck has every card once
+def test_deal_card_counts_draws_cards_without_replacement():
+    rng = np.random.default_rng(0)
+    deal_sizes = np.zeros(len(CARDS) + 1, dtype=np.int64)
+    deal_sizes[len(CARDS)] = 3
+    assert (deal_card_counts(rng, 100, deal_sizes) == 3).all()
+
+    deal_sizes = np.bincount([2, 2, 7, 9, 9, 9])
+    counts = deal_card_counts(rng, 20000, deal_sizes)
+    assert (counts.sum(axis=1) == 38).all()
+    assert counts.max() <= 6
+    np.testing.assert_allclose(counts.mean(axis=0), 38 / len(CARDS), rtol=0.03)
+
+# Replicates don't depend on the number of processes, and empirical tests aren't counted in the passing tests
+def test_simulate_is_reproducible_and_not_counted(tmp_path, audit, hand_history):
+    hand_history(tmp_path / 'hands' / 'hands.txt', 300)
+    options = [tmp_path / 'hands', '--allcombinations', '--holecards', '--summaryonly', '--bins', 4]
+    expected = audit(*options)
+    simulated = audit(*options, '--simulate', 200, '--seed', 1)
+    assert audit(*options, '--simulate', 200, '--seed', 1, '--jobs', 2) == simulated
+    assert 'Empirical chi-square p-value' in simulated
+    passing = [line for line in expected.splitlines() if 'Passing Tests' in line]
+    assert passing == [line for line in simulated.splitlines() if 'Passing Tests' in line]